@@ -0,0 +1,73 @@
+"""
+Import time of the package modules and pipeline scripts.
+
+Worker processes and command line runs import these modules before doing
+any work, so GIS, plotting and solver libraries must only load when the
+stage using them runs, and nothing may be read from disk at import.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, 'scripts')
+
+# Libraries that should never load on import, leaving out pyarrow which
+# pandas 3 imports itself
+HEAVY = ['geopandas', 'shapely', 'rasterio', 'fiona', 'pyogrio',
+         'matplotlib', 'seaborn', 'contextily', 'pulp', 'sklearn']
+
+MODULES = [
+    'cafevisit.preprocessing',
+    'cafevisit.supply_demand',
+    'cafevisit.optimization',
+    'cafevisit.solvers',
+    'cafevisit.sweep',
+    'cafevisit.merge',
+    'cafevisit.pipeline',
+    'cafevisit.instrument',
+    'scripts.run_all',
+    'scripts.costs',
+    'scripts.quantco',
+]
+
+
+def import_code(module):
+    """
+    Statement importing a package module, or
+    a script from the scripts folder.
+    """
+    if module.startswith('scripts.'):
+
+        return 'import sys; sys.path.insert(0, {!r}); import {}'.format(
+               SCRIPTS, module.split('.', 1)[1])
+
+    return 'import {}'.format(module)
+
+
+class ImportTime:
+
+    params = MODULES
+    param_names = ['module']
+    timeout = 120
+
+
+    def timeraw_import(self, module):
+        """
+        Import time in a fresh interpreter.
+        """
+        return import_code(module)
+
+
+    def track_heavy_modules(self, module):
+        """
+        Number of heavy libraries loaded by the import.
+        """
+        code = '{}; import sys; print(sum(name in sys.modules for name in {!r}))'.format(
+               import_code(module), HEAVY)
+        output = subprocess.run([sys.executable, '-c', code], capture_output = True,
+                                text = True, check = True, cwd = ROOT)
+
+        return int(output.stdout.split()[-1])
+
+    track_heavy_modules.unit = 'modules'
@@ -0,0 +1,91 @@
+"""
+Merging the country result tables into the Sub-Saharan Africa tables for
+growing numbers of countries and rows per country.
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from cafevisit.merge import merge_results
+from cafevisit.storage import write_table
+
+SUFFIXES = ['_customers.csv', '_ev_centers.csv', '_optimized_ev_center.csv', '_region.csv']
+
+
+def country_results(folder, n_countries, n_rows, seed = 0):
+    """
+    Write the result tables of synthetic
+    countries under `folder`.
+    """
+    rng = np.random.default_rng(seed)
+    isos = ['C{:02d}'.format(i) for i in range(n_countries)]
+
+    for iso3 in isos:
+
+        df = pd.DataFrame({
+            'iso3': iso3,
+            'GID_1': ['{}.{}_1'.format(iso3, i % 50) for i in range(n_rows)],
+            'admin_name': ['Region {}'.format(i % 50) for i in range(n_rows)],
+            'population': rng.integers(100, 100000, n_rows),
+            'latitude': rng.uniform(-10, 10, n_rows),
+            'longitude': rng.uniform(20, 40, n_rows),
+            'demand': rng.integers(1, 1000, n_rows).astype(float),
+        })
+
+        for suffix in SUFFIXES:
+
+            write_table(df, os.path.join(folder, iso3, '{}{}'.format(iso3, suffix)))
+
+        write_table(df, os.path.join(folder, iso3, 'population',
+                    '{}_population_results.csv'.format(iso3)))
+
+    return isos
+
+
+class MergeResults:
+
+    params = ([10, 48], [1000, 20000])
+    param_names = ['countries', 'rows']
+    timeout = 600
+    number = 1
+    repeat = 3
+
+
+    def setup(self, n_countries, n_rows):
+
+        self.folder = tempfile.mkdtemp()
+        self.results = os.path.join(self.folder, 'final')
+        self.isos = country_results(self.results, n_countries, n_rows)
+
+
+    def teardown(self, n_countries, n_rows):
+
+        shutil.rmtree(self.folder)
+
+
+    def time_merge(self, n_countries, n_rows):
+
+        merge_results(self.results, os.path.join(self.folder, 'full'))
+
+
+    def peakmem_merge(self, n_countries, n_rows):
+
+        merge_results(self.results, os.path.join(self.folder, 'full'))
+
+
+    def time_merge_one_changed(self, n_countries, n_rows):
+
+        # Only the country rewritten below is read again
+        merge_results(self.results, os.path.join(self.folder, 'incremental'),
+                      incremental = True)
+
+
+    def setup_one_changed(self, n_countries, n_rows):
+
+        self.setup(n_countries, n_rows)
+        merge_results(self.results, os.path.join(self.folder, 'incremental'),
+                      incremental = True)
+        country_results(self.results, 1, n_rows, seed = 1)
+
+    time_merge_one_changed.setup = setup_one_changed
@@ -0,0 +1,140 @@
+"""
+Distance, candidate link, model building and solve cost of the EV service
+center optimization for growing numbers of customers and centers.
+"""
+import numpy as np
+import pandas as pd
+from cafevisit.distances import candidate_links, cost_matrices
+from cafevisit.inputs import parameters
+from cafevisit.optimization import CFLPModel
+from cafevisit.solvers import solve
+
+ITEM = parameters['country']
+
+
+def instance(n_customers, n_centers, n_regions = 20, seed = 0):
+    """
+    Random customers and EV service centers
+    spread over a country-sized box, with
+    the capacity of `linear_problem`.
+    """
+    rng = np.random.default_rng(seed)
+
+    def locations(n, name):
+
+        return pd.DataFrame({
+            'latitude': rng.uniform(-4.5, 4.5, n),
+            'longitude': rng.uniform(34, 41.5, n),
+            'admin_name': rng.integers(0, n_regions, n).astype(str),
+            name: range(1, n + 1),
+        })
+
+    customers = locations(n_customers, 'customer_id')
+    customers['demand'] = np.floor(rng.lognormal(6, 1, n_customers))
+    ev_centers = locations(n_centers, 'ev_center_id')
+
+    region_demand = customers.groupby('admin_name')['demand'].sum().mean()
+    capacity = region_demand * ITEM['ev_spply_factor']
+    fixed_cost = ITEM['cost_of_ev_center'] * ITEM['area_of_ev_center']
+
+
+    return customers, ev_centers, capacity, fixed_cost
+
+
+class ModelBuild:
+
+    params = ([1000, 5000, 20000], [100, 500, 2000])
+    param_names = ['customers', 'centers']
+    timeout = 600
+
+
+    def setup(self, n_customers, n_centers):
+
+        self.customers, self.ev_centers, self.capacity, self.fixed_cost = \
+            instance(n_customers, n_centers)
+        self.distance, self.cost = cost_matrices(self.customers, self.ev_centers, ITEM)
+        self.links = candidate_links(self.customers, self.ev_centers, k = 10,
+                     demand = self.customers['demand'].values,
+                     capacity = np.full(n_centers, self.capacity))
+        self.model = CFLPModel(self.cost, self.customers['demand'].values,
+                               self.capacity, self.fixed_cost, *self.links)
+
+
+    def time_cost_matrices(self, n_customers, n_centers):
+
+        cost_matrices(self.customers, self.ev_centers, ITEM)
+
+
+    def peakmem_cost_matrices(self, n_customers, n_centers):
+
+        cost_matrices(self.customers, self.ev_centers, ITEM)
+
+
+    def time_candidate_links(self, n_customers, n_centers):
+
+        candidate_links(self.customers, self.ev_centers, k = 10,
+                        demand = self.customers['demand'].values,
+                        capacity = np.full(n_centers, self.capacity))
+
+
+    def time_build_model(self, n_customers, n_centers):
+
+        CFLPModel(self.cost, self.customers['demand'].values, self.capacity,
+                  self.fixed_cost, *self.links)
+
+
+    def peakmem_build_model(self, n_customers, n_centers):
+
+        CFLPModel(self.cost, self.customers['demand'].values, self.capacity,
+                  self.fixed_cost, *self.links)
+
+
+    def track_variables(self, n_customers, n_centers):
+
+        return self.model.size()['variables']
+
+    track_variables.unit = 'variables'
+
+
+    def track_constraints(self, n_customers, n_centers):
+
+        return self.model.size()['constraints']
+
+    track_constraints.unit = 'constraints'
+
+
+    def track_nonzeros(self, n_customers, n_centers):
+
+        return self.model.size()['nonzeros']
+
+    track_nonzeros.unit = 'nonzeros'
+
+
+class Solve:
+
+    params = ([200, 1000], [20, 100], ['highs', 'lagrangian'])
+    param_names = ['customers', 'centers', 'backend']
+    timeout = 900
+    number = 1
+    repeat = 3
+
+
+    def setup(self, n_customers, n_centers, backend):
+
+        customers, ev_centers, capacity, fixed_cost = instance(n_customers, n_centers)
+        _, cost = cost_matrices(customers, ev_centers, ITEM)
+        links = candidate_links(customers, ev_centers, k = 10,
+                demand = customers['demand'].values,
+                capacity = np.full(n_centers, capacity))
+        self.model = CFLPModel(cost, customers['demand'].values, capacity,
+                               fixed_cost, *links)
+
+
+    def time_solve(self, n_customers, n_centers, backend):
+
+        solve(self.model, backend = backend, time_limit = 300, mip_gap = 0.01)
+
+
+    def peakmem_solve(self, n_customers, n_centers, backend):
+
+        solve(self.model, backend = backend, time_limit = 300, mip_gap = 0.01)
@@ -0,0 +1,136 @@
+"""
+End to end cost of the country pipeline on synthetic inputs, from the GADM
+layers and population raster to the optimized EV service centers.
+"""
+import os
+from cafevisit.cli import load_script
+from cafevisit.synthetic import country_codes, generate_inputs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ISO3 = country_codes(1)[0]
+LOWEST = 2
+
+
+def boundaries(paths):
+    """
+    National outline, regions and sub-region
+    boundaries of the synthetic country.
+    """
+    from cafevisit.preprocessing import ProcessCountry, ProcessRegions
+
+    ProcessCountry(paths['countries'], ISO3).process_country_shapes(overwrite = True)
+    regions = ProcessRegions(ISO3, LOWEST)
+    regions.process_regions(overwrite = True)
+    regions.process_sub_region_boundaries()
+
+    return None
+
+
+def population(paths):
+    """
+    National population raster and regional
+    population of the synthetic country.
+    """
+    from cafevisit.preprocessing import ProcessPopulation
+
+    populations = ProcessPopulation(paths['countries'], ISO3, LOWEST, paths['population'])
+    populations.process_national_population()
+    populations.process_population_tif()
+
+    return None
+
+
+def supply_demand(paths):
+    """
+    Customers and EV service centers of
+    the synthetic country.
+    """
+    from cafevisit.supply_demand import SupplyDemand
+
+    SupplyDemand(ISO3).customer_ev_centers()
+
+    return None
+
+
+def optimize(paths):
+    """
+    EV service center optimization of the
+    synthetic country.
+    """
+    costs = load_script(os.path.join(ROOT, 'scripts', 'costs.py'))
+    costs.linear_problem(ISO3, k_nearest = 10, backend = 'highs', mip_gap = 0.01)
+
+    return None
+
+
+class CountryPipeline:
+
+    # generate_inputs goes up to scale 1000, too slow to run on every commit
+    params = [1, 10, 100]
+    param_names = ['scale']
+    number = 1
+    repeat = 1
+    timeout = 3600
+
+
+    def setup_cache(self):
+
+        cache = {}
+        for scale in self.params:
+
+            folder = os.path.abspath('scale_{}'.format(scale))
+            paths = generate_inputs(folder, n_countries = 1, scale = scale, overwrite = True)
+            cache[scale] = (folder, {name: os.path.abspath(path) for name, path in paths.items()})
+
+            # Every stage runs once so that each benchmark finds its inputs
+            os.chdir(folder)
+            for stage in (boundaries, population, supply_demand):
+
+                stage(cache[scale][1])
+
+            os.chdir(os.path.dirname(folder))
+
+
+        return cache
+
+
+    def setup(self, cache, scale):
+
+        self.cwd = os.getcwd()
+        folder, self.paths = cache[scale]
+        os.chdir(folder)
+
+
+    def teardown(self, cache, scale):
+
+        os.chdir(self.cwd)
+
+
+    def time_boundaries(self, cache, scale):
+
+        boundaries(self.paths)
+
+
+    def time_population(self, cache, scale):
+
+        population(self.paths)
+
+
+    def peakmem_population(self, cache, scale):
+
+        population(self.paths)
+
+
+    def time_supply_demand(self, cache, scale):
+
+        supply_demand(self.paths)
+
+
+    def time_optimize(self, cache, scale):
+
+        optimize(self.paths)
+
+
+    def peakmem_optimize(self, cache, scale):
+
+        optimize(self.paths)
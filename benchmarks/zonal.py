@@ -0,0 +1,91 @@
+"""
+Zonal population statistics for growing raster sizes and region counts.
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+def population_raster(path, size, seed = 0):
+    """
+    Write a square population raster with
+    a few nodata pixels, 0.01 degree wide.
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+
+    rng = np.random.default_rng(seed)
+    array = rng.gamma(0.5, 40, (size, size)).astype(np.float32)
+    array[rng.random((size, size)) < 0.05] = 255
+
+    meta = {'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'height': size,
+            'width': size, 'crs': 'epsg:4326', 'nodata': 255, 'tiled': True,
+            'blockxsize': 256, 'blockysize': 256,
+            'transform': from_origin(30, 5, 0.01, 0.01)}
+
+    with rasterio.open(path, 'w', **meta) as dest:
+
+        dest.write(array, 1)
+
+    return path
+
+
+def region_grid(size, n_regions):
+    """
+    Rectangular regions tiling the raster.
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    columns = int(np.ceil(np.sqrt(n_regions)))
+    rows = int(np.ceil(n_regions / columns))
+    width, height = size * 0.01 / columns, size * 0.01 / rows
+
+    shapes = [box(30 + c * width, 5 - (r + 1) * height, 30 + (c + 1) * width, 5 - r * height)
+              for r in range(rows) for c in range(columns)][:n_regions]
+
+
+    return gpd.GeoDataFrame({'GID_1': range(n_regions)}, geometry = shapes,
+                            crs = 'epsg:4326')
+
+
+class ZonalPopulation:
+
+    params = ([1024, 4096], [10, 100, 1000])
+    param_names = ['raster_size', 'regions']
+    timeout = 600
+
+
+    def setup(self, size, n_regions):
+
+        self.folder = tempfile.mkdtemp()
+        self.path = population_raster(os.path.join(self.folder, 'population.tif'), size)
+        self.boundaries = region_grid(size, n_regions)
+
+
+    def teardown(self, size, n_regions):
+
+        shutil.rmtree(self.folder)
+
+
+    def time_zonal_population(self, size, n_regions):
+
+        from cafevisit.zonal import zonal_population
+
+        zonal_population(self.boundaries, self.path, nodata = 255)
+
+
+    def peakmem_zonal_population(self, size, n_regions):
+
+        from cafevisit.zonal import zonal_population
+
+        zonal_population(self.boundaries, self.path, nodata = 255)
+
+
+    def time_clip_raster(self, size, n_regions):
+
+        from cafevisit.raster import clip_raster
+
+        clip_raster(self.path, list(self.boundaries.geometry.values),
+                    os.path.join(self.folder, 'clipped.tif'))
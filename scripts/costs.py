@@ -2,14 +2,17 @@ import configparser
 import os
 import math
 import warnings
+import numpy as np
 import pandas as pd
-import geopandas as gpd
-import matplotlib.pyplot as plt 
-import seaborn as sns
-from math import *
-from pulp import *
-from itertools import *
 from cafevisit.inputs import parameters
+from cafevisit.cache import MatrixCache
+from cafevisit.distances import candidate_links, cost_matrices
+from cafevisit.instrument import note, stage
+from cafevisit.optimization import CFLPModel
+from cafevisit.road_network import RoadNetwork
+from cafevisit.solvers import solve
+from cafevisit.runner import input_size, run_countries
+from cafevisit.storage import read_table, table_path, write_table
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings('ignore')
 
@@ -19,17 +22,63 @@ BASE_PATH = CONFIG['file_locations']['base_path']
 DATA_RAW = os.path.join(BASE_PATH, 'raw')
 DATA_PROCESSED = os.path.join(BASE_PATH, '..', 'results', 'processed')
 DATA_RESULTS = os.path.join(BASE_PATH, '..', 'results', 'final')
+JOBS = CONFIG.getint('parallel', 'jobs', fallback = 0)
 
 path = os.path.join(DATA_RAW, 'countries.csv')
-countries = pd.read_csv(path, encoding = 'latin-1')
 
 def add_coordinates(df, lat = 'latitude', lng = 'longitude'):
 
+    import geopandas as gpd
+
     assert pd.Series([lat, lng]).isin(df.columns).all()
 
     return gpd.GeoDataFrame(df, geometry = gpd.points_from_xy(df.longitude, df.latitude))
 
 
+def link_segments(model, flows, open_centers, customers, ev_centers):
+    """
+    This function extracts the customer to
+    EV service center links that carry flow
+    to an established center, as line
+    segments. Both ends are looked up by
+    position through the link indices of
+    the model, so the cost is linear in
+    the number of links.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Solved model.
+    flows : array
+        Flow on each link of the model.
+    open_centers : array
+        Whether each EV service center is built.
+    customers : dataframe
+        Customers, in the row order of the model.
+    ev_centers : dataframe
+        EV service centers, in the column order
+        of the model.
+
+    Returns
+    -------
+    segments : array
+        An (links, 2, 2) array of (longitude,
+        latitude) pairs, center first.
+    """
+    served = (np.asarray(flows) > 0) & np.asarray(open_centers)[model.ev_center_idx]
+    customer_idx = model.customer_idx[served]
+    ev_center_idx = model.ev_center_idx[served]
+
+    segments = np.empty((len(customer_idx), 2, 2))
+    segments[:, 0, 0] = ev_centers['longitude'].to_numpy(float)[ev_center_idx]
+    segments[:, 0, 1] = ev_centers['latitude'].to_numpy(float)[ev_center_idx]
+    segments[:, 1, 0] = customers['longitude'].to_numpy(float)[customer_idx]
+    segments[:, 1, 1] = customers['latitude'].to_numpy(float)[customer_idx]
+
+
+    return segments
+
+
 def haversine_distance(lat1, lon1, lat2, lon2):
 
     """
@@ -98,7 +147,8 @@ def access_cost(distance_km):
     return access_cost
 
 
-def linear_problem(iso3):
+def linear_problem(iso3, k_nearest = None, radius_km = None, formulation = 'strong',
+                   backend = 'cbc', road_network = None, **solver_options):
 
     """
     This function minimizes the cost 
@@ -111,6 +161,26 @@ def linear_problem(iso3):
     ----------
     iso3 : string
         Country iso3 to be processed.
+    k_nearest : int
+        If given, each customer is only linked
+        to its k nearest EV service centers.
+    radius_km : float
+        If given, each customer is only linked
+        to the EV service centers within this
+        travel radius.
+    formulation : string
+        'strong' (disaggregated) or 'weak'
+        (aggregated) linking constraints.
+    backend : string
+        Solver backend, 'cbc', 'highs' or
+        'lagrangian' for large countries.
+    road_network : string
+        Path of a local road network file. If
+        given, road distances replace the 
+        straight-line haversine distances.
+    solver_options : dict
+        Options passed to the solver backend
+        (`time_limit`, `mip_gap`, `threads`).
 
     Returns
     -------
@@ -123,9 +193,9 @@ def linear_problem(iso3):
     customer = os.path.join(DATA_RESULTS, iso3, '{}_customers.csv'.format(iso3))
     ev_centers = os.path.join(DATA_RESULTS, iso3, '{}_ev_centers.csv'.format(iso3))
     region = os.path.join(DATA_RESULTS, iso3, '{}_region.csv'.format(iso3))
-    df = pd.read_csv(customer)
-    df1 = pd.read_csv(ev_centers)
-    df2 = pd.read_csv(region)
+    df = read_table(customer)
+    df1 = read_table(ev_centers)
+    df2 = read_table(region)
     for key, item in parameters.items():
 
         cost_ev_center = item['cost_of_ev_center'] * item['area_of_ev_center']
@@ -133,102 +203,69 @@ def linear_problem(iso3):
         # A list of EV service centers
         df1['ev_center_id'] = ['Ev_center ' + str(i) for i in range(1, 1 + df1.shape[0])]
 
-        # Create dictionary of the EV Centers with the maximum requests they can handle.
-        annual_supply_dict = {}
-        for ev_service_center in df1['ev_center_id']:
+        # Distances and access costs between every customer (rows) and EV service center (columns)
+        cache = MatrixCache(os.path.join(DATA_PROCESSED, 'distance_cache'))
+        network = RoadNetwork.from_file(road_network) if road_network else None
+        with stage('distances', iso3):
 
-            request_received = annual_supply_dict[ev_service_center] = request_received
+            distance, transport_costs = cost_matrices(df, df1, item, cache = cache, 
+                                                      network = network)
+            note(customers = df.shape[0], ev_centers = df1.shape[0])
 
-        # Create a dictionary containing the EV service centers with the fixed supply costs
-        annual_cost_dict = {}
-        for ev_service_center in df1['ev_center_id']:
+        # Keep the distance column written by the former per-pair loop (last customer)
+        df1['distance'] = np.round(distance[-1, :].astype(float), 4) if df.shape[0] > 0 else 0
 
-            cost_ev_center = annual_cost_dict[ev_service_center] = cost_ev_center
+        # Candidate customer-EV service center links, pruned when k_nearest or radius_km is set
+        with stage('candidate_links', iso3):
 
-        #Create a dictionary to store the customer id and the corresponding requests
-        demand_dict = { customer : df['demand'][i] for i, customer in enumerate(df['customer_id'])} 
-        
-        df1['distance'] = 0
-        transport_costs_dict = {}
-        for i in range(0, df1.shape[0]):
-            
-            # Create a dictionary that store the distances between the i-th EV service center and all customers
-            warehouse_transport_costs_dict = {}
-            
-            # For each customer location
-            for j in range(0, df.shape[0]):
-                
-                # Distance in Km between EV service center i and customer j
-                d = 0 if df1.admin_name[i] == df.admin_name[j] else haversine_distance(
-                    df1.latitude[i], df1.longitude[i], df.latitude[j], df.longitude[j])
-                
-                # Update costs for EV service center i
-                warehouse_transport_costs_dict.update({df.customer_id[j]: access_cost(d)})
-                df1.at[i, 'distance'] = d
-            
-            # Final dictionary with all costs for all EV service centers
-            transport_costs_dict.update({df1.ev_center_id[i]: warehouse_transport_costs_dict})
+            link_rows, link_cols = candidate_links(df, df1, k = k_nearest, 
+                        radius_km = radius_km, demand = df['demand'].values, 
+                        capacity = np.full(df1.shape[0], request_received),
+                        distance = distance)
+            note(links = len(link_rows))
 
         print('Performing spatial optimization for {}'.format(iso3))
-      
-        lp_problem = LpProblem('CFLP', LpMinimize) 
-
-        #Build or do not built EV service center at location j (cj)
-        built_ev_center = LpVariable.dicts('build_ev_center', df1['ev_center_id'], 0, 1, LpBinary)
-
-        #Number of customers taking cars to EV service center j (v_ij)
-        served_customer = LpVariable.dicts('Link', 
-                        list(product(df['customer_id'], 
-                        df1['ev_center_id'])), 0)
-
-        #Objective Function
-        annual_cost_terms = [annual_cost_dict.get(j, 0) * built_ev_center[j] for j in df1['ev_center_id']]
-        transport_cost_terms = [transport_costs_dict[j][i] * served_customer[(i, j)]
-            for j in df1['ev_center_id']
-            for i in df['customer_id']]
-            
-        objective = lpSum(annual_cost_terms) + lpSum(transport_cost_terms)
-        lp_problem += objective
 
-        # Costraint: the customer request must be met
-        for i in df['customer_id']:
+        # Sparse CFLP model over the candidate links: flows (v_ij) followed by build decisions (cj)
+        with stage('model_build', iso3):
 
-            lp_problem += lpSum(served_customer[(i, j)] for j in df1['ev_center_id']) == demand_dict[i]
+            model = CFLPModel(transport_costs, df['demand'].values, request_received, 
+                              cost_ev_center, link_rows, link_cols, formulation = formulation)
+            note(**model.size())
 
-        # Constraint: an EV service center cannot fullfill more requests than its limit
-        for j in df1['ev_center_id']:
+        with stage('solve', iso3):
 
-            customer_demand_terms = [served_customer[(i, j)] for i in df['customer_id']]
-            total_demand = lpSum(customer_demand_terms)
-            supply_constraint = total_demand <= annual_supply_dict.get(j, 0) * built_ev_center.get(j, 0)
-            lp_problem += supply_constraint
+            solution = solve(model, backend = backend, **solver_options)
+            note(backend = backend, status = solution.status, objective = solution.objective)
 
-            # Constraint: an EV service center cannot give a customer more than its request
-            for i in df['customer_id']:
+        served_customer = solution.flows
+        built_ev_center = solution.open_centers
 
-                for j in df1['ev_center_id']:
+        # No solution, e.g. an infeasible instance, is recorded rather than raised
+        if solution.objective is None:
 
-                    lp_problem += served_customer[(i,j)] <= demand_dict[i] * built_ev_center[j]
-        
-        solver = pulp.PULP_CBC_CMD(msg = False)
-        lp_problem.solve(solver)
+            print('No solution for {}: {}'.format(iso3, solution.status))
+            minimized_cost = np.nan
+
+        else:
+
+            minimized_cost = round(solution.objective, 2)
+
+        if solution.lower_bound is not None:
+
+            print('Lower bound = {:.2f}, gap = {:.2%}'.format(solution.lower_bound, 
+                  solution.gap()))
 
-        minimized_cost = round(value(lp_problem.objective), 2)
-        df1[ 'minimized_cost'] = ''
         #Store the number of EV service centers built
-        for i in df1['ev_center_id']:
+        df1['minimized_cost'] = np.where(built_ev_center, minimized_cost, 0)
 
-            if built_ev_center[i].varValue == 1:
+        if solution.objective is None:
 
-                df1.loc[df1['ev_center_id'] == i, 'build'] = 'Yes'
-                df1.loc[df1['ev_center_id'] == i, 'value'] = 1
-                df1.loc[df1['ev_center_id'] == i, 'minimized_cost'] = minimized_cost
-            
-            else:
+            df1['minimized_cost'] = np.nan
 
-                df1.loc[df1['ev_center_id'] == i, 'build'] = 'No'
-                df1.loc[df1['ev_center_id'] == i, 'value'] = 1
-                df1.loc[df1['ev_center_id'] == i, 'minimized_cost'] = 0
+        df1['build'] = np.where(built_ev_center, 'Yes', 'No')
+        df1['value'] = 1
+        df1['status'] = solution.status
 
         fileout = '{}_optimized_ev_center.csv'.format(iso3)
         folder_out = os.path.join(DATA_RESULTS, iso3)
@@ -237,79 +274,73 @@ def linear_problem(iso3):
             os.makedirs(folder_out)
 
         path_out = os.path.join(folder_out, fileout)
-        df1.to_csv(path_out, index = False)
+        write_table(df1, path_out)
 
-        map_path = os.path.join(DATA_PROCESSED, iso3, 'national_outline.shp')
-        country = gpd.read_file(map_path)
+        if solution.objective is None:
 
-        print('Plotting optimization results for {}'.format(iso3))
-        def get_served_customers(input_warehouse):
-            """
-            This function find the customer ids 
-            served by input EV service center
+            continue
 
-            Parameters
-            ----------
-            inpu_ev_center : string
-                EV service center id
-            
-            Returns
-            -------
-            linked_customers : list
-                List of customer's ids connected 
-                to the EV service center            
-            """
-            # Initialize empty list
-            linked_customers = []
-            
-            for (k, v) in served_customer.items():
-                    
-                    if k[1] == input_warehouse and v.varValue>0:
-                        
-                        linked_customers.append(k[0])
+        with stage('plotting', iso3):
 
-            return linked_customers
-        
-        establish = df1.loc[df1['build'] == 'Yes'] 
-        sns.set(font_scale = 0.5)
-        ax = country.plot(color = 'white', edgecolor = 'black', figsize = (10, 10))
+            # Plotting libraries are only loaded once a solution is drawn
+            import geopandas as gpd
+            import matplotlib.pyplot as plt
+            import seaborn as sns
+            from matplotlib.collections import LineCollection
 
-        df = add_coordinates(df)
-        df.plot(ax = ax, marker = 'X', color= 'green', markersize = 30, label = 'Customer Location')
+            map_path = os.path.join(DATA_PROCESSED, iso3, 'national_outline.shp')
+            country = gpd.read_file(map_path)
 
-        establish = add_coordinates(establish)
-        establish.plot(ax = ax, marker = 'o', c = 'red', markersize = 30, label = 'EV Service Centers')
+            print('Plotting optimization results for {}'.format(iso3))
 
-        for w in establish.ev_center_id:
-            
-            connected_customers = get_served_customers(w)
-            
-            for c in connected_customers:
-                
-                ax.plot([establish.loc[establish.ev_center_id == w].longitude, df.loc[df.customer_id == c].longitude],
-                [establish.loc[establish.ev_center_id == w].latitude, df.loc[df.customer_id == c].latitude],
-                linewidth = 0.8, linestyle = '--', color = '#0059b3')
-        
-        ax.grid(b = True, which = 'minor', alpha = 0.25)
-        ax.tick_params(labelsize = 10)
-        plt.title('Kenya', fontdict={'fontname': 'DejaVu Sans', 'fontsize': 20, 'fontweight': 'bold'})
-        legend = plt.legend(facecolor = 'white', title = 'Location', prop = {'size': 15}, loc = 'upper right')
-        legend.get_title().set_fontsize(17)
-        plt.tight_layout()
+            establish = df1.loc[df1['build'] == 'Yes'] 
+            sns.set(font_scale = 0.5)
+            ax = country.plot(color = 'white', edgecolor = 'black', figsize = (10, 10))
 
-        filename = '{}_optimized_sites.png'.format(iso3)
-        DATA_VIS = os.path.join(BASE_PATH, '..', 'vis', 'figures')
-        path_out = os.path.join(DATA_VIS, filename)  
-        plt.savefig(path_out, dpi = 480)
+            # Every served link of an established center, drawn as one collection
+            segments = link_segments(model, served_customer, built_ev_center, df, df1)
+            ax.add_collection(LineCollection(segments, linewidths = 0.8, linestyles = '--', 
+                              colors = '#0059b3'))
 
-    status = LpStatus[lp_problem.status]
+            df = add_coordinates(df)
+            df.plot(ax = ax, marker = 'X', color= 'green', markersize = 30, label = 'Customer Location')
+
+            establish = add_coordinates(establish)
+            establish.plot(ax = ax, marker = 'o', c = 'red', markersize = 30, label = 'EV Service Centers')
+
+            ax.grid(visible = True, which = 'minor', alpha = 0.25)
+            ax.tick_params(labelsize = 10)
+            plt.title('Kenya', fontdict={'fontname': 'DejaVu Sans', 'fontsize': 20, 'fontweight': 'bold'})
+            legend = plt.legend(facecolor = 'white', title = 'Location', prop = {'size': 15}, loc = 'upper right')
+            legend.get_title().set_fontsize(17)
+            plt.tight_layout()
+
+            filename = '{}_optimized_sites.png'.format(iso3)
+            DATA_VIS = os.path.join(BASE_PATH, '..', 'vis', 'figures')
+            os.makedirs(DATA_VIS, exist_ok = True)
+            path_out = os.path.join(DATA_VIS, filename)  
+            plt.savefig(path_out, dpi = 480)
+            plt.close()
+
+    status = solution.status
 
 
     return print('Solution is', status, ' and minimized cost = ', minimized_cost)
 
 
+def country_size(iso3):
+    """
+    Expected size of a country optimization run.
+    """
+    return input_size(table_path(os.path.join(DATA_RESULTS, iso3, '{}_customers.csv'.format(iso3))), 
+                      table_path(os.path.join(DATA_RESULTS, iso3, '{}_ev_centers.csv'.format(iso3))))
+
+
 if __name__ == '__main__':
 
+    countries = pd.read_csv(path, encoding = 'latin-1')
+
+    tasks = []
     for idx, country in countries.iterrows():
 
         #if not country['region'] == 'Sub-Saharan Africa' or country['Exclude'] == 1:   
@@ -317,4 +348,6 @@ if __name__ == '__main__':
             
             continue 
 
-        linear_problem(countries['iso3'].loc[idx])
\ No newline at end of file
+        tasks.append(countries['iso3'].loc[idx])
+
+    run_countries(linear_problem, tasks, jobs = JOBS, size = country_size)
@@ -3,13 +3,20 @@ import os
 import warnings
 import pandas as pd
 from cafevisit.preprocessing import ProcessCountry, ProcessRegions, ProcessPopulation
+from cafevisit.preprocessing import process_boundaries, process_national_populations
+from cafevisit.preprocessing import sub_region_path
+from cafevisit.gadm import ingest_gadm, partition_path
+from cafevisit.inputs import parameters
+from cafevisit.pipeline import Pipeline, Stage
 from cafevisit.supply_demand import SupplyDemand
+from cafevisit.runner import input_size, run_countries
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings('ignore')
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
 BASE_PATH = CONFIG['file_locations']['base_path']
+JOBS = CONFIG.getint('parallel', 'jobs', fallback = 0)
 
 DATA_RAW = os.path.join(BASE_PATH, 'raw')
 DATA_PROCESSED = os.path.join(BASE_PATH, 'processed')
@@ -17,10 +24,125 @@ DATA_PROCESSED = os.path.join(BASE_PATH, 'processed')
 path = os.path.join(DATA_RAW, 'countries.csv')
 pop_tif_loc = os.path.join(DATA_RAW, 'WorldPop', 'ppp_2020_1km_Aggregated.tif')
 
-countries = pd.read_csv(path, encoding = 'latin-1')
+
+def gadm_input(level, iso3):
+    """
+    GADM source of a country, its GeoParquet
+    partition if ingested or the shapefile.
+    """
+    partition = partition_path(level, iso3)
+
+    if os.path.exists(partition):
+
+        return partition
+
+    return os.path.join('data', 'raw', 'boundaries', 'gadm36_{}.shp'.format(level))
+
+
+def country_pipeline(iso3, lowest):
+    """
+    This function declares the preprocessing
+    and supply-demand stages of a country,
+    with the files each stage reads and writes.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country iso3 to be processed.
+    lowest : int
+        Lowest GID level of the country.
+
+    Returns
+    -------
+    pipeline : Pipeline
+        The country pipeline.
+    """
+    lowest = int(lowest)
+    processed = os.path.join('results', 'processed', iso3)
+    final = os.path.join('results', 'final', iso3)
+
+    outline = os.path.join(processed, 'national_outline.shp')
+    region_paths = [os.path.join(processed, 'regions', 'regions_{}_{}.shp'.format(level, iso3))
+                    for level in range(1, lowest + 1)]
+    national_tif = os.path.join(processed, 'population', 'national', 'ppp_2020_1km_Aggregated.tif')
+    population = os.path.join(final, 'population', '{}_population_results.csv'.format(iso3))
+    tables = [os.path.join(final, '{}{}'.format(iso3, suffix)) 
+              for suffix in ('_ev_centers.csv', '_customers.csv', '_region.csv')]
+
+    country = ProcessCountry(path, iso3)
+    regions = ProcessRegions(iso3, lowest)
+    populations = ProcessPopulation(path, iso3, lowest, pop_tif_loc)
+    supply_demand = SupplyDemand(iso3)
+
+    stages = [
+        Stage('country_shapes', lambda iso3: country.process_country_shapes(overwrite = True),
+              inputs = [path, gadm_input(0, iso3)], outputs = [outline]),
+        Stage('regions', lambda iso3: regions.process_regions(overwrite = True),
+              inputs = [gadm_input(level, iso3) for level in range(1, lowest + 1)],
+              outputs = region_paths, params = {'lowest': lowest}),
+        Stage('sub_regions', lambda iso3: regions.process_sub_region_boundaries(),
+              inputs = region_paths[:2], outputs = [sub_region_path(iso3)]),
+        Stage('national_population', lambda iso3: populations.process_national_population(),
+              inputs = [pop_tif_loc, outline], outputs = [national_tif]),
+        Stage('population', lambda iso3: populations.process_population_tif(),
+              inputs = region_paths[-1:] + [national_tif], outputs = [population]),
+        Stage('supply_demand', lambda iso3: supply_demand.customer_ev_centers(),
+              inputs = [population], outputs = tables, params = parameters),
+    ]
+
+
+    return Pipeline(stages)
+
+
+def outdated(plans, names):
+    """
+    Countries whose planned run includes
+    any of the stages `names`.
+    """
+    return [iso3 for iso3, report in plans.items()
+            if any(stage['action'] == 'planned' and stage['stage'] in names
+                   for stage in report)]
+
+
+def process_country(iso3, lowest, batched = ()):
+    """
+    This function runs the preprocessing 
+    and supply-demand stages of a country,
+    skipping the stages whose inputs and
+    parameters did not change.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country iso3 to be processed.
+    lowest : int
+        Lowest GID level of the country.
+    batched : list
+        Stages already run for the country
+        by the batch steps.
+    """
+    report = country_pipeline(iso3, lowest).run(iso3, done = batched)
+
+    for stage in report:
+
+        print('{} {}: {} in {}s'.format(iso3, stage['stage'], stage['action'], 
+              stage['wall_time']))
+
+    return None
+
+
+def country_size(iso3):
+    """
+    Expected size of a country run.
+    """
+    return input_size(os.path.join('results', 'processed', iso3, 'national_outline.shp'))
+
 
 if __name__ == '__main__':
 
+    countries = pd.read_csv(path, encoding = 'latin-1')
+
+    tasks = []
     for idx, country in countries.iterrows():
 
         if not country['region'] == 'Sub-Saharan Africa' or country['Exclude'] == 1:   
@@ -28,16 +150,40 @@ if __name__ == '__main__':
             
             continue 
 
-        country = ProcessCountry(path, countries['iso3'].loc[idx])
-        #country.process_country_shapes()
+        tasks.append((countries['iso3'].loc[idx], countries['lowest'].loc[idx]))
+
+    #one-time conversion of the GADM layers to per-country GeoParquet
+    ingest_gadm()
+
+    plans = {iso3: country_pipeline(iso3, lowest).run(iso3, dry_run = True)
+             for iso3, lowest in tasks}
+    batched = {iso3: [] for iso3, _ in tasks}
+
+    #national outlines and regions of the outdated countries, one read per GADM level
+    shapes = outdated(plans, ['country_shapes', 'regions'])
+
+    if len(shapes) > 0:
+
+        summary = process_boundaries(path, shapes, jobs = JOBS, overwrite = True)
+        failed = set(summary.loc[summary['status'] == 'Failed', 'iso3'])
+
+        #failed countries run their own stages again, and report the error
+        for iso3 in shapes:
+
+            if iso3 not in failed:
+
+                batched[iso3] += ['country_shapes', 'regions']
+
+    #one pass over the global raster for the outdated national outlines
+    national = outdated(plans, ['national_population'])
+
+    if len(national) > 0:
+
+        process_national_populations(pop_tif_loc, national)
 
-        regions = ProcessRegions(countries['iso3'].loc[idx], countries['lowest'].loc[idx])
-        #regions.process_regions()
-        #regions.process_sub_region_boundaries()
+        for iso3 in national:
 
-        populations = ProcessPopulation(path, countries['iso3'].loc[idx], countries['lowest'].loc[idx], pop_tif_loc)
-        #populations.process_national_population()
-        populations.process_population_tif()
+            batched[iso3].append('national_population')
 
-        supply_demand = SupplyDemand(countries['iso3'].loc[idx])
-        supply_demand.customer_ev_centers()
\ No newline at end of file
+    run_countries(process_country, [(iso3, lowest, batched[iso3]) for iso3, lowest in tasks],
+                  jobs = JOBS, size = country_size)
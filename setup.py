@@ -49,10 +49,11 @@ setup(
     ],
     install_requires=[
         'numpy>=1.16.4',
+        'scipy',
     ],
     entry_points={
         'console_scripts': [
-            # eg: 'snkit = snkit.cli:main',
+            'cafe-visit = cafevisit.cli:main',
         ]
     },
 )
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import time
+import numpy as np
+
+
+class MatrixCache:
+
+    """
+    This class stores customer to EV
+    service center matrices on disk as
+    float32 `.npy` files that are opened
+    as memory-maps, keyed by a hash of
+    the coordinates and distance method.
+    """
+
+
+    def __init__(self, folder, max_bytes = 4 * 1024 ** 3):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        folder : string
+            Folder of the cached matrices.
+        max_bytes : int
+            Size above which the least recently
+            used matrices are removed.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+
+    def key(self, *arrays, method = 'haversine'):
+        """
+        This function hashes the input
+        arrays and distance method.
+
+        Parameters
+        ----------
+        arrays : array
+            Coordinate arrays the matrix is built from.
+        method : string
+            Name of the distance method.
+
+        Returns
+        -------
+        key : string
+            Hexadecimal cache key.
+        """
+        digest = hashlib.sha1(method.encode())
+
+        for array in arrays:
+
+            array = np.ascontiguousarray(array, dtype = float)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+
+
+        return digest.hexdigest()
+
+
+    def path(self, key):
+        """
+        Path of a cached matrix.
+        """
+        return os.path.join(self.folder, '{}.npy'.format(key))
+
+
+    def get(self, key, mode = 'r'):
+        """
+        This function opens a cached matrix.
+
+        Parameters
+        ----------
+        key : string
+            Cache key.
+        mode : string
+            Memory-map mode, `c` for a
+            copy-on-write matrix whose changes
+            stay in memory.
+
+        Returns
+        -------
+        matrix : memmap
+            Memory-mapped matrix, or None
+            if it is not cached.
+        """
+        path = self.path(key)
+
+        if not os.path.exists(path):
+
+            return None
+
+        # Record the access for least recently used eviction
+        os.utime(path)
+
+
+        return np.load(path, mmap_mode = mode)
+
+
+    def build(self, key, shape, fill, chunk_rows = 2048, mode = 'r'):
+        """
+        This function builds a matrix into
+        the cache chunk by chunk, so that it
+        never has to fit in memory at once.
+
+        Parameters
+        ----------
+        key : string
+            Cache key.
+        shape : tuple
+            Shape of the matrix.
+        fill : function
+            Function returning the rows between
+            its `start` and `end` arguments.
+        chunk_rows : int
+            Number of rows computed at a time.
+        mode : string
+            Memory-map mode of the returned matrix.
+
+        Returns
+        -------
+        matrix : memmap
+            Memory-mapped matrix.
+        """
+        if not os.path.exists(self.folder):
+
+            os.makedirs(self.folder)
+
+        path = self.path(key)
+        path_tmp = '{}.{}.tmp'.format(path, os.getpid())
+
+        matrix = np.lib.format.open_memmap(path_tmp, mode = 'w+',
+                                           dtype = np.float32, shape = shape)
+        for start in range(0, shape[0], chunk_rows):
+
+            end = min(start + chunk_rows, shape[0])
+            matrix[start:end] = fill(start, end)
+
+        matrix.flush()
+        del matrix
+
+        # Concurrent workers may build the same key, the last rename wins
+        os.replace(path_tmp, path)
+        self.evict(keep = path)
+
+
+        return np.load(path, mmap_mode = mode)
+
+
+    def evict(self, keep = None, stale = 24 * 3600):
+        """
+        This function removes the least
+        recently used matrices until the
+        cache is below its size limit, and
+        the temporary files of builds that
+        did not finish. Files removed by
+        another worker meanwhile are skipped.
+
+        Parameters
+        ----------
+        keep : string
+            Path that is never removed.
+        stale : float
+            Age in seconds above which a
+            temporary file is removed.
+        """
+        now = time.time()
+
+        files = []
+        for filename in os.listdir(self.folder):
+
+            path = os.path.join(self.folder, filename)
+
+            try:
+
+                stat = os.stat(path)
+
+                if filename.endswith('.tmp') and now - stat.st_mtime > stale:
+
+                    os.remove(path)
+
+                elif filename.endswith('.npy'):
+
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            except FileNotFoundError:
+
+                continue
+
+        total = sum(size for _, size, _ in files)
+
+        for _, size, path in sorted(files):
+
+            if total <= self.max_bytes:
+
+                break
+
+            if path == keep:
+
+                continue
+
+            try:
+
+                os.remove(path)
+
+            except FileNotFoundError:
+
+                pass
+
+            total -= size
+
+        return None
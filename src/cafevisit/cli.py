@@ -0,0 +1,371 @@
+import argparse
+import configparser
+import importlib.util
+import os
+import sys
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+BASE_PATH = CONFIG['file_locations']['base_path']
+DATA_RAW = os.path.join(BASE_PATH, 'raw')
+
+COUNTRIES_CSV = os.path.join(DATA_RAW, 'countries.csv')
+POP_TIFF = os.path.join(DATA_RAW, 'WorldPop', 'ppp_2020_1km_Aggregated.tif')
+
+# Per-country plots of each plotting module
+PLOTS = {
+    os.path.join('vis', 'optimization_plots.py'): ['potential_sites', 'average_demand',
+                                                   'discarded_sites'],
+    os.path.join('vis', 'maps.py'): ['pop_density'],
+}
+
+
+def load_script(path):
+    """
+    This function imports a pipeline script
+    (e.g. `scripts/costs.py`) of the project
+    checkout in the working directory, once
+    per process.
+
+    Parameters
+    ----------
+    path : string
+        Path of the script.
+
+    Returns
+    -------
+    module : module
+        The imported script.
+    """
+    name = 'cafevisit_{}'.format(os.path.splitext(path)[0].replace(os.sep, '_'))
+
+    if name in sys.modules:
+
+        return sys.modules[name]
+
+    spec = importlib.util.spec_from_file_location(name, os.path.abspath(path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+
+    return module
+
+
+def select_countries(countries = None, region = 'Sub-Saharan Africa'):
+    """
+    This function selects the countries to
+    process from the country metadata.
+
+    Parameters
+    ----------
+    countries : list
+        Country iso3 codes, overriding `region`.
+    region : string
+        Region of the countries, all if None.
+
+    Returns
+    -------
+    selected : dataframe
+        Metadata of the selected countries.
+    """
+    import pandas as pd
+
+    metadata = pd.read_csv(COUNTRIES_CSV, encoding = 'latin-1')
+
+    if countries:
+
+        missing = set(countries) - set(metadata['iso3'])
+
+        if missing:
+
+            raise ValueError('Unknown countries: {}'.format(', '.join(sorted(missing))))
+
+        return metadata[metadata['iso3'].isin(countries)]
+
+    metadata = metadata[metadata['Exclude'] == 0]
+
+    if region is not None:
+
+        metadata = metadata[metadata['region'] == region]
+
+
+    return metadata
+
+
+def sub_regions(iso3, lowest):
+    """
+    Sub-region boundaries of a country.
+    """
+    from cafevisit.preprocessing import ProcessRegions
+
+    ProcessRegions(iso3, lowest).process_sub_region_boundaries()
+
+    return None
+
+
+def population(iso3, lowest):
+    """
+    Regional population of a country.
+    """
+    from cafevisit.preprocessing import ProcessPopulation
+
+    ProcessPopulation(COUNTRIES_CSV, iso3, lowest, POP_TIFF).process_population_tif()
+
+    return None
+
+
+def supply_demand(iso3):
+    """
+    Customers and EV service centers of a country.
+    """
+    from cafevisit.supply_demand import SupplyDemand
+
+    SupplyDemand(iso3).customer_ev_centers()
+
+    return None
+
+
+def optimize(iso3, options):
+    """
+    EV service center optimization of a country.
+    """
+    costs = load_script(os.path.join('scripts', 'costs.py'))
+    costs.linear_problem(iso3, **options)
+
+    return None
+
+
+def plot(iso3):
+    """
+    Country figures of the plotting scripts.
+    """
+    for path, names in PLOTS.items():
+
+        module = load_script(path)
+
+        for name in names:
+
+            getattr(module, name)(iso3)
+
+    return None
+
+
+def plan(stage, tasks):
+    """
+    Print the work of a stage without running it.
+    """
+    print('{}: {} countries'.format(stage, len(tasks)))
+
+    for task in tasks:
+
+        print('  {}'.format(' '.join(str(item) for item in task)))
+
+    return None
+
+
+def run_stage(args, countries):
+    """
+    This function runs the selected stage
+    for the selected countries.
+
+    Parameters
+    ----------
+    args : Namespace
+        Parsed command line arguments.
+    countries : dataframe
+        Metadata of the selected countries.
+
+    Returns
+    -------
+    summary : dataframe
+        Status of each country from
+        `run_countries`, the merged row counts
+        for `merge` and None for a dry run.
+    """
+    from cafevisit.runner import run_countries
+
+    isos = list(countries['iso3'])
+    lowest = [int(level) for level in countries['lowest']]
+
+    if args.stage == 'boundaries':
+
+        tasks = [(iso3, level) for iso3, level in zip(isos, lowest)]
+
+        if args.dry_run:
+
+            return plan(args.stage, tasks)
+
+        from cafevisit.gadm import ingest_gadm
+        from cafevisit.preprocessing import process_boundaries
+
+        import pandas as pd
+
+        ingest_gadm()
+        summary = process_boundaries(COUNTRIES_CSV, isos, jobs = args.jobs)
+
+        # Countries whose outlines or regions failed have no sub-regions to split
+        failed = summary[summary['status'] == 'Failed']
+        tasks = [task for task in tasks if task[0] not in set(failed['iso3'])]
+
+        return pd.concat([failed, run_countries(sub_regions, tasks, jobs = args.jobs)],
+                         ignore_index = True)
+
+    if args.stage == 'population':
+
+        tasks = [(iso3, level) for iso3, level in zip(isos, lowest)]
+
+        if args.dry_run:
+
+            return plan(args.stage, tasks)
+
+        from cafevisit.preprocessing import process_national_populations
+
+        process_national_populations(POP_TIFF, isos)
+
+        return run_countries(population, tasks, jobs = args.jobs)
+
+    if args.stage == 'supply-demand':
+
+        tasks = [(iso3,) for iso3 in isos]
+
+        if args.dry_run:
+
+            return plan(args.stage, tasks)
+
+        return run_countries(supply_demand, tasks, jobs = args.jobs)
+
+    if args.stage == 'optimize':
+
+        options = {'backend': args.backend, 'formulation': args.formulation,
+                   'k_nearest': args.k_nearest, 'radius_km': args.radius_km}
+
+        for name in ('time_limit', 'mip_gap'):
+
+            if getattr(args, name) is not None:
+
+                options[name] = getattr(args, name)
+
+        tasks = [(iso3, options) for iso3 in isos]
+
+        if args.dry_run:
+
+            return plan(args.stage, tasks)
+
+        costs = load_script(os.path.join('scripts', 'costs.py'))
+
+        return run_countries(optimize, tasks, jobs = args.jobs, size = costs.country_size)
+
+    if args.stage == 'merge':
+
+        if args.dry_run:
+
+            return plan(args.stage, [(iso3,) for iso3 in isos])
+
+        from cafevisit.merge import merge_results
+
+        return merge_results(iso3_list = isos, incremental = not args.full)
+
+    if args.stage == 'plot':
+
+        tasks = [(iso3,) for iso3 in isos]
+
+        if args.dry_run:
+
+            return plan(args.stage, tasks)
+
+        return run_countries(plot, tasks, jobs = args.jobs)
+
+
+def parser():
+    """
+    Command line arguments of each stage.
+    """
+    common = argparse.ArgumentParser(add_help = False)
+    common.add_argument('--countries', nargs = '+', metavar = 'ISO3',
+        help = 'countries to process, overriding --region')
+    common.add_argument('--region', default = 'Sub-Saharan Africa',
+        help = 'region of countries.csv to process, all for every region '
+               '(default: %(default)s)')
+    common.add_argument('--jobs', type = int, default = None,
+        help = 'number of worker processes (default: every core)')
+    common.add_argument('--dry-run', action = 'store_true',
+        help = 'list the planned work without running it')
+    common.add_argument('--profile', metavar = 'STAGE',
+        help = 'profile one stage (e.g. solve) into results/reports/{iso3}')
+    common.add_argument('--profiler', choices = ['cprofile', 'pyinstrument'],
+        default = None, help = 'profiler of --profile (default: cprofile)')
+    common.add_argument('--trace-memory', action = 'store_true',
+        help = 'record the peak Python memory of every stage, slower')
+
+    main_parser = argparse.ArgumentParser(prog = 'cafe-visit',
+        description = 'Capacitated facility location of EV service centers.')
+    stages = main_parser.add_subparsers(dest = 'stage', required = True)
+
+    stages.add_parser('boundaries', parents = [common],
+        help = 'national outlines, regions and sub-region boundaries')
+    stages.add_parser('population', parents = [common],
+        help = 'national population rasters and regional population')
+    stages.add_parser('supply-demand', parents = [common],
+        help = 'customers and potential EV service centers')
+
+    optimize_parser = stages.add_parser('optimize', parents = [common],
+        help = 'optimal EV service center locations')
+    optimize_parser.add_argument('--backend', default = 'cbc',
+        choices = ['cbc', 'highs', 'lagrangian'])
+    optimize_parser.add_argument('--formulation', default = 'strong',
+        choices = ['strong', 'weak'])
+    optimize_parser.add_argument('--k-nearest', type = int, default = None)
+    optimize_parser.add_argument('--radius-km', type = float, default = None)
+    optimize_parser.add_argument('--time-limit', type = float, default = None)
+    optimize_parser.add_argument('--mip-gap', type = float, default = None)
+
+    merge_parser = stages.add_parser('merge', parents = [common],
+        help = 'Sub-Saharan Africa tables of the country results')
+    merge_parser.add_argument('--full', action = 'store_true',
+        help = 'merge every country again instead of only changed ones')
+
+    stages.add_parser('plot', parents = [common], help = 'country figures')
+
+
+    return main_parser
+
+
+def main(argv = None):
+    """
+    Command line entry point, returning 1
+    when the stage failed for a country.
+    """
+    main_parser = parser()
+    args = main_parser.parse_args(argv)
+    region = None if args.region == 'all' else args.region
+
+    try:
+
+        countries = select_countries(args.countries, region)
+
+    except ValueError as e:
+
+        main_parser.error(str(e))
+
+    # Options reach the worker processes through the environment
+    for name, value in [('profile', args.profile), ('profiler', args.profiler),
+                        ('tracemalloc', 'true' if args.trace_memory else None)]:
+
+        if value is not None:
+
+            os.environ['CAFEVISIT_{}'.format(name.upper())] = value
+
+    summary = run_stage(args, countries)
+    status = getattr(summary, 'status', None)
+
+    if status is not None and (status == 'Failed').any():
+
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
@@ -0,0 +1,450 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """
+    This function calculates the
+    haversine distance between every
+    pair of points in two sets of
+    locations in a single broadcast.
+
+    Parameters
+    ----------
+    lat1 : array
+        Latitudes of the first set of locations (n).
+    lon1 : array
+        Longitudes of the first set of locations (n).
+    lat2 : array
+        Latitudes of the second set of locations (m).
+    lon2 : array
+        Longitudes of the second set of locations (m).
+
+    Returns
+    -------
+    distance_km : array
+        An (n, m) array of the haversine
+        distances in kilometers.
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype = float))[:, None]
+    lon1 = np.radians(np.asarray(lon1, dtype = float))[:, None]
+    lat2 = np.radians(np.asarray(lat2, dtype = float))[None, :]
+    lon2 = np.radians(np.asarray(lon2, dtype = float))[None, :]
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    distance_km = np.round(EARTH_RADIUS_KM * c, 4)
+
+
+    return distance_km
+
+
+def access_cost_matrix(distance_km, item):
+    """
+    This function calculates the
+    access cost for an array of
+    customer to EV service center
+    distances.
+
+    Parameters
+    ----------
+    distance_km : array
+        Distances between customers
+        and EV service centers.
+    item : dict
+        Scenario parameters, as found
+        in `cafevisit.inputs.parameters`.
+
+    Returns
+    -------
+    access_cost : array
+        The access cost in US$ with
+        the same shape as `distance_km`.
+    """
+    unit_cost = item['electricity_unit_price'] / item['consumption_ev']
+
+    # A single float64 array, also for the float32 cached distances
+    access_cost = np.multiply(distance_km, unit_cost, dtype = float)
+
+    return np.round(access_cost, 4)
+
+
+def distance_matrix(customers, ev_centers, cache = None, network = None):
+    """
+    This function builds the full
+    customer to EV service center
+    distance matrix. A customer located
+    in the same administrative region as
+    an EV service center has zero
+    distance to it.
+
+    Parameters
+    ----------
+    customers : dataframe
+        Customers with `latitude`, `longitude`
+        and `admin_name` columns.
+    ev_centers : dataframe
+        EV service centers with `latitude`,
+        `longitude` and `admin_name` columns.
+    cache : MatrixCache
+        If given, the haversine distances are
+        read from (or built into) this cache
+        as float32 memory-maps.
+    network : RoadNetwork
+        If given, road distances over this
+        network replace the haversine distances.
+
+    Returns
+    -------
+    distance : array
+        An (customers, ev_centers) array of
+        distances in kilometers, a float32
+        memory-map when `cache` is given.
+    """
+    lat1, lon1 = customers['latitude'].values, customers['longitude'].values
+    lat2, lon2 = ev_centers['latitude'].values, ev_centers['longitude'].values
+
+    provider = haversine_matrix if network is None else network.distance_matrix
+    method = 'haversine' if network is None else network.method
+
+    if cache is None:
+
+        distance = provider(lat1, lon1, lat2, lon2)
+
+    else:
+
+        key = cache.key(lat1, lon1, lat2, lon2, method = method)
+
+        # Copy-on-write, only the pages zeroed below are copied into memory
+        distance = cache.get(key, mode = 'c')
+
+        if distance is None:
+
+            distance = cache.build(key, (len(lat1), len(lat2)), lambda start, end:
+                       provider(lat1[start:end], lon1[start:end], lat2, lon2), mode = 'c')
+
+    same_region = (customers['admin_name'].to_numpy(object)[:, None] ==
+                   ev_centers['admin_name'].to_numpy(object)[None, :])
+    distance[same_region] = 0
+
+
+    return distance
+
+
+def cost_matrices(customers, ev_centers, item, as_dict = False, cache = None,
+                  network = None):
+    """
+    This function builds the full
+    customer to EV service center
+    distance and access cost matrices.
+
+    Parameters
+    ----------
+    customers : dataframe
+        Customers with `latitude`, `longitude`,
+        `admin_name` and `customer_id` columns.
+    ev_centers : dataframe
+        EV service centers with `latitude`,
+        `longitude`, `admin_name` and
+        `ev_center_id` columns.
+    item : dict
+        Scenario parameters.
+    as_dict : bool
+        If True, the nested transport cost
+        dictionary keyed by EV service
+        center and customer is also returned.
+    cache : MatrixCache
+        Optional on-disk distance cache.
+    network : RoadNetwork
+        Optional road network used instead
+        of the haversine distance.
+
+    Returns
+    -------
+    distance : array
+        An (customers, ev_centers) array of
+        distances in kilometers.
+    cost : array
+        An (customers, ev_centers) array of
+        access costs in US$.
+    transport_costs_dict : dict
+        Only returned when `as_dict` is True.
+    """
+    distance = distance_matrix(customers, ev_centers, cache = cache, network = network)
+    cost = access_cost_matrix(distance, item)
+
+    if as_dict:
+
+        transport_costs_dict = cost_matrix_to_dict(cost,
+                customers['customer_id'], ev_centers['ev_center_id'])
+
+        return distance, cost, transport_costs_dict
+
+
+    return distance, cost
+
+
+def cost_matrix_to_dict(cost, customer_ids, ev_center_ids):
+    """
+    This function converts a cost
+    matrix into the nested dictionary
+    previously used by `linear_problem`.
+
+    Parameters
+    ----------
+    cost : array
+        An (customers, ev_centers) array of costs.
+    customer_ids : list
+        Customer ids matching the matrix rows.
+    ev_center_ids : list
+        EV service center ids matching
+        the matrix columns.
+
+    Returns
+    -------
+    transport_costs_dict : dict
+        Costs keyed by EV service center
+        id and then by customer id.
+    """
+    customer_ids = list(customer_ids)
+    transport_costs_dict = {}
+
+    for j, ev_center_id in enumerate(ev_center_ids):
+
+        transport_costs_dict[ev_center_id] = dict(zip(customer_ids,
+                                                      cost[:, j].tolist()))
+
+
+    return transport_costs_dict
+
+
+def nearest_centers(customers, ev_centers, k = None, radius_km = None):
+    """
+    This function finds the k nearest
+    EV service centers and/or the
+    centers within a travel radius
+    of each customer using a haversine
+    BallTree. Without scikit-learn the
+    search falls back to the dense
+    distance matrix.
+
+    Parameters
+    ----------
+    customers : dataframe
+        Customers with `latitude` and `longitude` columns.
+    ev_centers : dataframe
+        EV service centers with `latitude`
+        and `longitude` columns.
+    k : int
+        Number of nearest EV service centers to keep.
+    radius_km : float
+        Travel radius in kilometers.
+
+    Returns
+    -------
+    customer_idx, ev_center_idx : array
+        Row positions of the kept customer
+        and EV service center pairs.
+    """
+    n, m = customers.shape[0], ev_centers.shape[0]
+    customer_idx = [np.empty(0, dtype = int)]
+    ev_center_idx = [np.empty(0, dtype = int)]
+
+    if k is not None:
+
+        k = int(min(max(k, 1), m))
+
+    try:
+
+        from sklearn.neighbors import BallTree
+
+        tree = BallTree(np.radians(ev_centers[['latitude', 'longitude']].values),
+                        metric = 'haversine')
+        points = np.radians(customers[['latitude', 'longitude']].values)
+
+        if k is not None:
+
+            idx = tree.query(points, k = k, return_distance = False)
+            customer_idx.append(np.repeat(np.arange(n), k))
+            ev_center_idx.append(idx.ravel())
+
+        if radius_km is not None:
+
+            idx = tree.query_radius(points, r = radius_km / EARTH_RADIUS_KM)
+            customer_idx.append(np.repeat(np.arange(n), [len(i) for i in idx]))
+            ev_center_idx.append(np.concatenate(idx).astype(int) if n > 0
+                                 else np.empty(0, dtype = int))
+
+    except ImportError:
+
+        distance = haversine_matrix(customers['latitude'].values,
+                    customers['longitude'].values, ev_centers['latitude'].values,
+                    ev_centers['longitude'].values)
+
+        if k is not None:
+
+            idx = np.argpartition(distance, k - 1, axis = 1)[:, :k]
+            customer_idx.append(np.repeat(np.arange(n), k))
+            ev_center_idx.append(idx.ravel())
+
+        if radius_km is not None:
+
+            rows, cols = np.nonzero(distance <= radius_km)
+            customer_idx.append(rows)
+            ev_center_idx.append(cols)
+
+
+    return np.concatenate(customer_idx), np.concatenate(ev_center_idx)
+
+
+def links_feasible(customer_idx, ev_center_idx, demand, capacity, resolution = 0.01):
+    """
+    This function checks whether the
+    customer demand can be met using
+    only the candidate links, by solving
+    a maximum flow problem from the
+    customers to the EV service centers.
+
+    The integer maximum flow counts requests
+    in units of `resolution`, or a power of
+    ten times coarser if the total demand
+    would not fit in int32.
+    Demand is rounded up and capacity down
+    to whole units, so that an infeasible
+    link set is never reported feasible.
+
+    Parameters
+    ----------
+    customer_idx, ev_center_idx : array
+        Candidate customer and EV service
+        center pairs.
+    demand : array
+        Requests of each customer.
+    capacity : array
+        Maximum requests each EV service
+        center can handle.
+    resolution : float
+        Smallest number of requests counted.
+
+    Returns
+    -------
+    feasible : bool
+        True if every request can be served.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import maximum_flow
+
+    demand = np.clip(np.asarray(demand, dtype = float), 0, None)
+    capacity = np.clip(np.asarray(capacity, dtype = float), 0, None)
+    n, m = len(demand), len(capacity)
+
+    # Capacity beyond the total demand is never used, and every flow stays
+    # below int32 even once each customer demand is rounded up
+    capacity = np.minimum(capacity, demand.sum())
+    unit = max(resolution, demand.sum() / (np.iinfo(np.int32).max // 2 - n))
+    unit = resolution * 10 ** np.ceil(np.log10(unit / resolution))
+    demand = np.ceil(demand / unit - 1e-9).astype(np.int64)
+    capacity = np.floor(capacity / unit + 1e-9).astype(np.int64)
+    source, sink = 0, n + m + 1
+
+    # Customer-center arcs carry the customer demand as their capacity
+    rows = np.concatenate([np.full(n, source), 1 + customer_idx,
+                           1 + n + np.arange(m)])
+    cols = np.concatenate([1 + np.arange(n), 1 + n + ev_center_idx,
+                           np.full(m, sink)])
+    data = np.concatenate([demand, demand[customer_idx], capacity])
+
+    graph = csr_matrix((data.astype(np.int32), (rows, cols)),
+                       shape = (n + m + 2, n + m + 2))
+    flow = maximum_flow(graph, source, sink)
+
+
+    return flow.flow_value >= demand.sum()
+
+
+def candidate_links(customers, ev_centers, k = None, radius_km = None,
+                    demand = None, capacity = None, distance = None):
+    """
+    This function prunes the customer to
+    EV service center pairs to the k
+    nearest centers and/or the centers
+    within a travel radius. Centers in the
+    customer's own administrative region
+    are always kept, unless `distance`
+    is infinite as for pairs without a
+    road connection, which the model
+    drops. If `demand` and `capacity` are
+    given and the pruned links cannot
+    serve every request, k is doubled
+    until they can.
+
+    Parameters
+    ----------
+    customers : dataframe
+        Customers with `latitude`, `longitude`
+        and `admin_name` columns.
+    ev_centers : dataframe
+        EV service centers with `latitude`,
+        `longitude` and `admin_name` columns.
+    k : int
+        Number of nearest EV service centers to keep.
+    radius_km : float
+        Travel radius in kilometers.
+    demand : array
+        Requests of each customer.
+    capacity : array
+        Maximum requests of each EV service center.
+    distance : array
+        Optional (customers, ev_centers) array
+        of distances, e.g. road distances.
+
+    Returns
+    -------
+    customer_idx, ev_center_idx : array
+        Sorted row positions of the kept
+        customer and EV service center pairs.
+    """
+    n, m = customers.shape[0], ev_centers.shape[0]
+
+    if k is None and radius_km is None:
+
+        if distance is not None:
+
+            return np.nonzero(np.isfinite(distance))
+
+        return np.repeat(np.arange(n), m), np.tile(np.arange(m), n)
+
+    same_rows, same_cols = np.nonzero(customers['admin_name'].to_numpy(object)[:, None] ==
+                                      ev_centers['admin_name'].to_numpy(object)[None, :])
+
+    while True:
+
+        rows, cols = nearest_centers(customers, ev_centers, k, radius_km)
+        keys = np.unique(np.concatenate([rows, same_rows]) * m +
+                         np.concatenate([cols, same_cols]))
+        customer_idx, ev_center_idx = keys // m, keys % m
+
+        if distance is not None:
+
+            finite = np.isfinite(distance[customer_idx, ev_center_idx])
+            customer_idx, ev_center_idx = customer_idx[finite], ev_center_idx[finite]
+
+        if demand is None or capacity is None or (k is not None and k >= m):
+
+            break
+
+        if links_feasible(customer_idx, ev_center_idx, np.asarray(demand),
+                          np.asarray(capacity)):
+
+            break
+
+        k = 1 if k is None else 2 * k
+        print('Candidate links are infeasible, widening to k = {}'.format(min(k, m)))
+
+
+    return customer_idx, ev_center_idx
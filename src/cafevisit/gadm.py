@@ -0,0 +1,191 @@
+import os
+import shutil
+
+GADM_RAW = os.path.join('data', 'raw', 'boundaries')
+GADM_PARQUET = os.path.join('data', 'processed', 'gadm')
+BBOX_COLUMNS = ['xmin', 'ymin', 'xmax', 'ymax']
+
+
+def partition_path(level, iso3, folder = GADM_PARQUET):
+    """
+    Path of the GeoParquet partition of a
+    country at a GADM level.
+    """
+    return os.path.join(folder, 'gadm36_{}'.format(level),
+                        'GID_0={}'.format(iso3), 'part-0.parquet')
+
+
+def ingest_gadm(levels = range(0, 6), folder_in = GADM_RAW,
+                folder_out = GADM_PARQUET, overwrite = False):
+    """
+    This function converts the GADM layers
+    into GeoParquet partitioned by `GID_0`,
+    with the bounding box of every shape
+    stored in `xmin`, `ymin`, `xmax` and
+    `ymax` columns. Each layer is parsed
+    once so that later country reads only
+    open their own partition.
+
+    Parameters
+    ----------
+    levels : list
+        GADM levels to convert.
+    folder_in : string
+        Folder of the `gadm36_{level}.shp` layers.
+    folder_out : string
+        Root folder of the partitioned layers.
+    overwrite : bool
+        Whether layers already converted are redone.
+
+    Returns
+    -------
+    ingested : list
+        Levels converted by this call.
+    """
+    import geopandas as gpd
+    from cafevisit.storage import has_parquet
+
+    if not has_parquet():
+
+        print('No Parquet engine, GADM layers are read from the shapefiles')
+
+        return []
+
+    ingested = []
+    for level in levels:
+
+        path_in = os.path.join(folder_in, 'gadm36_{}.shp'.format(level))
+        folder_level = os.path.join(folder_out, 'gadm36_{}'.format(level))
+
+        if not os.path.exists(path_in):
+
+            continue
+
+        if os.path.exists(folder_level) and not overwrite:
+
+            continue
+
+        print('Ingesting GADM level {}'.format(level))
+        layer = gpd.read_file(path_in)
+        layer[BBOX_COLUMNS] = layer.geometry.bounds.values
+
+        # Partitions are written next to the layer and swapped in at the end
+        folder_tmp = '{}.{}.tmp'.format(folder_level, os.getpid())
+        for iso3, country in layer.groupby('GID_0', sort = False):
+
+            path_out = os.path.join(folder_tmp, 'GID_0={}'.format(iso3), 'part-0.parquet')
+            os.makedirs(os.path.dirname(path_out), exist_ok = True)
+            country.reset_index(drop = True).to_parquet(path_out, index = False)
+
+        if os.path.exists(folder_level):
+
+            shutil.rmtree(folder_level)
+
+        os.replace(folder_tmp, folder_level)
+        ingested.append(level)
+
+
+    return ingested
+
+
+def read_gadm(level, iso3, bbox = None, folder = GADM_PARQUET,
+              folder_raw = GADM_RAW):
+    """
+    This function reads the shapes of one
+    country at a GADM level from its
+    GeoParquet partition, falling back on
+    the GADM shapefile when the level has
+    not been ingested.
+
+    Parameters
+    ----------
+    level : int
+        GADM level.
+    iso3 : string
+        Country iso3.
+    bbox : tuple
+        Optional (xmin, ymin, xmax, ymax) box,
+        only the shapes intersecting it are read.
+    folder : string
+        Root folder of the partitioned layers.
+    folder_raw : string
+        Folder of the GADM shapefiles.
+
+    Returns
+    -------
+    shapes : geodataframe
+        Shapes of the country.
+    """
+    import geopandas as gpd
+
+    path = partition_path(level, iso3, folder)
+
+    if os.path.exists(os.path.join(folder, 'gadm36_{}'.format(level))):
+
+        if not os.path.exists(path):
+
+            return gpd.GeoDataFrame({'GID_0': []}, geometry = [], crs = 'epsg:4326')
+
+        filters = None
+
+        if bbox is not None:
+
+            xmin, ymin, xmax, ymax = bbox
+            filters = [('xmin', '<=', xmax), ('xmax', '>=', xmin),
+                       ('ymin', '<=', ymax), ('ymax', '>=', ymin)]
+
+        shapes = gpd.read_parquet(path, filters = filters)
+
+        return shapes.drop(columns = BBOX_COLUMNS).reset_index(drop = True)
+
+    path_raw = os.path.join(folder_raw, 'gadm36_{}.shp'.format(level))
+    shapes = gpd.read_file(path_raw, bbox = bbox)
+    shapes = shapes[shapes.GID_0 == iso3]
+
+
+    return shapes.reset_index(drop = True)
+
+
+def read_gadm_countries(level, iso3_list, folder = GADM_PARQUET,
+                        folder_raw = GADM_RAW):
+    """
+    This function reads the shapes of many
+    countries at a GADM level, parsing the
+    GADM shapefile at most once.
+
+    Parameters
+    ----------
+    level : int
+        GADM level.
+    iso3_list : list
+        Country iso3 codes.
+    folder : string
+        Root folder of the partitioned layers.
+    folder_raw : string
+        Folder of the GADM shapefiles.
+
+    Returns
+    -------
+    shapes : geodataframe
+        Shapes of all the countries.
+    """
+    import geopandas as gpd
+    import pandas as pd
+
+    if os.path.exists(os.path.join(folder, 'gadm36_{}'.format(level))):
+
+        frames = [read_gadm(level, iso3, folder = folder) for iso3 in iso3_list
+                  if os.path.exists(partition_path(level, iso3, folder))]
+
+        if len(frames) == 0:
+
+            return gpd.GeoDataFrame({'GID_0': []}, geometry = [], crs = 'epsg:4326')
+
+        return pd.concat(frames, ignore_index = True)
+
+    path_raw = os.path.join(folder_raw, 'gadm36_{}.shp'.format(level))
+    shapes = gpd.read_file(path_raw)
+    shapes = shapes[shapes.GID_0.isin(iso3_list)]
+
+
+    return shapes.reset_index(drop = True)
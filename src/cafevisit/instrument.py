@@ -0,0 +1,442 @@
+import configparser
+import functools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+BASE_PATH = CONFIG['file_locations']['base_path']
+DATA_REPORTS = os.path.join(BASE_PATH, '..', 'results', 'reports')
+
+# Finished stage records and the stages currently open, of this process
+RECORDS = []
+OPEN = []
+COUNTRY = []
+
+
+def option(name, default):
+    """
+    Instrumentation option, from a
+    `CAFEVISIT_{NAME}` environment variable,
+    which reaches the worker processes of
+    `run_countries`, or from the `[instrument]`
+    section of the config.
+    """
+    return os.environ.get('CAFEVISIT_{}'.format(name.upper()),
+                          CONFIG.get('instrument', name, fallback = default))
+
+
+def rss():
+    """
+    Current resident memory of the process
+    in MB, from /proc on Linux or psutil
+    elsewhere, None where unavailable.
+    """
+    try:
+
+        with open('/proc/self/statm') as f:
+
+            pages = int(f.read().split()[1])
+
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2, 1)
+
+    except (OSError, ValueError, IndexError, AttributeError):
+
+        pass
+
+    try:
+
+        import psutil
+
+    except ImportError:
+
+        return None
+
+    return round(psutil.Process().memory_info().rss / 1024 ** 2, 1)
+
+
+def reset_peak_rss():
+    """
+    This function restarts the peak resident
+    memory of the process (Linux only).
+
+    Returns
+    -------
+    reset : bool
+        Whether the peak was restarted.
+    """
+    try:
+
+        with open('/proc/self/clear_refs', 'w') as f:
+
+            f.write('5')
+
+    except OSError:
+
+        return False
+
+    return True
+
+
+def peak_rss():
+    """
+    Peak resident memory of the process in
+    MB since the last `reset_peak_rss`.
+    """
+    with open('/proc/self/status') as f:
+
+        for line in f:
+
+            if line.startswith('VmHWM:'):
+
+                return round(int(line.split()[1]) / 1024, 1)
+
+    return None
+
+
+def note(**counts):
+    """
+    This function adds counts, e.g. `rows` or
+    `variables`, to the innermost open stage.
+    It does nothing outside a stage.
+    """
+    if OPEN:
+
+        OPEN[-1].update(counts)
+
+    return None
+
+
+@contextmanager
+def country(iso3):
+    """
+    Attribute the stages run inside the
+    block to a country.
+    """
+    COUNTRY.append(iso3)
+
+    try:
+
+        yield iso3
+
+    finally:
+
+        COUNTRY.pop()
+
+
+@contextmanager
+def profiled(name, iso3):
+    """
+    Run a block under cProfile or pyinstrument
+    and write the profile to the report folder.
+    """
+    folder = os.path.join(DATA_REPORTS, str(iso3))
+    os.makedirs(folder, exist_ok = True)
+
+    if option('profiler', 'cprofile') == 'pyinstrument':
+
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+
+        try:
+
+            yield
+
+        finally:
+
+            profiler.stop()
+            with open(os.path.join(folder, '{}.html'.format(name)), 'w') as f:
+
+                f.write(profiler.output_html())
+
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    try:
+
+        yield
+
+    finally:
+
+        profiler.disable()
+        profiler.dump_stats(os.path.join(folder, '{}.prof'.format(name)))
+
+
+@contextmanager
+def stage(name, iso3 = None):
+    """
+    This function records the wall time, CPU
+    time and memory of a block of code as one
+    pipeline stage, along with the counts
+    given to `note`. Stages nest, each record
+    naming its parent stage. The resident
+    memory is sampled at the start and end of
+    the stage and, on Linux, its peak during
+    the stage is recorded too.
+
+    Parameters
+    ----------
+    name : string
+        Stage name, e.g. `solve`.
+    iso3 : string
+        Country of the stage, the one of the
+        enclosing `country` block if None.
+
+    Yields
+    ------
+    record : dict
+        The stage record, which counts can
+        also be added to directly.
+    """
+    if option('enabled', 'true').lower() != 'true':
+
+        yield {}
+        return
+
+    if iso3 is None and COUNTRY:
+
+        iso3 = COUNTRY[-1]
+
+    record = {'iso3': iso3, 'stage': name, 'parent': OPEN[-1]['stage'] if OPEN else None,
+              'start': datetime.now().isoformat(timespec = 'seconds')}
+
+    if option('tracemalloc', 'false').lower() == 'true' and not tracemalloc.is_tracing():
+
+        tracemalloc.start()
+
+    if tracemalloc.is_tracing():
+
+        # The peak of the enclosing stage is kept before the counter restarts
+        if OPEN:
+
+            OPEN[-1]['_peak'] = max(OPEN[-1].get('_peak', 0), tracemalloc.get_traced_memory()[1])
+
+        tracemalloc.reset_peak()
+
+    # As for tracemalloc, the peak of the enclosing stage is kept first
+    if OPEN and '_peak_rss' in OPEN[-1]:
+
+        OPEN[-1]['_peak_rss'] = max(OPEN[-1]['_peak_rss'], peak_rss())
+
+    if reset_peak_rss():
+
+        record['_peak_rss'] = 0
+
+    record['rss_start_mb'] = rss()
+    OPEN.append(record)
+    wall, cpu = time.perf_counter(), time.process_time()
+
+    try:
+
+        if name == option('profile', ''):
+
+            with profiled(name, iso3):
+
+                yield record
+
+        else:
+
+            yield record
+
+    except BaseException as e:
+
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+        raise
+
+    finally:
+
+        record['wall_time'] = round(time.perf_counter() - wall, 3)
+        record['cpu_time'] = round(time.process_time() - cpu, 3)
+        record['rss_end_mb'] = rss()
+        OPEN.pop()
+
+        if record['rss_start_mb'] is not None and record['rss_end_mb'] is not None:
+
+            record['rss_delta_mb'] = round(record['rss_end_mb'] - record['rss_start_mb'], 1)
+
+        if '_peak_rss' in record:
+
+            peak = max(peak_rss(), record.pop('_peak_rss'))
+            record['peak_rss_mb'] = peak
+
+            if OPEN and '_peak_rss' in OPEN[-1]:
+
+                OPEN[-1]['_peak_rss'] = max(OPEN[-1]['_peak_rss'], peak)
+
+        if tracemalloc.is_tracing():
+
+            peak = max(tracemalloc.get_traced_memory()[1], record.pop('_peak', 0))
+            record['peak_memory_mb'] = round(peak / 1024 ** 2, 1)
+
+            if OPEN:
+
+                OPEN[-1]['_peak'] = max(OPEN[-1].get('_peak', 0), peak)
+
+        RECORDS.append(record)
+
+
+def instrument(name):
+    """
+    Decorator recording each call of a
+    function as the stage `name`. The
+    country is taken from the `country_iso3`
+    of a pipeline class instance.
+    """
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+
+            iso3 = getattr(args[0], 'country_iso3', None) if args else None
+
+            with stage(name, iso3):
+
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+    return decorator
+
+
+def pop_records(iso3 = None):
+    """
+    Remove and return the finished records
+    of a country, or all of them if None.
+    """
+    records, kept = [], []
+    for record in RECORDS:
+
+        (records if iso3 is None or record['iso3'] == iso3 else kept).append(record)
+
+    RECORDS[:] = kept
+
+
+    return records
+
+
+def write_report(report, filename, folder = DATA_REPORTS):
+    """
+    This function writes a report as JSON
+    through a temporary file of the process,
+    so that readers never see a partial file.
+
+    Parameters
+    ----------
+    report : dict
+        Report content.
+    filename : string
+        File name in the report folder.
+    folder : string
+        Report folder.
+
+    Returns
+    -------
+    path : string
+        Path of the written report.
+    """
+    os.makedirs(folder, exist_ok = True)
+    path = os.path.join(folder, filename)
+    path_tmp = '{}.{}.tmp'.format(path, os.getpid())
+
+    with open(path_tmp, 'w') as f:
+
+        json.dump(report, f, indent = 1, default = str)
+
+    os.replace(path_tmp, path)
+
+
+    return path
+
+
+def country_report(iso3, name, result, folder = DATA_REPORTS):
+    """
+    This function records a run of a country
+    in `results/reports/{iso3}.json`, which
+    keeps the latest run of every entry point
+    (e.g. `process_country`, `linear_problem`,
+    `write_boundaries_gid1`).
+
+    Parameters
+    ----------
+    iso3 : string
+        Country iso3.
+    name : string
+        Name of the run, the function name with
+        any arguments telling its runs apart.
+    result : dict
+        Status, wall time and stage records.
+    folder : string
+        Report folder.
+
+    Returns
+    -------
+    path : string
+        Path of the written report.
+    """
+    path = os.path.join(folder, '{}.json'.format(iso3))
+    report = {'iso3': iso3, 'runs': {}}
+
+    if os.path.exists(path):
+
+        with open(path) as f:
+
+            report = json.load(f)
+
+    report['updated'] = datetime.now().isoformat(timespec = 'seconds')
+    report['runs'][name] = result
+
+
+    return write_report(report, '{}.json'.format(iso3), folder)
+
+
+def run_report(name, results, folder = DATA_REPORTS):
+    """
+    This function writes the report of a
+    multi-country run, with the status, wall
+    time and stage records of every country
+    and the totals of every stage, to
+    `results/reports/run_{time}_{pid}_{name}.json`,
+    the time in microseconds.
+
+    Parameters
+    ----------
+    name : string
+        Name of the function run per country.
+    results : list
+        Results of `run_country`.
+    folder : string
+        Report folder.
+
+    Returns
+    -------
+    path : string
+        Path of the written report.
+    """
+    started = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+    stages = {}
+    for result in results:
+
+        for record in result.get('stages', []):
+
+            total = stages.setdefault(record['stage'], {'count': 0, 'wall_time': 0,
+                                                        'cpu_time': 0})
+            total['count'] += 1
+            total['wall_time'] = round(total['wall_time'] + record['wall_time'], 3)
+            total['cpu_time'] = round(total['cpu_time'] + record['cpu_time'], 3)
+
+    report = {'run': name, 'written': started, 'countries': results, 'stages': stages}
+
+
+    return write_report(report, 'run_{}_{}_{}.json'.format(started, os.getpid(), name), folder)
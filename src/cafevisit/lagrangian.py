@@ -0,0 +1,281 @@
+import time
+import numpy as np
+from scipy import sparse
+from cafevisit.solvers import Solution
+
+
+def center_subproblems(model, multipliers):
+    """
+    This function solves the Lagrangian
+    subproblem of every EV service center.
+    With the demand constraints relaxed,
+    each center becomes a continuous
+    knapsack: it serves the customers with
+    the most negative reduced cost first,
+    up to its capacity, and is built if
+    that outweighs its fixed cost.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Model to relax.
+    multipliers : array
+        Lagrange multipliers of the customer
+        demand constraints.
+
+    Returns
+    -------
+    lower_bound : float
+        Value of the Lagrangian function.
+    flows : array
+        Requests served over each candidate link.
+    center_value : array
+        Subproblem value of each EV service center
+        if built, used to rank centers.
+    """
+    demand = np.clip(model.demand, 0, None)
+    reduced_cost = model.link_cost - multipliers[model.customer_idx]
+
+    # Group the links by center and order them by reduced cost
+    order = np.lexsort((reduced_cost, model.ev_center_idx))
+    centers = model.ev_center_idx[order]
+    rc = reduced_cost[order]
+    link_demand = np.where(rc < 0, demand[model.customer_idx[order]], 0)
+
+    served_before = np.cumsum(link_demand) - link_demand
+    first = np.searchsorted(centers, centers, side = 'left')
+    served_before -= served_before[first]
+
+    taken = np.clip(model.capacity[centers] - served_before, 0, link_demand)
+    center_value = model.fixed_cost + np.bincount(centers, weights = taken * rc,
+                                                  minlength = model.n_ev_centers)
+
+    built = center_value < 0
+    flows = np.zeros(model.n_links)
+    flows[order] = np.where(built[centers], taken, 0)
+
+    lower_bound = multipliers @ model.demand + np.minimum(center_value, 0).sum()
+
+
+    return lower_bound, flows, center_value
+
+
+def transport_flows(model, open_centers):
+    """
+    This function assigns the customer
+    demand to a fixed set of open EV
+    service centers by solving the
+    transportation linear program.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Model to repair.
+    open_centers : array
+        Boolean array of the open EV service centers.
+
+    Returns
+    -------
+    flows : array
+        Requests served over each candidate link,
+        or None if the open centers cannot serve
+        every request.
+    """
+    from scipy.optimize import linprog
+
+    usable = np.nonzero(open_centers[model.ev_center_idx])[0]
+    n = len(usable)
+    links = np.arange(n)
+
+    A_eq = sparse.csr_matrix((np.ones(n), (model.customer_idx[usable], links)),
+                             shape = (model.n_customers, n))
+    A_ub = sparse.csr_matrix((np.ones(n), (model.ev_center_idx[usable], links)),
+                             shape = (model.n_ev_centers, n))
+    result = linprog(model.link_cost[usable], A_ub = A_ub, b_ub = model.capacity,
+                     A_eq = A_eq, b_eq = model.demand, bounds = (0, None),
+                     method = 'highs')
+
+    if result.status != 0:
+
+        return None
+
+    flows = np.zeros(model.n_links)
+    flows[usable] = result.x
+
+
+    return flows
+
+
+def repair(model, built, center_value):
+    """
+    This function turns the subproblem
+    solution into a feasible one. EV
+    service centers are opened in order
+    of their subproblem value until every
+    request can be served, and centers
+    left without customers are closed.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Model to repair.
+    built : array
+        Boolean array of the centers built in
+        the subproblem solution.
+    center_value : array
+        Subproblem value of each center.
+
+    Returns
+    -------
+    upper_bound : float
+        Cost of the feasible solution, or inf.
+    open_centers : array
+        Boolean array of the open centers.
+    flows : array
+        Requests served over each candidate link.
+    """
+    open_centers = built.copy()
+    candidates = [j for j in np.argsort(center_value) if not open_centers[j]]
+    total_demand = np.clip(model.demand, 0, None).sum()
+
+    while model.capacity[open_centers].sum() < total_demand and candidates:
+
+        open_centers[candidates.pop(0)] = True
+
+    flows = transport_flows(model, open_centers)
+
+    while flows is None and candidates:
+
+        open_centers[candidates.pop(0)] = True
+        flows = transport_flows(model, open_centers)
+
+    if flows is None:
+
+        return np.inf, open_centers, np.zeros(model.n_links)
+
+    open_centers &= np.bincount(model.ev_center_idx, weights = flows,
+                                minlength = model.n_ev_centers) > 0
+    upper_bound = model.fixed_cost @ open_centers + model.link_cost @ flows
+
+
+    return upper_bound, open_centers, flows
+
+
+def lagrangian_relaxation(model, time_limit = None, mip_gap = 0.01,
+                          threads = None, msg = False, max_iter = 500,
+                          repair_every = 10):
+    """
+    This function solves a CFLP model by
+    Lagrangian relaxation of the customer
+    demand constraints, with subgradient
+    updates of the multipliers.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Model to solve.
+    time_limit : float
+        Time limit in seconds.
+    mip_gap : float
+        Relative gap between the bounds at which to stop.
+    threads : int
+        Unused, kept for backend compatibility.
+    msg : bool
+        Whether to print the progress.
+    max_iter : int
+        Maximum number of subgradient iterations.
+    repair_every : int
+        Number of iterations between repair heuristics.
+
+    Returns
+    -------
+    solution : Solution
+        Best feasible solution, with the best
+        Lagrangian lower bound.
+    """
+    start = time.perf_counter()
+    mip_gap = 0.01 if mip_gap is None else mip_gap
+
+    # Start from the cheapest cost of serving one request at each customer
+    multipliers = np.full(model.n_customers, np.inf)
+    np.minimum.at(multipliers, model.customer_idx, model.link_cost +
+                  model.fixed_cost[model.ev_center_idx] /
+                  np.maximum(model.capacity[model.ev_center_idx], 1e-9))
+    multipliers[~np.isfinite(multipliers)] = 0
+
+    lower_bound, upper_bound = -np.inf, np.inf
+    open_centers = np.zeros(model.n_ev_centers, dtype = bool)
+    flows = np.zeros(model.n_links)
+    step_scale, stalled = 2.0, 0
+
+    for iteration in range(max_iter):
+
+        bound, sub_flows, center_value = center_subproblems(model, multipliers)
+
+        if bound > lower_bound + 1e-9:
+
+            lower_bound, stalled = bound, 0
+
+        else:
+
+            stalled += 1
+
+        if iteration % repair_every == 0:
+
+            cost, repaired, repaired_flows = repair(model, center_value < 0, center_value)
+
+            if cost < upper_bound:
+
+                upper_bound, open_centers, flows = cost, repaired, repaired_flows
+
+        if msg:
+
+            print('Iteration {}: lower bound {:.2f}, upper bound {:.2f}'.format(
+                  iteration, lower_bound, upper_bound))
+
+        if np.isfinite(upper_bound) and \
+           (upper_bound - lower_bound) / max(abs(upper_bound), 1e-9) <= mip_gap:
+
+            break
+
+        if time_limit is not None and time.perf_counter() - start > time_limit:
+
+            break
+
+        # Halve the step when the bound stops improving
+        if stalled >= 20:
+
+            step_scale, stalled = step_scale / 2, 0
+
+        subgradient = model.demand - np.bincount(model.customer_idx, weights = sub_flows,
+                                                 minlength = model.n_customers)
+        norm = subgradient @ subgradient
+
+        if norm == 0 or step_scale < 1e-6:
+
+            break
+
+        target = upper_bound if np.isfinite(upper_bound) else abs(bound) * 1.1 + 1
+        multipliers = multipliers + step_scale * (target - bound) / norm * subgradient
+
+    cost, repaired, repaired_flows = repair(model, center_value < 0, center_value)
+    if cost < upper_bound:
+
+        upper_bound, open_centers, flows = cost, repaired, repaired_flows
+
+    # The repair heuristic failing does not prove the instance infeasible
+    if not np.isfinite(upper_bound):
+
+        status, upper_bound = 'Not Solved', None
+
+    else:
+
+        # Only closed bounds prove optimality, a gap stop within mip_gap does not
+        gap = (upper_bound - lower_bound) / max(abs(upper_bound), 1e-9)
+        status = 'Optimal' if gap <= 1e-9 else 'Feasible'
+
+    timing = {'solve': time.perf_counter() - start}
+
+
+    return Solution(status, upper_bound, open_centers, flows, timing,
+                    'lagrangian', lower_bound = lower_bound)
@@ -0,0 +1,220 @@
+import configparser
+import json
+import os
+import pandas as pd
+from cafevisit.storage import read_table, table_path, write_table
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+BASE_PATH = CONFIG['file_locations']['base_path']
+DATA_RESULTS = os.path.join(BASE_PATH, '..', 'results', 'final')
+DATA_AFRICA = os.path.join(BASE_PATH, '..', 'results', 'SSA')
+
+southern = ['AGO', 'ZMB', 'ZWE', 'NAM', 'BWA', 'ZAF', 'LSO',
+            'SWZ', 'MOZ', 'MWI']
+
+central = ['CMR', 'CAF', 'TCD', 'COD', 'GNQ', 'GAB', 'STP']
+
+eastern = ['BDI', 'COM', 'DJI', 'ERI', 'ETH', 'SWZ', 'MDG',
+           'KEN', 'MUS', 'SDN', 'SYC', 'SOM', 'SSD', 'UGA',
+           'TZA', 'RWA']
+
+west = ['BEN', 'BFA', 'CPV', 'CIV', 'GMB', 'GHA', 'GIN',
+        'GNB', 'LBR', 'MLI', 'MRT', 'NER', 'NGA', 'SEN',
+        'SLE', 'TGO']
+
+# Southern wins over Central and Eastern, every other country is West
+SUB_REGIONS = {}
+for label, isos in [('Eastern', eastern), ('Central', central), ('Southern', southern)]:
+
+    SUB_REGIONS.update(dict.fromkeys(isos, label))
+
+# Merged table name and location of each country table
+TABLES = {
+    '_customers.csv': '',
+    '_ev_centers.csv': '',
+    '_optimized_ev_center.csv': '',
+    '_region.csv': '',
+    '_population_results.csv': 'population',
+}
+
+# Merged tables read by vis/maps.R, always exported as CSV too
+CSV_TABLES = ['_optimized_ev_center.csv', '_population_results.csv']
+
+
+def sub_region(iso3):
+    """
+    Sub-Saharan Africa sub-region of a country.
+    """
+    return SUB_REGIONS.get(iso3, 'West')
+
+
+def fingerprint(path):
+    """
+    Modification time and size of a file,
+    used to detect changed country tables.
+    """
+    stat = os.stat(path)
+
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def scan_results(folder = DATA_RESULTS, iso3_list = None):
+    """
+    This function lists the country tables
+    of every kind in a single scan of the
+    results folder.
+
+    Parameters
+    ----------
+    folder : string
+        Folder holding one folder per country.
+    iso3_list : list
+        Countries to include, all if None.
+
+    Returns
+    -------
+    tables : dict
+        For each table suffix, a dictionary
+        of country iso3 to table path.
+    """
+    tables = {suffix: {} for suffix in TABLES}
+
+    if not os.path.exists(folder):
+
+        return tables
+
+    isos = sorted(entry.name for entry in os.scandir(folder) if entry.is_dir())
+
+    for iso3 in isos:
+
+        if iso3_list is not None and iso3 not in iso3_list:
+
+            continue
+
+        for suffix, subfolder in TABLES.items():
+
+            path = table_path(os.path.join(folder, iso3, subfolder,
+                              '{}{}'.format(iso3, suffix)))
+
+            if path is not None:
+
+                tables[suffix][iso3] = path
+
+
+    return tables
+
+
+def read_country(iso3, path):
+    """
+    Read a country table and label its rows
+    with the country and its sub-region.
+    """
+    df = read_table(path)
+    df['region'] = sub_region(iso3)
+
+    if 'iso3' not in df.columns:
+
+        df['iso3'] = iso3
+
+    return df
+
+
+def merge_results(folder = DATA_RESULTS, folder_out = DATA_AFRICA,
+                  iso3_list = None, incremental = False):
+    """
+    This function merges the country tables
+    into the Sub-Saharan Africa tables
+    (e.g. `SSA_customers`), writing each one
+    once. With `incremental`, only the
+    countries whose tables changed since the
+    previous merge are read again.
+
+    Parameters
+    ----------
+    folder : string
+        Folder holding one folder per country.
+    folder_out : string
+        Folder of the merged tables.
+    iso3_list : list
+        Countries to merge, all if None. With
+        `incremental`, the other countries keep
+        their rows of the previous merge.
+    incremental : bool
+        Whether unchanged countries are kept
+        from the previous merged tables.
+
+    Returns
+    -------
+    merged : dict
+        Number of rows of each merged table.
+    """
+    tables = scan_results(folder, iso3_list)
+    path_manifest = os.path.join(folder_out, 'manifest.json')
+    manifest = {}
+
+    if incremental and os.path.exists(path_manifest):
+
+        with open(path_manifest) as f:
+
+            manifest = json.load(f)
+
+    if not os.path.exists(folder_out):
+
+        os.makedirs(folder_out)
+
+    merged = {}
+    for suffix, paths in tables.items():
+
+        path_out = os.path.join(folder_out, 'SSA{}'.format(suffix))
+        previous = manifest.get(suffix, {})
+        current = {iso3: fingerprint(path) for iso3, path in paths.items()}
+        csv = suffix in CSV_TABLES
+
+        if incremental and iso3_list is not None:
+
+            # Countries outside the subset keep their previous rows
+            current.update({iso3: value for iso3, value in previous.items()
+                            if iso3 not in iso3_list})
+
+        if (incremental and previous == current and table_path(path_out) is not None
+            and (not csv or os.path.exists(path_out))):
+
+            print('No change in SSA{}'.format(suffix))
+            continue
+
+        frames = []
+        changed = [iso3 for iso3 in current if previous.get(iso3) != current[iso3]]
+
+        if incremental and previous and table_path(path_out) is not None:
+
+            # Keep the rows of the unchanged countries
+            kept = read_table(path_out)
+            unchanged = [iso3 for iso3 in current if iso3 not in changed]
+            frames.append(kept[kept['iso3'].isin(unchanged)])
+
+        else:
+
+            # Without a previous table, only the scanned countries are merged
+            current = {iso3: current[iso3] for iso3 in paths}
+            changed = list(current)
+
+        print('Merging SSA{} from {} countries'.format(suffix, len(changed)))
+        frames += [read_country(iso3, paths[iso3]) for iso3 in changed]
+
+        if len(frames) == 0:
+
+            continue
+
+        merged_data = pd.concat(frames, ignore_index = True)
+        write_table(merged_data, path_out, csv = csv or None)
+
+        manifest[suffix] = current
+        merged[suffix] = len(merged_data)
+
+    with open(path_manifest, 'w') as f:
+
+        json.dump(manifest, f, indent = 1)
+
+
+    return merged
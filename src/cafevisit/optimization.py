@@ -0,0 +1,276 @@
+import numpy as np
+from scipy import sparse
+
+
+class CFLPModel:
+
+    """
+    This class assembles the capacitated
+    facility location problem (CFLP) as
+    sparse coefficient arrays.
+
+    The variables are ordered as the
+    customer-EV service center link flows
+    (x) followed by the EV service center
+    build decisions (y).
+    """
+
+
+    def __init__(self, cost, demand, capacity, fixed_cost,
+                 customer_idx = None, ev_center_idx = None,
+                 formulation = 'strong'):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        cost : array
+            An (customers, ev_centers) matrix of access
+            costs. Non-finite entries are treated as
+            missing links.
+        demand : array
+            Requests of each customer.
+        capacity : array
+            Maximum requests each EV service
+            center can handle.
+        fixed_cost : array
+            Fixed cost of building each
+            EV service center.
+        customer_idx, ev_center_idx : array
+            Row and column positions of the candidate
+            links. All finite pairs are used if not given.
+        formulation : string
+            'strong' to link every customer flow to
+            the build decision (x_ij <= d_i * y_j) or
+            'weak' to aggregate the linking constraint
+            per EV service center.
+        """
+        if formulation not in ('strong', 'weak'):
+
+            raise ValueError('Unknown formulation {}'.format(formulation))
+
+        # Not converted as a whole, e.g. a float32 memory-mapped matrix
+        cost = np.asarray(cost)
+        self.n_customers, self.n_ev_centers = cost.shape
+        self.formulation = formulation
+
+        if customer_idx is None or ev_center_idx is None:
+
+            customer_idx, ev_center_idx = np.nonzero(np.isfinite(cost))
+
+        # Links without a finite cost, e.g. no road connection, are dropped
+        customer_idx = np.asarray(customer_idx, dtype = np.int64)
+        ev_center_idx = np.asarray(ev_center_idx, dtype = np.int64)
+        finite = np.isfinite(cost[customer_idx, ev_center_idx])
+        self.customer_idx = customer_idx[finite]
+        self.ev_center_idx = ev_center_idx[finite]
+        self.n_links = len(self.customer_idx)
+        self.n_vars = self.n_links + self.n_ev_centers
+
+        self.demand = np.asarray(demand, dtype = float)
+        self.capacity = np.broadcast_to(np.asarray(capacity, dtype = float),
+                                        (self.n_ev_centers,)).copy()
+        self.fixed_cost = np.broadcast_to(np.asarray(fixed_cost, dtype = float),
+                                          (self.n_ev_centers,)).copy()
+        self.link_cost = cost[self.customer_idx, self.ev_center_idx].astype(float)
+
+        self.objective = np.concatenate([self.link_cost, self.fixed_cost])
+        self.integrality = np.concatenate([np.zeros(self.n_links, dtype = np.int8),
+                                           np.ones(self.n_ev_centers, dtype = np.int8)])
+        self.lower = np.zeros(self.n_vars)
+        self.upper = np.concatenate([np.full(self.n_links, np.inf),
+                                     np.ones(self.n_ev_centers)])
+
+        self.build_constraints()
+
+
+    def build_constraints(self):
+        """
+        This function assembles the demand
+        (equality), capacity and linking
+        (inequality) constraint matrices.
+        """
+        links = np.arange(self.n_links)
+        y_cols = self.n_links + self.ev_center_idx
+
+        # Demand: sum_j x_ij == d_i
+        self.A_eq = sparse.csr_matrix((np.ones(self.n_links),
+                    (self.customer_idx, links)),
+                    shape = (self.n_customers, self.n_vars))
+        self.b_eq = self.demand.copy()
+
+        # Capacity: sum_i x_ij - Q_j * y_j <= 0
+        centers = np.arange(self.n_ev_centers)
+        capacity = sparse.csr_matrix((np.concatenate([np.ones(self.n_links),
+                    -self.capacity]), (np.concatenate([self.ev_center_idx, centers]),
+                    np.concatenate([links, self.n_links + centers]))),
+                    shape = (self.n_ev_centers, self.n_vars))
+
+        if self.formulation == 'strong':
+
+            # Linking: x_ij - d_i * y_j <= 0
+            linking = sparse.csr_matrix((np.concatenate([np.ones(self.n_links),
+                      -self.demand[self.customer_idx]]), (np.concatenate([links, links]),
+                      np.concatenate([links, y_cols]))),
+                      shape = (self.n_links, self.n_vars))
+
+        else:
+
+            # Linking: sum_i x_ij - (sum_i d_i) * y_j <= 0
+            linked_demand = np.bincount(self.ev_center_idx, weights =
+                            self.demand[self.customer_idx], minlength = self.n_ev_centers)
+            linking = sparse.csr_matrix((np.concatenate([np.ones(self.n_links),
+                      -linked_demand]), (np.concatenate([self.ev_center_idx, centers]),
+                      np.concatenate([links, self.n_links + centers]))),
+                      shape = (self.n_ev_centers, self.n_vars))
+
+        self.A_ub = sparse.vstack([capacity, linking], format = 'csr')
+        self.b_ub = np.zeros(self.A_ub.shape[0])
+
+        # Positions of the build decision coefficients, rewritten by update()
+        rows = np.repeat(np.arange(self.A_ub.shape[0]), np.diff(self.A_ub.indptr))
+        self.y_entries = np.nonzero(self.A_ub.indices >= self.n_links)[0]
+        self.y_rows = rows[self.y_entries]
+
+        return None
+
+
+    def update(self, link_cost = None, demand = None, capacity = None,
+               fixed_cost = None):
+        """
+        This function changes the objective
+        and right-hand-side coefficients in
+        place, keeping the sparsity structure
+        of the model, so that scenarios can
+        be solved without rebuilding it.
+
+        Parameters
+        ----------
+        link_cost : array
+            Access cost of each candidate link.
+        demand : array
+            Requests of each customer.
+        capacity : array
+            Maximum requests of each EV service center.
+        fixed_cost : array
+            Fixed cost of each EV service center.
+        """
+        if link_cost is not None:
+
+            self.link_cost = np.asarray(link_cost, dtype = float)
+
+        if fixed_cost is not None:
+
+            self.fixed_cost = np.broadcast_to(np.asarray(fixed_cost, dtype = float),
+                                              (self.n_ev_centers,)).copy()
+
+        if capacity is not None:
+
+            self.capacity = np.broadcast_to(np.asarray(capacity, dtype = float),
+                                            (self.n_ev_centers,)).copy()
+
+        if demand is not None:
+
+            self.demand = np.asarray(demand, dtype = float)
+            self.b_eq = self.demand.copy()
+
+        self.objective = np.concatenate([self.link_cost, self.fixed_cost])
+
+        # Capacity rows come first, followed by the linking rows
+        linking_rows = self.y_rows - self.n_ev_centers
+        if self.formulation == 'strong':
+
+            linking = -self.demand[self.customer_idx]
+
+        else:
+
+            linking = -np.bincount(self.ev_center_idx, weights =
+                       self.demand[self.customer_idx], minlength = self.n_ev_centers)
+
+        self.A_ub.data[self.y_entries] = np.where(linking_rows < 0,
+                -self.capacity[np.clip(self.y_rows, 0, self.n_ev_centers - 1)],
+                linking[np.clip(linking_rows, 0, None)])
+
+        return None
+
+
+    def variable_names(self):
+        """
+        Names of the model variables.
+
+        Returns
+        -------
+        names : list
+            'x_<link>' for the link flows and
+            'y_<ev center>' for the build decisions.
+        """
+        return (['x_{}'.format(k) for k in range(self.n_links)] +
+                ['y_{}'.format(j) for j in range(self.n_ev_centers)])
+
+
+    def write_mps(self, path):
+        """
+        This function writes the model
+        straight from its sparse arrays
+        to a free format MPS file.
+
+        Parameters
+        ----------
+        path : string
+            Path of the MPS file.
+        """
+        names = self.variable_names()
+        row_names = (['D_{}'.format(i) for i in range(self.A_eq.shape[0])] +
+                     ['U_{}'.format(r) for r in range(self.A_ub.shape[0])])
+        A = sparse.vstack([self.A_eq, self.A_ub], format = 'csc')
+
+        with open(path, 'w') as f:
+
+            f.write('NAME CFLP\nROWS\n N COST\n')
+            f.writelines(' E {}\n'.format(r) for r in row_names[:self.A_eq.shape[0]])
+            f.writelines(' L {}\n'.format(r) for r in row_names[self.A_eq.shape[0]:])
+
+            f.write('COLUMNS\n')
+            for col in range(self.n_vars):
+
+                if col == self.n_links:
+
+                    f.write(" MARKER 'MARKER' 'INTORG'\n")
+
+                start, end = A.indptr[col], A.indptr[col + 1]
+                f.write(' {} COST {!r}\n'.format(names[col], float(self.objective[col])))
+                f.writelines(' {} {} {!r}\n'.format(names[col], row_names[r], float(v))
+                             for r, v in zip(A.indices[start:end], A.data[start:end]))
+
+            if self.n_ev_centers > 0:
+
+                f.write(" MARKER 'MARKER' 'INTEND'\n")
+
+            f.write('RHS\n')
+            b = np.concatenate([self.b_eq, self.b_ub])
+            f.writelines(' RHS {} {!r}\n'.format(row_names[r], float(b[r]))
+                         for r in np.nonzero(b)[0])
+
+            f.write('BOUNDS\n')
+            f.writelines(' UP BND {} 1\n'.format(names[self.n_links + j])
+                         for j in range(self.n_ev_centers))
+            f.write('ENDATA\n')
+
+        return None
+
+
+    def size(self):
+        """
+        Number of variables, constraints
+        and non-zero coefficients.
+
+        Returns
+        -------
+        size : dict
+            Model size.
+        """
+        return {
+            'variables': self.n_vars,
+            'constraints': self.A_eq.shape[0] + self.A_ub.shape[0],
+            'nonzeros': self.A_eq.nnz + self.A_ub.nnz,
+        }
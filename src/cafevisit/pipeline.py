@@ -0,0 +1,386 @@
+import hashlib
+import json
+import os
+import time
+from cafevisit.storage import table_path
+
+
+def resolve(path):
+    """
+    Existing file of a stage input or output,
+    a pipeline table being stored as Parquet
+    or CSV whatever its declared extension.
+    """
+    if os.path.exists(path):
+
+        return path
+
+    return table_path(path)
+
+
+def file_hash(path, known = None, block = 1 << 20):
+    """
+    This function hashes the content of a
+    file, or of every file in a folder.
+    Hashes in `known`, keyed by absolute
+    path, are reused while the file
+    modification time and size match.
+
+    Parameters
+    ----------
+    path : string
+        File or folder path.
+    known : dict
+        Previous hashes, updated in place.
+    block : int
+        Number of bytes read at a time.
+
+    Returns
+    -------
+    digest : string
+        Hexadecimal sha1 of the content.
+    """
+    known = {} if known is None else known
+
+    if os.path.isdir(path):
+
+        digest = hashlib.sha1()
+        for root, folders, files in os.walk(path):
+
+            folders.sort()
+
+            for filename in sorted(files):
+
+                full_path = os.path.join(root, filename)
+                digest.update(os.path.relpath(full_path, path).encode())
+                digest.update(file_hash(full_path, known).encode())
+
+        return digest.hexdigest()
+
+    key = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = [stat.st_mtime_ns, stat.st_size]
+
+    if key in known and known[key][:2] == signature:
+
+        return known[key][2]
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+
+        for chunk in iter(lambda: f.read(block), b''):
+
+            digest.update(chunk)
+
+    known[key] = signature + [digest.hexdigest()]
+
+
+    return digest.hexdigest()
+
+
+def write_json(path, content):
+    """
+    This function writes a JSON file through
+    a temporary file of the process, so that
+    readers never see a partial file.
+    """
+    folder = os.path.dirname(path)
+
+    if folder and not os.path.exists(folder):
+
+        os.makedirs(folder, exist_ok = True)
+
+    path_tmp = '{}.{}.tmp'.format(path, os.getpid())
+
+    with open(path_tmp, 'w') as f:
+
+        json.dump(content, f, indent = 1)
+
+    os.replace(path_tmp, path)
+
+    return None
+
+
+def sidecars(path):
+    """
+    Files making up a dataset, e.g. the
+    .shp, .shx, .dbf and .prj of a shapefile.
+    """
+    if not path.endswith('.shp'):
+
+        return [path]
+
+    stem = os.path.splitext(path)[0]
+
+    return [stem + extension for extension in ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+            if os.path.exists(stem + extension)]
+
+
+class Stage:
+
+    """
+    This class declares a pipeline stage,
+    its input and output paths and the
+    parameters its results depend on. Paths
+    may contain an `{iso3}` placeholder.
+    """
+
+
+    def __init__(self, name, func, inputs = (), outputs = (), params = None):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        name : string
+            Stage name.
+        func : function
+            Function called with the country iso3.
+        inputs : list
+            Paths read by the stage.
+        outputs : list
+            Paths written by the stage.
+        params : dict
+            JSON-serializable parameters of the stage.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+
+    def paths(self, templates, iso3):
+        """
+        Stage paths of a country.
+        """
+        return [template.format(iso3 = iso3) for template in templates]
+
+
+class Pipeline:
+
+    """
+    This class runs the stages of a country
+    in order, re-executing a stage only when
+    the content of its inputs, its parameters
+    or the stages before it changed, or when
+    an output is missing.
+    """
+
+
+    def __init__(self, stages, state_path = os.path.join('results', 'processed',
+                 '{iso3}', 'pipeline.json'), hash_path = os.path.join('results',
+                 'processed', 'file_hashes.json')):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        stages : list
+            Stages in execution order.
+        state_path : string
+            Path of the per-country state file.
+        hash_path : string
+            Path of the file hashes shared by
+            all countries, so that an input read
+            by every country (e.g. the global
+            population raster) is hashed once.
+        """
+        self.stages = stages
+        self.state_path = state_path
+        self.hash_path = hash_path
+
+
+    def upstream(self, stage):
+        """
+        Names of the earlier stages whose
+        outputs are inputs of a stage.
+        """
+        names = []
+        for other in self.stages:
+
+            if other is stage:
+
+                break
+
+            if set(other.outputs) & set(stage.inputs):
+
+                names.append(other.name)
+
+        return names
+
+
+    def load_state(self, iso3):
+        """
+        Recorded stage fingerprints.
+        """
+        path = self.state_path.format(iso3 = iso3)
+
+        if not os.path.exists(path):
+
+            return {'stages': {}}
+
+        with open(path) as f:
+
+            state = json.load(f)
+
+        # File hashes were kept per country before
+        state.pop('files', None)
+
+        return state
+
+
+    def save_state(self, iso3, state):
+        """
+        Record stage fingerprints.
+        """
+        write_json(self.state_path.format(iso3 = iso3), state)
+
+        return None
+
+
+    def load_hashes(self):
+        """
+        Shared file hashes, empty if missing
+        or being replaced.
+        """
+        try:
+
+            with open(self.hash_path) as f:
+
+                return json.load(f)
+
+        except (FileNotFoundError, ValueError):
+
+            return {}
+
+
+    def save_hashes(self, known):
+        """
+        This function merges the file hashes
+        of this process into the shared file,
+        which the pipelines of other countries
+        may be updating at the same time. A
+        hash lost in a race is only computed
+        again.
+        """
+        hashes = self.load_hashes()
+        hashes.update(known)
+        write_json(self.hash_path, hashes)
+
+        return None
+
+
+    def fingerprint(self, stage, iso3, known, fingerprints):
+        """
+        This function hashes the parameters
+        of a stage, the content of its inputs
+        and the fingerprints of its upstream
+        stages.
+
+        Returns
+        -------
+        digest : string
+            Stage fingerprint, or None if an
+            input is missing.
+        """
+        digest = hashlib.sha1(stage.name.encode())
+        digest.update(json.dumps(stage.params, sort_keys = True, default = str).encode())
+
+        for path in stage.paths(stage.inputs, iso3):
+
+            found = resolve(path)
+
+            if found is None:
+
+                return None
+
+            for part in sidecars(found):
+
+                digest.update(part.encode())
+                digest.update(file_hash(part, known).encode())
+
+        for name in self.upstream(stage):
+
+            digest.update(str(fingerprints.get(name)).encode())
+
+
+        return digest.hexdigest()
+
+
+    def run(self, iso3, force = (), dry_run = False, done = ()):
+        """
+        This function runs the outdated
+        stages of a country.
+
+        Parameters
+        ----------
+        iso3 : string
+            Country iso3 to be processed.
+        force : list
+            Stage names run even if up to date.
+        dry_run : bool
+            Whether the outdated stages are only
+            reported.
+        done : list
+            Stage names whose outputs were just
+            written by a batch step, e.g.
+            `process_boundaries`, recorded as
+            run without calling them again.
+
+        Returns
+        -------
+        report : list
+            Name, action and wall time of each stage.
+        """
+        state = self.load_state(iso3)
+        known = self.load_hashes()
+        fingerprints = {}
+        report = []
+
+        for stage in self.stages:
+
+            fingerprint = self.fingerprint(stage, iso3, known, fingerprints)
+            outputs = stage.paths(stage.outputs, iso3)
+            missing = [path for path in outputs if resolve(path) is None]
+
+            if fingerprint is not None and not missing and stage.name not in force \
+               and state['stages'].get(stage.name) == fingerprint:
+
+                fingerprints[stage.name] = fingerprint
+                report.append({'stage': stage.name, 'action': 'skipped', 'wall_time': 0})
+                continue
+
+            if dry_run:
+
+                fingerprints[stage.name] = 'outdated'
+                report.append({'stage': stage.name, 'action': 'planned', 'wall_time': 0})
+                continue
+
+            start = time.perf_counter()
+
+            if stage.name in done and not missing:
+
+                action = 'batched'
+
+            else:
+
+                print('{}: running {}'.format(iso3, stage.name))
+                stage.func(iso3)
+                action = 'ran'
+
+            # Inputs written by earlier stages are hashed now that they exist
+            fingerprint = self.fingerprint(stage, iso3, known, fingerprints)
+            fingerprints[stage.name] = fingerprint
+            state['stages'][stage.name] = fingerprint
+            self.save_state(iso3, state)
+            self.save_hashes(known)
+
+            report.append({'stage': stage.name, 'action': action,
+                           'wall_time': round(time.perf_counter() - start, 2)})
+
+        # Hashes of the skipped stages, and of a dry run, are kept too
+        self.save_hashes(known)
+
+
+        return report
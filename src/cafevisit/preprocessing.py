@@ -1,14 +1,15 @@
 import configparser
-import json
 import os
-import rasterio
-import geopandas as gpd
+import sqlite3
+from contextlib import closing
+import numpy as np
 import pandas as pd
-from rasterio.mask import mask
-from rasterstats import zonal_stats
-from shapely.geometry import Polygon
-from shapely.geometry import MultiPolygon
-from tqdm import tqdm
+from cafevisit.gadm import read_gadm, read_gadm_countries
+from cafevisit.instrument import instrument, note
+from cafevisit.raster import clip_raster, clip_raster_many
+from cafevisit.runner import run_countries
+from cafevisit.storage import write_table
+from cafevisit.zonal import zonal_population
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
@@ -29,6 +30,8 @@ def remove_small_shapes(x):
         Shapely MultiPolygon geometry without tiny shapes.
 
     """
+    from shapely.geometry import MultiPolygon
+
     if x.geometry.type == 'Polygon':
 
         return x.geometry
@@ -67,6 +70,248 @@ def remove_small_shapes(x):
         return MultiPolygon(new_geom)
 
 
+def remove_small_shapes_array(geometries, gid_0):
+    """
+    Remove small multipolygon shapes of many
+    features at once, with the same output
+    as `remove_small_shapes`.
+
+    Parameters
+    ---------
+    geometries : array
+        Features to simplify.
+    gid_0 : array
+        Country iso3 of each feature.
+
+    Returns
+    -------
+    geometries : array
+        Polygons unchanged, MultiPolygons without
+        tiny shapes and None for other geometries.
+
+    """
+    import shapely
+    from shapely.geometry import MultiPolygon
+
+    geometries = np.asarray(geometries, dtype = object)
+    types = shapely.get_type_id(geometries)
+    areas = shapely.area(geometries)
+
+    area1 = 0.01
+    area2 = 50
+
+    threshold = np.where(areas > area2, 0.1, 0.001)
+    threshold[np.isin(gid_0, ['CHL', 'IDN', 'RUS', 'GRL', 'CAN', 'USA'])] = 0.01
+
+    output = np.full(len(geometries), None, dtype = object)
+    keep_whole = (types == 3) | ((types == 6) & (areas < area1))
+    output[keep_whole] = geometries[keep_whole]
+
+    # Explode the remaining multipolygons, filter the parts and regroup them
+    rows = np.nonzero((types == 6) & (areas >= area1))[0]
+    parts, index = shapely.get_parts(geometries[rows], return_index = True)
+    keep = shapely.area(parts) > threshold[rows][index]
+
+    rebuilt = np.array([MultiPolygon()] * len(rows), dtype = object)
+    shapely.multipolygons(parts[keep], indices = index[keep], out = rebuilt)
+    output[rows] = rebuilt
+
+
+    return output
+
+
+def simplify_shapes(shapes, tolerance):
+    """
+    Simplify GADM shapes and remove their
+    small multipolygon parts.
+
+    Parameters
+    ---------
+    shapes : geodataframe
+        Shapes with a `GID_0` column.
+    tolerance : float
+        Simplification tolerance in degrees.
+
+    Returns
+    -------
+    shapes : geodataframe
+        Simplified copy of the shapes.
+
+    """
+    shapes = shapes.copy()
+    shapes['geometry'] = shapes.geometry.simplify(
+        tolerance = tolerance, preserve_topology = True)
+
+    shapes['geometry'] = remove_small_shapes_array(
+        shapes.geometry.values, shapes['GID_0'].values)
+
+    return shapes
+
+
+def boundary_path(iso3, level):
+    """
+    Path of the processed national outline
+    (level 0) or regions of a country.
+    """
+    if level == 0:
+
+        return os.path.join('results', 'processed', iso3, 'national_outline.shp')
+
+    return os.path.join('results', 'processed', iso3, 'regions', 
+                        'regions_{}_{}.shp'.format(level, iso3))
+
+
+def write_boundaries(iso3, level, shapes, glob_info = None):
+    """
+    This function simplifies and writes the
+    shapes of one country at a GADM level,
+    as `process_country_shapes` (level 0)
+    and `process_regions` do.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country iso3.
+    level : int
+        GADM level.
+    shapes : geodataframe
+        Shapes of the country.
+    glob_info : dataframe
+        Country metadata merged into the
+        national outline.
+    """
+    if level == 0:
+
+        shapes = simplify_shapes(shapes.reset_index(drop = True).reset_index(), tolerance = 0.01)
+        shapes = shapes.merge(glob_info, left_on = 'GID_0', right_on = 'iso3')
+
+    else:
+
+        shapes = simplify_shapes(shapes, tolerance = 0.005)
+
+    path_out = boundary_path(iso3, level)
+
+    if not os.path.exists(os.path.dirname(path_out)):
+
+        os.makedirs(os.path.dirname(path_out))
+
+    shapes.to_file(path_out, driver = 'ESRI Shapefile')
+
+    return None
+
+
+def boundaries_run(task):
+    """
+    Name of a `write_boundaries` run in the
+    country report, one per GADM level.
+    """
+    return 'write_boundaries_gid{}'.format(task[1])
+
+
+@instrument('boundaries')
+def process_boundaries(csv_country, iso3_list, jobs = None, overwrite = False):
+    """
+    This function processes the national
+    outlines and regions of many countries,
+    reading each GADM level once and
+    simplifying the countries on a process
+    pool. The `lowest` column of the country
+    metadata sets the levels of each country.
+    Outputs that already exist are kept
+    unless `overwrite` is True.
+
+    Parameters
+    ----------
+    csv_country : string
+        Name of the country metadata file.
+    iso3_list : list
+        Country iso3 codes to be processed.
+    jobs : int
+        Number of worker processes, all cores if None.
+    overwrite : bool
+        Whether existing outputs are written again.
+
+    Returns
+    -------
+    summary : dataframe
+        Status and wall time of each country
+        at each processed level.
+    """
+    import shapely
+
+    load_glob_info = pd.read_csv(csv_country, encoding = 'ISO-8859-1', 
+                                 keep_default_na = False)
+    countries = load_glob_info[load_glob_info.iso3.isin(iso3_list)]
+    lowest = dict(zip(countries.iso3, countries.lowest.astype(int)))
+    summaries = []
+
+    for level in range(0, max(lowest.values(), default = -1) + 1):
+
+        needed = [iso3 for iso3, gid_level in lowest.items() if gid_level >= level
+                  and (overwrite or not os.path.exists(boundary_path(iso3, level)))]
+
+        if len(needed) == 0:
+
+            continue
+
+        print('Processing GID_{} shapes of {} countries'.format(level, len(needed)))
+        layer = read_gadm_countries(level, needed)
+        note(**{'rows_gid_{}'.format(level): len(layer)})
+
+        tasks, sizes = [], {}
+        for iso3, shapes in layer.groupby('GID_0', sort = False):
+
+            glob_info = countries[countries.iso3 == iso3] if level == 0 else None
+            tasks.append((iso3, level, shapes, glob_info))
+            sizes[iso3] = shapely.get_num_coordinates(shapes.geometry.values).sum()
+
+        summaries.append(run_countries(write_boundaries, tasks, jobs = jobs,
+                                       size = sizes.get, name = boundaries_run))
+
+    if len(summaries) == 0:
+
+        return pd.DataFrame(columns = ['iso3', 'status', 'wall_time', 'error'])
+
+
+    return pd.concat(summaries, ignore_index = True)
+
+
+def sub_region_path(iso3):
+    """
+    Path of the sub-region boundaries
+    GeoPackage of a country.
+    """
+    return os.path.join('results', 'processed', iso3, 'boundaries', 
+                        '{}_boundaries.gpkg'.format(iso3))
+
+
+def read_sub_region(iso3, gid):
+    """
+    This function reads the boundary of a
+    single sub-region from the country
+    GeoPackage, without loading the others.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country iso3.
+    gid : string
+        GID of the sub-region.
+
+    Returns
+    -------
+    boundary : geodataframe
+        The sub-region boundary, empty if the
+        GID is not found.
+    """
+    import geopandas as gpd
+
+    where = "GID = '{}'".format(gid.replace("'", "''"))
+
+
+    return gpd.read_file(sub_region_path(iso3), layer = 'boundaries', where = where)
+
+
 class ProcessCountry:
 
     """
@@ -109,17 +354,27 @@ class ProcessCountry:
         return countries
     
 
-    def process_country_shapes(self):
+    @instrument('country_shapes')
+    def process_country_shapes(self, overwrite = False):
         """
         This function creates regional folders for each country 
         and then process a national outline shapefile.
 
-        """          
+        Parameters
+        ----------
+        overwrite : bool
+            Whether an existing national outline is processed again.
+
+        """
+        import geopandas as gpd
+
         path = os.path.join('results', 'processed', self.country_iso3)
 
-        if os.path.exists(os.path.join(path, 'national_outline.shp')):
+        if os.path.exists(os.path.join(path, 'national_outline.shp')) and not overwrite:
 
             print('Completed national outline processing')
+
+            return None
             
         print('Processing country shapes')
 
@@ -129,18 +384,9 @@ class ProcessCountry:
 
         shape_path = os.path.join(path, 'national_outline.shp')
 
-        path = os.path.join('data', 'raw', 'boundaries', 'gadm36_0.shp')
-
-        countries = gpd.read_file(path)
+        single_country = read_gadm(0, self.country_iso3).reset_index()
 
-        single_country = countries[countries.GID_0 == self.country_iso3].reset_index()
-
-        single_country = single_country.copy()
-        single_country['geometry'] = single_country.geometry.simplify(
-            tolerance = 0.01, preserve_topology = True)
-        
-        single_country['geometry'] = single_country.apply(
-            remove_small_shapes, axis = 1)
+        single_country = simplify_shapes(single_country, tolerance = 0.01)
         
         glob_info_path = os.path.join(self.csv_country)
         load_glob_info = pd.read_csv(glob_info_path, encoding = 'ISO-8859-1', 
@@ -177,10 +423,16 @@ class ProcessRegions:
         self.country_iso3 = country_iso3
 
 
-    def process_regions(self):
+    @instrument('regions')
+    def process_regions(self, overwrite = False):
         """
         Function for processing the lowest desired subnational
         regions for the chosen country.
+
+        Parameters
+        ----------
+        overwrite : bool
+            Whether existing region shapefiles are processed again.
         """
         regions = []
 
@@ -190,7 +442,7 @@ class ProcessRegions:
             folder = os.path.join('results', 'processed', self.country_iso3, 'regions')
             path_processed = os.path.join(folder, filename)
 
-            if os.path.exists(path_processed):
+            if os.path.exists(path_processed) and not overwrite:
 
                 continue
 
@@ -200,17 +452,10 @@ class ProcessRegions:
 
                 os.mkdir(folder)
 
-            filename = 'gadm36_{}.shp'.format(regional_level)
-            path_regions = os.path.join('data', 'raw', 'boundaries', filename)
-            regions = gpd.read_file(path_regions)
+            regions = read_gadm(regional_level, self.country_iso3)
 
-            regions = regions[regions.GID_0 == self.country_iso3]
-
-            regions = regions.copy()
-            regions['geometry'] = regions.geometry.simplify(
-                tolerance=0.005, preserve_topology=True)
-
-            regions['geometry'] = regions.apply(remove_small_shapes, axis = 1)
+            regions = simplify_shapes(regions, tolerance = 0.005)
+            note(**{'rows_gid_{}'.format(regional_level): len(regions)})
 
             try:
 
@@ -224,7 +469,15 @@ class ProcessRegions:
 
         return None
     
+    @instrument('sub_regions')
     def process_sub_region_boundaries(self):
+        """
+        This function writes the lowest level
+        sub-region boundaries of the country
+        into a single GeoPackage, keyed and
+        indexed by their GID.
+        """
+        import geopandas as gpd
 
         region_path = os.path.join('results', 'processed', self.country_iso3, 'regions', 'regions_{}_{}.shp'.format(2, self.country_iso3)) 
         region_path_2 = os.path.join('results', 'processed', self.country_iso3, 'regions', 'regions_{}_{}.shp'.format(1, self.country_iso3))
@@ -239,21 +492,30 @@ class ProcessRegions:
             countries = gpd.read_file(region_path_2)
             gid = 'GID_1'
 
-        for index, row in tqdm(countries.iterrows(), desc = 'Processing sub-region boundaries'):
+        print('Processing sub-region boundaries')
 
-            sub_region_shapefile = gpd.GeoDataFrame([row], crs = countries.crs)
+        countries['GID'] = countries[gid]
+        note(rows = len(countries))
 
-            filename = '{}.shp'.format(row[gid])    
+        path_out = sub_region_path(self.country_iso3)
+        folder_out = os.path.dirname(path_out)
 
-            folder_out = os.path.join('results', 'processed', self.country_iso3, 'boundaries')
+        if not os.path.exists(folder_out):
+
+            os.makedirs(folder_out)
 
-            if not os.path.exists(folder_out):
+        if os.path.exists(path_out):
 
-                os.makedirs(folder_out)
+            os.remove(path_out)
 
-            path_out = os.path.join(folder_out, filename)
+        countries.to_file(path_out, layer = 'boundaries', driver = 'GPKG', 
+                          SPATIAL_INDEX = 'YES')
 
-            sub_region_shapefile.to_file(path_out, driver = 'ESRI Shapefile')
+        # Attribute index for lookups by GID
+        # The connection context only commits, closing releases the file
+        with closing(sqlite3.connect(path_out)) as connection, connection:
+
+            connection.execute('CREATE INDEX IF NOT EXISTS boundaries_gid ON boundaries (GID)')
 
         return print('Sub-region boundary processed')
 
@@ -287,6 +549,7 @@ class ProcessPopulation:
         self.gid_region = gid_region
 
 
+    @instrument('national_population')
     def process_national_population(self):
 
         """
@@ -294,15 +557,10 @@ class ProcessPopulation:
         using national boundary files created in 
         process_national_boundary function
         """
+        import geopandas as gpd
 
         iso3 = self.country_iso3
 
-        filename = self.pop_tiff
-        path_pop = os.path.join(filename)
-        hazard = rasterio.open(path_pop, 'r+')
-        hazard.nodata = 255                       
-        hazard.crs.from_epsg(4326) 
-
         filename = 'national_outline.shp'
         folder = os.path.join('results', 'processed', self.country_iso3)
         
@@ -310,24 +568,9 @@ class ProcessPopulation:
         path_in = os.path.join(folder, filename)
         country_pop = gpd.read_file(path_in, crs = 'epsg:4326')
 
-        #create a new gpd dataframe from our single country geometry
-        geo = gpd.GeoDataFrame(gpd.GeoSeries(country_pop.geometry))
+        #the clip uses the first national outline feature
+        coords = [country_pop.geometry.iloc[0]]
 
-        #this line sets geometry for resulting geodataframe
-        geo = geo.rename(columns={0:'geometry'}).set_geometry('geometry')
-
-        #convert to json
-        coords = [json.loads(geo.to_json())['features'][0]['geometry']]        
-
-        #carry out the clip using our mask
-        out_img, out_transform = mask(hazard, coords, crop = True)
-
-        #update our metadata
-        out_meta = hazard.meta.copy()
-        out_meta.update({'driver': 'GTiff', 'height': out_img.shape[1],
-                        'width': out_img.shape[2], 'transform': out_transform,
-                        'crs': 'epsg:4326'})
-        
         #now we write out at the regional level
         filename_out = 'ppp_2020_1km_Aggregated.tif' 
         folder_out = os.path.join('results', 'processed', iso3, 'population', 'national')
@@ -338,13 +581,13 @@ class ProcessPopulation:
 
         path_out = os.path.join(folder_out, filename_out)
 
-        with rasterio.open(path_out, 'w', ** out_meta) as dest:
-
-            dest.write(out_img)
+        #stream the read-only global raster through the clip, tile by tile
+        clip_raster(self.pop_tiff, coords, path_out, nodata = 255)
 
         return None
     
 
+    @instrument('population')
     def process_population_tif(self):
         """
         Process population layer.
@@ -361,6 +604,8 @@ class ProcessPopulation:
         output: dictionary.
             Dictionary containing the country population and grid level
         """
+        import geopandas as gpd
+
         gid_region = self.gid_region
         iso = self.country_iso3
 
@@ -371,46 +616,28 @@ class ProcessPopulation:
 
         boundaries = gpd.read_file(path_regions, crs = 'epsg:4326')
 
-        output = []
+        print('Working on {}'.format(iso))
+        stats = zonal_population(boundaries, path_raster, nodata = 255)
+
+        df = pd.DataFrame({
+            'iso3': boundaries['GID_0'].values,
+            'region': boundaries['NAME_1'].values,
+            'admin_name': boundaries['NAME_1'].values,
+            'GID_1': boundaries['GID_1'].values,
+            'population': stats['population'].values,
+            'latitude': stats['latitude'].values,
+            'longitude': stats['longitude'].values,
+            'geometry': boundaries['geometry'].values,
+            'area': boundaries['geometry'].area.values * 12309
+        })
+        output = df.to_dict('records')
 
-        for idx, boundary in tqdm(boundaries.iterrows(), desc = 'Working on {}'.format(iso)):
-    
-            with rasterio.open(path_raster) as src:
-                
-                affine = src.transform
-                array = src.read(1)
-                array[array <= 0] = 0
-                
-                population = [i['sum'] for i in zonal_stats(
-                    boundary['geometry'], array, nodata = 255,
-                    stats = ['sum'], affine = affine)][0]
-
-                #Calculate the central coordinates of each of the polygons
-                boundary['centroid'] = boundary['geometry'].centroid
-                boundary['longitude'] = boundary['centroid'].x
-                boundary['latitude'] = boundary['centroid'].y
-
-                output.append({
-                    'iso3':boundary['GID_0'],
-                    'region':boundary['NAME_1'],
-                    'admin_name':boundary['NAME_1'],
-                    'GID_1': boundary['GID_1'],
-                    'population': population,
-                    'latitude': boundary['latitude'],
-                    'longitude': boundary['longitude'],
-                    'geometry': boundary['geometry'],
-                    'area': (boundary['geometry'].area) * 12309
-                })
-
-        df = pd.DataFrame(output)
         df.dropna(subset = ['population'], inplace = True)
         df['population'] = df['population'].astype(int)
         df['pop_density'] = (df['population'] / (df['area']))
         df[['latitude', 'longitude']] = df[['latitude', 'longitude']].round(4)
-        df['capital'] = ''
-        for i in range(len(df)):
-
-            df['capital'].loc[i] = 'admin'
+        df['capital'] = 'admin'
+        note(rows = len(df))
 
         fileout = '{}_population_results.csv'.format(iso)
         folder_out = os.path.join('results', 'final', iso, 'population')
@@ -419,6 +646,55 @@ class ProcessPopulation:
             os.makedirs(folder_out)
 
         path_out = os.path.join(folder_out, fileout)
-        df.to_csv(path_out, index = False)
+        write_table(df, path_out)
+
+        return output
+
+@instrument('national_populations')
+def process_national_populations(pop_tiff, iso3_list):
+    """
+    This function creates the national population
+    .tiff of every country in one pass over the
+    global raster, using the national boundary
+    files created by `process_country_shapes`.
+
+    Parameters
+    ----------
+    pop_tiff : string
+        Filename of the global population raster layer.
+    iso3_list : list
+        Country iso3 codes to be processed.
+
+    Returns
+    -------
+    written : list
+        Paths of the national population rasters.
+    """
+    import geopandas as gpd
+
+    targets = []
+    for iso3 in iso3_list:
+
+        path_in = os.path.join('results', 'processed', iso3, 'national_outline.shp')
+
+        if not os.path.exists(path_in):
+
+            print('No national outline for {}'.format(iso3))
+            continue
+
+        country_pop = gpd.read_file(path_in, crs = 'epsg:4326')
+        coords = [country_pop.geometry.iloc[0]]
+
+        folder_out = os.path.join('results', 'processed', iso3, 'population', 'national')
+
+        if not os.path.exists(folder_out):
+
+            os.makedirs(folder_out)
+
+        path_out = os.path.join(folder_out, 'ppp_2020_1km_Aggregated.tif')
+        targets.append((coords, path_out))
+
+    print('Clipping {} national population rasters'.format(len(targets)))
+
 
-        return output
\ No newline at end of file
+    return clip_raster_many(pop_tiff, targets, nodata = 255)
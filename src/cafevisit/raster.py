@@ -0,0 +1,322 @@
+import threading
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def tile_windows(src, window = None, tile_size = 1024):
+    """
+    This function splits a raster, or a
+    window of it, into tiles aligned with
+    the raster's internal blocks.
+
+    Parameters
+    ----------
+    src : DatasetReader
+        Open raster dataset.
+    window : Window
+        Part of the raster to split, the
+        whole raster if None.
+    tile_size : int
+        Approximate tile height and width in
+        pixels, rounded up to whole blocks.
+
+    Returns
+    -------
+    windows : list
+        List of rasterio Windows.
+    """
+    from rasterio.windows import Window
+
+    if window is None:
+
+        window = Window(0, 0, src.width, src.height)
+
+    row_start, col_start = int(window.row_off), int(window.col_off)
+    row_stop, col_stop = row_start + int(window.height), col_start + int(window.width)
+
+    block_height, block_width = src.block_shapes[0]
+    tile_height = max(1, -(-tile_size // block_height)) * block_height
+    tile_width = max(1, -(-tile_size // block_width)) * block_width
+
+    windows = []
+    for row in range(row_start - row_start % block_height, row_stop, tile_height):
+
+        for col in range(col_start - col_start % block_width, col_stop, tile_width):
+
+            top, left = max(row, row_start), max(col, col_start)
+            bottom = min(row + tile_height, row_stop)
+            right = min(col + tile_width, col_stop)
+
+            if bottom > top and right > left:
+
+                windows.append(Window(left, top, right - left, bottom - top))
+
+
+    return windows
+
+
+def map_tiles(path, func, windows = None, tile_size = 1024, workers = 4,
+              nodata = None):
+    """
+    This function reads a raster tile by
+    tile in a thread pool, rasterio releasing
+    the GIL while decoding, and yields the
+    result of `func` for every tile as soon
+    as it is ready. At most two tiles per
+    worker are in memory at once.
+
+    The raster is opened read-only and
+    `nodata` only overrides the nodata
+    value in memory.
+
+    Parameters
+    ----------
+    path : string
+        Path of the raster.
+    func : function
+        Function called with the tile window, its
+        transform and its first band as a masked array.
+    windows : list
+        Windows to process, all tiles of the
+        raster if None.
+    tile_size : int
+        Approximate tile size in pixels.
+    workers : int
+        Number of reading threads.
+    nodata : float
+        Nodata value, the raster's own if None.
+
+    Yields
+    ------
+    result : object
+        Return value of `func` for each tile,
+        in completion order.
+    """
+    import rasterio
+
+    local = threading.local()
+    handles = []
+
+    def process(window):
+
+        if not hasattr(local, 'src'):
+
+            # Datasets are not thread-safe, each thread keeps its own handle
+            local.src = rasterio.open(path)
+            handles.append(local.src)
+
+        src = local.src
+        array = src.read(1, window = window)
+        missing = src.nodata if nodata is None else nodata
+
+        mask = np.isnan(array) if np.issubdtype(array.dtype, np.floating) else \
+               np.zeros(array.shape, dtype = bool)
+        if missing is not None:
+
+            mask |= array == missing
+
+        return func(window, src.window_transform(window), np.ma.masked_array(array, mask))
+
+    if windows is None:
+
+        with rasterio.open(path) as src:
+
+            windows = tile_windows(src, tile_size = tile_size)
+
+    windows = iter(windows)
+
+    try:
+
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+
+            pending = set()
+            for window in windows:
+
+                pending.add(pool.submit(process, window))
+
+                if len(pending) >= 2 * workers:
+
+                    done, pending = wait(pending, return_when = FIRST_COMPLETED)
+
+                    for future in done:
+
+                        yield future.result()
+
+            for future in pending:
+
+                yield future.result()
+
+    finally:
+
+        for src in handles:
+
+            src.close()
+
+
+def clip_raster(path, geometries, path_out, nodata = 255, tile_size = 1024,
+                workers = 4):
+    """
+    This function clips a raster to a set of
+    geometries, streaming the source tile by
+    tile into the output so that memory use
+    is bounded by the tile size. The output
+    matches `rasterio.mask.mask` with
+    `crop = True`.
+
+    Parameters
+    ----------
+    path : string
+        Path of the source raster.
+    geometries : list
+        GeoJSON-like or shapely geometries.
+    path_out : string
+        Path of the clipped GeoTIFF.
+    nodata : float
+        Value written outside the geometries.
+    tile_size : int
+        Approximate tile size in pixels.
+    workers : int
+        Number of reading threads.
+    """
+    clip_raster_many(path, [(geometries, path_out)], nodata = nodata,
+                     tile_size = tile_size, workers = workers)
+
+    return None
+
+
+def intersect(window, other):
+    """
+    Intersection of two integer windows,
+    or None if they do not overlap.
+    """
+    from rasterio.windows import Window
+
+    top, left = max(window.row_off, other.row_off), max(window.col_off, other.col_off)
+    bottom = min(window.row_off + window.height, other.row_off + other.height)
+    right = min(window.col_off + window.width, other.col_off + other.width)
+
+    if bottom <= top or right <= left:
+
+        return None
+
+    return Window(left, top, right - left, bottom - top)
+
+
+def clip_raster_many(path, targets, nodata = 255, tile_size = 1024, workers = 4):
+    """
+    This function clips a raster to many
+    sets of geometries in a single pass.
+    The raster is walked once over the
+    union of the clipped windows and every
+    tile is written to each output it
+    overlaps.
+
+    Parameters
+    ----------
+    path : string
+        Path of the source raster.
+    targets : list
+        List of (geometries, output path) tuples.
+    nodata : float
+        Value written outside the geometries.
+    tile_size : int
+        Approximate tile size in pixels.
+    workers : int
+        Number of reading threads.
+
+    Returns
+    -------
+    written : list
+        Output paths written. Targets outside
+        the raster are skipped.
+    """
+    import rasterio
+    from rasterio.errors import WindowError
+    from rasterio.features import geometry_mask, geometry_window
+    from rasterio.windows import Window
+
+    clips = []
+    with rasterio.open(path) as src:
+
+        for geometries, path_out in targets:
+
+            try:
+
+                outer = geometry_window(src, geometries)
+
+            except WindowError:
+
+                print('No overlap between {} and the raster'.format(path_out))
+                continue
+
+            outer = Window(int(round(outer.col_off)), int(round(outer.row_off)),
+                           int(round(outer.width)), int(round(outer.height)))
+            clips.append((geometries, path_out, outer))
+
+        if len(clips) == 0:
+
+            return []
+
+        row_off = min(outer.row_off for _, _, outer in clips)
+        col_off = min(outer.col_off for _, _, outer in clips)
+        union = Window(col_off, row_off,
+                max(outer.col_off + outer.width for _, _, outer in clips) - col_off,
+                max(outer.row_off + outer.height for _, _, outer in clips) - row_off)
+
+        # Only tiles overlapping at least one output are read
+        windows = [window for window in tile_windows(src, union, tile_size = tile_size)
+                   if any(intersect(window, outer) for _, _, outer in clips)]
+
+        out_meta = src.meta.copy()
+        out_meta.update({'driver': 'GTiff', 'crs': 'epsg:4326', 'nodata': nodata,
+                         'count': 1})
+        transform = src.transform
+
+    def clip(window, tile_transform, array):
+
+        pieces = []
+        for idx, (geometries, _, outer) in enumerate(clips):
+
+            part = intersect(window, outer)
+
+            if part is None:
+
+                continue
+
+            rows = slice(part.row_off - window.row_off, part.row_off - window.row_off + part.height)
+            cols = slice(part.col_off - window.col_off, part.col_off - window.col_off + part.width)
+            data = array.data[rows, cols]
+
+            outside = geometry_mask(geometries, out_shape = data.shape,
+                      transform = rasterio.windows.transform(part, transform))
+            data = np.where(outside, nodata, data).astype(out_meta['dtype'])
+
+            pieces.append((idx, Window(part.col_off - outer.col_off,
+                           part.row_off - outer.row_off, part.width, part.height), data))
+
+        return pieces
+
+    outputs = []
+    try:
+
+        for geometries, path_out, outer in clips:
+
+            meta = dict(out_meta, height = outer.height, width = outer.width,
+                        transform = rasterio.windows.transform(outer, transform))
+            outputs.append(rasterio.open(path_out, 'w', **meta))
+
+        for pieces in map_tiles(path, clip, windows = windows, workers = workers,
+                                nodata = nodata):
+
+            for idx, window, data in pieces:
+
+                outputs[idx].write(data, 1, window = window)
+
+    finally:
+
+        for dest in outputs:
+
+            dest.close()
+
+
+    return [path_out for _, path_out, _ in clips]
@@ -0,0 +1,321 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from cafevisit.distances import EARTH_RADIUS_KM, haversine_matrix
+
+
+def unit_vectors(lat, lon):
+    """
+    Coordinates on the unit sphere, used
+    to snap points with a KD-tree.
+    """
+    lat = np.radians(np.asarray(lat, dtype = float))
+    lon = np.radians(np.asarray(lon, dtype = float))
+
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+
+def pair_distance(lat1, lon1, lat2, lon2):
+    """
+    Haversine distance in kilometers between
+    matching pairs of locations.
+    """
+    lat1, lon1, lat2, lon2 = [np.radians(np.asarray(x, dtype = float))
+                              for x in (lat1, lon1, lat2, lon2)]
+    a = (np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) *
+         np.sin((lon2 - lon1) / 2) ** 2)
+
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class RoadNetwork:
+
+    """
+    This class computes customer to EV
+    service center travel distances over
+    a local road graph, as an alternative
+    to the straight-line haversine distance.
+    """
+
+
+    def __init__(self, node_lat, node_lon, u, v, length_km, cache_bytes = 512 * 1024 ** 2):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        node_lat, node_lon : array
+            Coordinates of the road graph nodes.
+        u, v : array
+            Node positions of the edge ends.
+        length_km : array
+            Length of each edge in kilometers.
+        cache_bytes : int
+            Size of the shortest path distances
+            kept for repeated queries.
+        """
+        self.node_lat = np.asarray(node_lat, dtype = float)
+        self.node_lon = np.asarray(node_lon, dtype = float)
+        n = len(self.node_lat)
+
+        # Keep the shortest of any parallel edges
+        keys, inverse = np.unique(np.asarray(u, dtype = np.int64) * n + np.asarray(v),
+                                  return_inverse = True)
+        lengths = np.full(len(keys), np.inf)
+        np.minimum.at(lengths, inverse.ravel(), np.asarray(length_km, dtype = float))
+
+        self.graph = sparse.csr_matrix((lengths, (keys // n, keys % n)), shape = (n, n))
+        self.tree = cKDTree(unit_vectors(self.node_lat, self.node_lon))
+
+        digest = hashlib.sha1()
+        for array in (self.node_lat, self.node_lon, self.graph.indices,
+                      self.graph.indptr, self.graph.data):
+
+            digest.update(np.ascontiguousarray(array).tobytes())
+
+        self.method = 'road_{}'.format(digest.hexdigest())
+
+        # Shortest path distances from the most recent source nodes, oldest first
+        self.trees = {}
+        self.cache_bytes = cache_bytes
+        self.tree_bytes = 0
+
+
+    @classmethod
+    def from_edges(cls, u_lat, u_lon, v_lat, v_lon, length_km = None):
+        """
+        This function creates the network from
+        edge end coordinates, merging ends that
+        share the same coordinates into nodes.
+
+        Parameters
+        ----------
+        u_lat, u_lon, v_lat, v_lon : array
+            Coordinates of the edge ends.
+        length_km : array
+            Edge lengths, the haversine length
+            of each edge is used if not given.
+
+        Returns
+        -------
+        network : RoadNetwork
+            The road network.
+        """
+        ends = np.round(np.column_stack([np.concatenate([u_lat, v_lat]),
+                        np.concatenate([u_lon, v_lon])]), 6)
+        nodes, inverse = np.unique(ends, axis = 0, return_inverse = True)
+        inverse = inverse.ravel()
+        n_edges = len(u_lat)
+
+        if length_km is None:
+
+            length_km = pair_distance(u_lat, u_lon, v_lat, v_lon)
+
+        return cls(nodes[:, 0], nodes[:, 1], inverse[:n_edges],
+                   inverse[n_edges:], length_km)
+
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        This function loads a road network
+        from a local file. A `.csv` edge list
+        needs `u_lat`, `u_lon`, `v_lat` and
+        `v_lon` columns and optionally
+        `length_km`. Any other file is read
+        as line geometries (e.g. an OSM-derived
+        GeoPackage) whose vertices become nodes.
+
+        Parameters
+        ----------
+        path : string
+            Path of the road network file.
+
+        Returns
+        -------
+        network : RoadNetwork
+            The road network.
+        """
+        if path.endswith('.csv'):
+
+            edges = pd.read_csv(path)
+            length_km = edges['length_km'].values if 'length_km' in edges else None
+
+            return cls.from_edges(edges['u_lat'].values, edges['u_lon'].values,
+                   edges['v_lat'].values, edges['v_lon'].values, length_km)
+
+        import geopandas as gpd
+        import shapely
+
+        lines = gpd.read_file(path).to_crs('epsg:4326').explode(index_parts = False)
+        coords, index = shapely.get_coordinates(lines.geometry.values, return_index = True)
+
+        # Consecutive vertices of the same line form an edge
+        same_line = index[1:] == index[:-1]
+        start, end = coords[:-1][same_line], coords[1:][same_line]
+
+
+        return cls.from_edges(start[:, 1], start[:, 0], end[:, 1], end[:, 0])
+
+
+    def snap(self, lat, lon):
+        """
+        This function snaps locations to
+        their nearest road graph node.
+
+        Parameters
+        ----------
+        lat, lon : array
+            Coordinates of the locations.
+
+        Returns
+        -------
+        nodes : array
+            Nearest node of each location.
+        offset_km : array
+            Distance from each location to its node.
+        """
+        _, nodes = self.tree.query(unit_vectors(lat, lon))
+        offset_km = pair_distance(lat, lon, self.node_lat[nodes], self.node_lon[nodes])
+
+        return nodes, offset_km
+
+
+    def keep_tree(self, source, row):
+        """
+        This function caches the distances from
+        a source node, removing the oldest ones
+        above `cache_bytes`.
+        """
+        if row.nbytes > self.cache_bytes:
+
+            return None
+
+        self.trees[source] = row
+        self.tree_bytes += row.nbytes
+
+        while self.tree_bytes > self.cache_bytes:
+
+            oldest = next(iter(self.trees))
+            self.tree_bytes -= self.trees.pop(oldest).nbytes
+
+        return None
+
+
+    def node_distances(self, sources, targets = None, chunk = 64):
+        """
+        This function computes the shortest
+        path distances from source nodes to
+        target nodes, running Dijkstra only for
+        sources not found in the cache.
+
+        Parameters
+        ----------
+        sources : array
+            Source node positions.
+        targets : array
+            Target node positions, every node
+            if None.
+        chunk : int
+            Number of sources solved at once.
+
+        Returns
+        -------
+        distances : array
+            A (sources, targets) array of distances in km.
+        """
+        targets = slice(None) if targets is None else np.asarray(targets)
+
+        columns = {}
+        for source in np.unique(sources):
+
+            if source in self.trees:
+
+                # Most recently used last
+                self.trees[source] = self.trees.pop(source)
+                columns[source] = self.trees[source][targets]
+
+        missing = [s for s in np.unique(sources) if s not in columns]
+
+        for start in range(0, len(missing), chunk):
+
+            batch = missing[start:start + chunk]
+            rows = dijkstra(self.graph, directed = False, indices = batch)
+
+            for source, row in zip(batch, rows.astype(np.float32)):
+
+                columns[source] = row[targets]
+                self.keep_tree(source, row)
+
+
+        return np.vstack([columns[s] for s in sources])
+
+
+    def distance_matrix(self, lat1, lon1, lat2, lon2):
+        """
+        This function calculates the road
+        distance between every pair of
+        points in two sets of locations,
+        with the same interface as
+        `cafevisit.distances.haversine_matrix`.
+        Pairs without a road connection have
+        an infinite distance.
+
+        Parameters
+        ----------
+        lat1, lon1 : array
+            Coordinates of the first set of locations (n).
+        lat2, lon2 : array
+            Coordinates of the second set of locations (m).
+
+        Returns
+        -------
+        distance_km : array
+            An (n, m) array of road distances in kilometers.
+        """
+        nodes1, offset1 = self.snap(lat1, lon1)
+        nodes2, offset2 = self.snap(lat2, lon2)
+
+        # One shortest path tree per distinct node of the (fewer) second set
+        unique2, inverse2 = np.unique(nodes2, return_inverse = True)
+        trees = self.node_distances(unique2, nodes1)
+
+        distance_km = trees.T[:, inverse2]
+        distance_km = distance_km + offset1[:, None] + offset2[None, :]
+
+
+        return np.round(distance_km, 4)
+
+
+def straight_line_ratio(network, lat1, lon1, lat2, lon2):
+    """
+    This function compares road and
+    haversine distances, e.g. to benchmark
+    the two distance providers.
+
+    Parameters
+    ----------
+    network : RoadNetwork
+        The road network.
+    lat1, lon1, lat2, lon2 : array
+        Coordinates of the two sets of locations.
+
+    Returns
+    -------
+    ratio : array
+        An (n, m) array of road over
+        straight-line distance.
+    """
+    road = network.distance_matrix(lat1, lon1, lat2, lon2)
+    straight = haversine_matrix(lat1, lon1, lat2, lon2)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+
+        ratio = road / straight
+
+
+    return ratio
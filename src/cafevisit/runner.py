@@ -0,0 +1,174 @@
+import os
+import time
+import traceback
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from cafevisit.instrument import country, country_report, pop_records, run_report, stage
+
+
+def input_size(*paths):
+    """
+    This function estimates the size of
+    a country run from the size of its
+    input files, so that the largest
+    countries can be scheduled first.
+
+    Parameters
+    ----------
+    paths : string
+        Input file paths, missing ones are ignored.
+
+    Returns
+    -------
+    size : int
+        Total size in bytes of the existing files.
+    """
+    return sum(os.path.getsize(path) for path in paths
+               if path is not None and os.path.exists(path))
+
+
+def run_country(func, iso3, args, name = None):
+    """
+    This function runs a single country
+    and reports its wall time, status and
+    stage records instead of raising. The
+    records are also written to the report
+    of the country.
+
+    Parameters
+    ----------
+    func : function
+        Function processing one country.
+    iso3 : string
+        Country iso3 to be processed.
+    args : tuple
+        Arguments passed to `func`.
+    name : string
+        Name of the run in the country report,
+        the function name if None.
+
+    Returns
+    -------
+    result : dict
+        Country iso3, status, wall time, error
+        and stage records.
+    """
+    start = time.perf_counter()
+    name = name or getattr(func, '__name__', str(func))
+
+    try:
+
+        with country(iso3), stage('total'):
+
+            func(*args)
+
+        status, error = 'Completed', ''
+
+    except Exception as e:
+
+        status, error = 'Failed', '{}: {}'.format(type(e).__name__, e)
+        traceback.print_exc()
+
+    result = {
+        'iso3': iso3,
+        'status': status,
+        'wall_time': round(time.perf_counter() - start, 2),
+        'error': error,
+        'stages': pop_records(iso3),
+    }
+
+    if result['stages']:
+
+        country_report(iso3, name, result)
+
+
+    return result
+
+
+def run_countries(func, tasks, jobs = None, size = None, name = None):
+    """
+    This function dispatches independent
+    per-country runs to a process pool,
+    largest countries first. A failing
+    country does not stop the batch. The
+    stage records of every country are
+    written to a run report.
+
+    Parameters
+    ----------
+    func : function
+        Top-level (picklable) function
+        processing one country.
+    tasks : list
+        Arguments of each call to `func`, as
+        tuples whose first item is the country
+        iso3, or plain iso3 strings.
+    jobs : int
+        Number of worker processes. All cores
+        are used if None or 0, and the countries
+        run in this process if 1.
+    size : function
+        Function returning the expected size of
+        a country run from its iso3.
+    name : function
+        Function returning the name of a run in
+        the country report from its task, so
+        that runs of one function with different
+        arguments are kept apart.
+
+    Returns
+    -------
+    summary : dataframe
+        Per-country status and wall time.
+    """
+    tasks = [task if isinstance(task, tuple) else (task,) for task in tasks]
+
+    if size is not None:
+
+        tasks = sorted(tasks, key = lambda task: size(task[0]), reverse = True)
+
+    jobs = jobs or os.cpu_count() or 1
+    names = [name(task) if name is not None else None for task in tasks]
+    results = []
+
+    if jobs == 1:
+
+        for task, task_name in zip(tasks, names):
+
+            results.append(run_country(func, task[0], task, task_name))
+
+    else:
+
+        with ProcessPoolExecutor(max_workers = min(jobs, max(len(tasks), 1))) as pool:
+
+            futures = {pool.submit(run_country, func, task[0], task, task_name): task[0]
+                       for task, task_name in zip(tasks, names)}
+
+            for future in as_completed(futures):
+
+                try:
+
+                    result = future.result()
+
+                except Exception as e:
+
+                    # The worker itself died, e.g. out of memory
+                    result = {'iso3': futures[future], 'status': 'Failed',
+                              'wall_time': None, 'error': '{}: {}'.format(
+                              type(e).__name__, e)}
+
+                print('{} {} in {}s'.format(result['iso3'], result['status'].lower(),
+                      result['wall_time']))
+                results.append(result)
+
+    summary = pd.DataFrame(results, columns = ['iso3', 'status', 'wall_time', 'error'])
+    summary = summary.sort_values('wall_time', ascending = False, ignore_index = True)
+
+    print(summary.to_string(index = False))
+
+    if any(result.get('stages') for result in results):
+
+        run_report(getattr(func, '__name__', str(func)), results)
+
+
+    return summary
@@ -0,0 +1,366 @@
+import os
+import tempfile
+import time
+import numpy as np
+
+
+class Solution:
+
+    """
+    This class holds the solution of a
+    CFLP model, whichever backend
+    produced it.
+    """
+
+
+    def __init__(self, status, objective, open_centers, flows, timing,
+                 backend, lower_bound = None):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        status : string
+            Solver status, e.g. 'Optimal' or 'Infeasible'.
+        objective : float
+            Objective value of the solution.
+        open_centers : array
+            Boolean array of the EV service centers built.
+        flows : array
+            Requests served over each candidate link.
+        timing : dict
+            Wall time in seconds of each solution step.
+        backend : string
+            Name of the backend used.
+        lower_bound : float
+            Best known lower bound of the objective.
+        """
+        self.status = status
+        self.objective = objective
+        self.open_centers = open_centers
+        self.flows = flows
+        self.timing = timing
+        self.backend = backend
+        self.lower_bound = lower_bound
+
+
+    def gap(self):
+        """
+        Relative gap between the objective
+        and the lower bound.
+
+        Returns
+        -------
+        gap : float
+            Relative gap, or None if no
+            lower bound is known.
+        """
+        if self.lower_bound is None or self.objective is None:
+
+            return None
+
+        return (self.objective - self.lower_bound) / max(abs(self.objective), 1e-9)
+
+
+def read_cbc_solution(path, names):
+    """
+    This function reads a CBC solution
+    file, whose first line holds the status
+    and objective and the next ones the
+    index, name and value of each variable.
+
+    Parameters
+    ----------
+    path : string
+        Path of the solution file.
+    names : list
+        Variable names, in model order.
+
+    Returns
+    -------
+    status : string
+        'Optimal', 'Feasible', 'Infeasible',
+        'Unbounded' or 'Not Solved'.
+    objective : float
+        Objective value, None without a solution.
+    values : array
+        Value of each variable.
+    """
+    position = {name: i for i, name in enumerate(names)}
+    values = np.zeros(len(names))
+
+    with open(path) as f:
+
+        header = f.readline()
+
+        for line in f:
+
+            fields = line.split()
+
+            # Variables violating a constraint are flagged with '**'
+            if fields and fields[0] == '**':
+
+                fields = fields[1:]
+
+            if len(fields) >= 3 and fields[1] in position:
+
+                values[position[fields[1]]] = float(fields[2])
+
+    objective = float(header.rsplit(' ', 1)[-1]) if 'objective value' in header else None
+
+    if header.startswith('Optimal'):
+
+        status = 'Optimal'
+
+    elif 'infeasible' in header.lower():
+
+        status = 'Infeasible'
+
+    elif header.startswith('Unbounded'):
+
+        status = 'Unbounded'
+
+    elif header.startswith('Stopped') and objective is not None and objective < 1e50:
+
+        # Limit reached with an integer solution in hand
+        status = 'Feasible'
+
+    else:
+
+        status = 'Not Solved'
+
+    if status not in ('Optimal', 'Feasible'):
+
+        objective = None
+
+
+    return status, objective, values
+
+
+def solve_cbc(model, time_limit = None, mip_gap = None, threads = None,
+              msg = False):
+    """
+    This function solves a CFLP model
+    with CBC, running the CBC binary
+    shipped with PuLP on the MPS file of
+    the model, so that no PuLP variable or
+    constraint is ever built.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Model to solve.
+    time_limit : float
+        Time limit in seconds.
+    mip_gap : float
+        Relative MIP gap at which to stop.
+    threads : int
+        Number of CBC threads.
+    msg : bool
+        Whether to print the solver log.
+
+    Returns
+    -------
+    solution : Solution
+        The model solution.
+    """
+    import subprocess
+    import pulp
+
+    timing = {}
+    start = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        mps_path = os.path.join(tmp, 'cflp.mps')
+        solution_path = os.path.join(tmp, 'cflp.sol')
+        model.write_mps(mps_path)
+        timing['write'] = time.perf_counter() - start
+
+        command = [pulp.PULP_CBC_CMD().path, mps_path]
+        for option, value in [('-sec', time_limit), ('-ratio', mip_gap),
+                              ('-threads', threads)]:
+
+            if value is not None:
+
+                command += [option, str(value)]
+
+        command += ['-solve', '-solution', solution_path]
+
+        start = time.perf_counter()
+        output = None if msg else subprocess.DEVNULL
+        subprocess.run(command, stdout = output, stderr = output, check = True)
+        timing['solve'] = time.perf_counter() - start
+
+        if not os.path.exists(solution_path):
+
+            raise RuntimeError('CBC wrote no solution file, see the log with msg = True')
+
+        status, objective, values = read_cbc_solution(solution_path,
+                                                      model.variable_names())
+
+    if objective is None:
+
+        return Solution(status, None, np.zeros(model.n_ev_centers, dtype = bool),
+                        np.zeros(model.n_links), timing, 'cbc')
+
+
+    return Solution(status, objective, np.round(values[model.n_links:]) == 1,
+                    values[:model.n_links], timing, 'cbc')
+
+
+def highs_status(status, solved):
+    """
+    This function names the status of a
+    `scipy.optimize.milp` result as the CBC
+    and Lagrangian backends do.
+
+    Parameters
+    ----------
+    status : int
+        Status code of the result.
+    solved : bool
+        Whether the result holds a solution.
+
+    Returns
+    -------
+    status : string
+        'Optimal', 'Feasible', 'Infeasible',
+        'Unbounded' or 'Not Solved'.
+    """
+    if status == 0 and solved:
+
+        return 'Optimal'
+
+    if status == 2:
+
+        return 'Infeasible'
+
+    if status == 3:
+
+        return 'Unbounded'
+
+    # Time or iteration limit reached with an integer solution in hand
+    if solved:
+
+        return 'Feasible'
+
+    return 'Not Solved'
+
+
+def solve_highs(model, time_limit = None, mip_gap = None, threads = None,
+                msg = False):
+    """
+    This function solves a CFLP model
+    in-process with HiGHS through
+    `scipy.optimize.milp`, using the
+    sparse model arrays directly.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Model to solve.
+    time_limit : float
+        Time limit in seconds.
+    mip_gap : float
+        Relative MIP gap at which to stop.
+    threads : int
+        Not exposed by `scipy.optimize.milp`
+        and therefore ignored.
+    msg : bool
+        Whether to print the solver log.
+
+    Returns
+    -------
+    solution : Solution
+        The model solution.
+    """
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    options = {'disp': msg}
+    if time_limit is not None:
+
+        options['time_limit'] = time_limit
+
+    if mip_gap is not None:
+
+        options['mip_rel_gap'] = mip_gap
+
+    start = time.perf_counter()
+    constraints = [LinearConstraint(model.A_eq, model.b_eq, model.b_eq),
+                   LinearConstraint(model.A_ub, -np.inf, model.b_ub)]
+    result = milp(model.objective, integrality = model.integrality,
+                  bounds = Bounds(model.lower, model.upper),
+                  constraints = constraints, options = options)
+    timing = {'solve': time.perf_counter() - start}
+
+    status = highs_status(result.status, result.x is not None)
+
+    # Objective is None whenever HiGHS stops without a solution
+    if result.x is None:
+
+        return Solution(status, None, np.zeros(model.n_ev_centers, dtype = bool),
+                        np.zeros(model.n_links), timing, 'highs')
+
+    return Solution(status, result.fun,
+                    np.round(result.x[model.n_links:]) == 1,
+                    result.x[:model.n_links], timing, 'highs',
+                    lower_bound = getattr(result, 'mip_dual_bound', None))
+
+
+def solve_lagrangian(model, **options):
+    """
+    This function solves a CFLP model by
+    Lagrangian relaxation, see
+    `cafevisit.lagrangian.lagrangian_relaxation`.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Model to solve.
+    options : dict
+        Options of the relaxation.
+
+    Returns
+    -------
+    solution : Solution
+        Best feasible solution and lower bound.
+    """
+    from cafevisit.lagrangian import lagrangian_relaxation
+
+    return lagrangian_relaxation(model, **options)
+
+
+SOLVERS = {
+    'cbc': solve_cbc,
+    'highs': solve_highs,
+    'lagrangian': solve_lagrangian,
+}
+
+
+def solve(model, backend = 'cbc', **options):
+    """
+    This function solves a CFLP model
+    with the chosen backend.
+
+    Parameters
+    ----------
+    model : CFLPModel
+        Model to solve.
+    backend : string
+        One of the keys of `SOLVERS`.
+    options : dict
+        Solver options (`time_limit`, `mip_gap`,
+        `threads`, `msg`).
+
+    Returns
+    -------
+    solution : Solution
+        The model solution.
+    """
+    if backend not in SOLVERS:
+
+        raise ValueError('Unknown solver backend {}, expected one of {}'.format(
+                         backend, ', '.join(SOLVERS)))
+
+    return SOLVERS[backend](model, **options)
@@ -0,0 +1,240 @@
+import configparser
+import os
+import pandas as pd
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+EXPORT_CSV = CONFIG.getboolean('storage', 'csv_export', fallback = False)
+
+POPULATION = {
+    'iso3': 'string',
+    'region': 'string',
+    'admin_name': 'string',
+    'GID_1': 'string',
+    'population': 'int64',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'area': 'float64',
+    'pop_density': 'float64',
+    'capital': 'string',
+}
+
+SCHEMAS = {
+    '_population_results': POPULATION,
+    '_customers': dict(POPULATION, demand = 'float64', customer_id = 'int64'),
+    '_ev_centers': dict(POPULATION, demand = 'float64', ev_center_id = 'int64'),
+    '_region': {
+        'GID_1': 'string',
+        'admin_name': 'string',
+        'region': 'string',
+        'latitude': 'float64',
+        'longitude': 'float64',
+        'demand': 'float64',
+    },
+    '_optimized_ev_center': dict(POPULATION, demand = 'float64',
+        ev_center_id = 'string', distance = 'float64', minimized_cost = 'float64',
+        build = 'string', value = 'int64', status = 'string'),
+}
+
+
+def table_schema(path):
+    """
+    Column types of a pipeline table, found
+    from the suffix of its file name, e.g.
+    `KEN_customers.csv` or `SSA_region.parquet`.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    for suffix, schema in SCHEMAS.items():
+
+        if name.endswith(suffix):
+
+            return schema
+
+    return {}
+
+
+def apply_schema(df, schema):
+    """
+    Cast the columns of a table that
+    appear in its schema.
+    """
+    types = {column: dtype for column, dtype in schema.items() if column in df.columns}
+
+    return df.astype(types)
+
+
+def has_parquet():
+    """
+    Whether a Parquet engine is installed.
+    """
+    try:
+
+        import pyarrow
+
+    except ImportError:
+
+        return False
+
+    return True
+
+
+def table_path(path):
+    """
+    This function finds the stored file of
+    a table, preferring Parquet over CSV.
+
+    Parameters
+    ----------
+    path : string
+        Path of the table, with any extension.
+
+    Returns
+    -------
+    path : string
+        Path of the existing file, or None.
+    """
+    stem = os.path.splitext(path)[0]
+
+    for extension in ('.parquet', '.csv'):
+
+        if os.path.exists(stem + extension):
+
+            return stem + extension
+
+    return None
+
+
+def write_table(df, path, csv = None):
+    """
+    This function writes a pipeline table
+    as Parquet with its typed schema, or as
+    GeoParquet when it has a geometry column.
+    CSV is written instead when no Parquet
+    engine is installed.
+
+    Parameters
+    ----------
+    df : dataframe
+        Table to write.
+    path : string
+        Path of the table, the extension is
+        replaced by `.parquet` and `.csv`.
+    csv : bool
+        Whether a CSV copy is exported too,
+        the `[storage] csv_export` option if None.
+
+    Returns
+    -------
+    path : string
+        Path of the written table.
+    """
+    stem = os.path.splitext(path)[0]
+    df = apply_schema(df.reset_index(drop = True), table_schema(path))
+    csv = EXPORT_CSV if csv is None else csv
+
+    folder = os.path.dirname(stem)
+
+    if folder and not os.path.exists(folder):
+
+        os.makedirs(folder)
+
+    path_out = stem + '.csv'
+
+    if has_parquet():
+
+        path_out = stem + '.parquet'
+
+        if 'geometry' in df.columns:
+
+            import geopandas as gpd
+
+            if not isinstance(df, gpd.GeoDataFrame):
+
+                df = gpd.GeoDataFrame(df, geometry = 'geometry', crs = 'epsg:4326')
+
+        df.to_parquet(path_out, index = False)
+
+    # Geometries are exported as WKT text
+    if csv or not has_parquet():
+
+        df.to_csv(stem + '.csv', index = False)
+
+
+    return path_out
+
+
+def read_table(path, columns = None, geometry = True):
+    """
+    This function reads a pipeline table
+    written by `write_table`, or an older
+    CSV output.
+
+    Parameters
+    ----------
+    path : string
+        Path of the table, with any extension.
+    columns : list
+        Columns to read, all if None.
+    geometry : bool
+        Whether the geometry column is read.
+        Tables with geometries are returned as
+        geodataframes.
+
+    Returns
+    -------
+    df : dataframe
+        The table.
+    """
+    path_in = table_path(path)
+
+    if path_in is None:
+
+        raise FileNotFoundError('No table found for {}'.format(path))
+
+    schema = table_schema(path_in)
+
+    if path_in.endswith('.parquet'):
+
+        import pyarrow.parquet as pq
+
+        parquet_schema = pq.read_schema(path_in)
+
+        if columns is None:
+
+            columns = list(parquet_schema.names)
+
+        if not geometry:
+
+            columns = [column for column in columns if column != 'geometry']
+
+        if 'geometry' in columns and b'geo' in (parquet_schema.metadata or {}):
+
+            import geopandas as gpd
+
+            return gpd.read_parquet(path_in, columns = columns)
+
+        return pd.read_parquet(path_in, columns = columns)
+
+    header = pd.read_csv(path_in, nrows = 0).columns
+
+    if columns is None:
+
+        columns = [column for column in header if not column.startswith('Unnamed')]
+
+    if not geometry:
+
+        columns = [column for column in columns if column != 'geometry']
+
+    types = {column: dtype for column, dtype in schema.items() if column in columns}
+    df = pd.read_csv(path_in, usecols = columns, dtype = types)[columns]
+
+    if 'geometry' in df.columns:
+
+        import geopandas as gpd
+
+        df['geometry'] = gpd.GeoSeries.from_wkt(df['geometry'])
+        df = gpd.GeoDataFrame(df, geometry = 'geometry', crs = 'epsg:4326')
+
+
+    return df
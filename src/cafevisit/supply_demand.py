@@ -1,9 +1,10 @@
 import configparser
 import os
-import geopandas as gpd
 import numpy as np
 import pandas as pd
 from cafevisit.inputs import parameters
+from cafevisit.instrument import instrument, note
+from cafevisit.storage import read_table, write_table
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
@@ -30,6 +31,7 @@ class SupplyDemand:
         """
         self.country_iso3 = country_iso3
 
+    @instrument('supply_demand')
     def customer_ev_centers(self):
 
         """
@@ -42,7 +44,7 @@ class SupplyDemand:
             print('Generating demand and supply results for {}'.format(self.country_iso3))
             pop = os.path.join(DATA_RESULTS, self.country_iso3, 
                             'population', '{}_population_results.csv'.format(self.country_iso3))
-            df = pd.read_csv(pop)
+            df = read_table(pop, geometry = False)
             
             region_list = df['admin_name'].unique().tolist()
             df['demand'] = np.floor(item['demand_fraction'] * df.population + 
@@ -77,15 +79,19 @@ class SupplyDemand:
             path_out_1 = os.path.join(folder_out, customer_name)
             path_out_2 = os.path.join(folder_out, region_name)
 
-            ev_df.to_csv(path_out)
-            customer_df.to_csv(path_out_1)
-            region_df.to_csv(path_out_2)
+            note(customers = len(customer_df), ev_centers = len(ev_df),
+                 regions = len(region_df))
+            write_table(ev_df, path_out)
+            write_table(customer_df, path_out_1)
+            write_table(region_df, path_out_2)
 
         return None
     
 
     def add_coordinates(df, lat = 'latitude', lng = 'longitude'):
 
+        import geopandas as gpd
+
         assert pd.Series([lat, lng]).isin(df.columns).all()
 
         geocoded_df = gpd.GeoDataFrame(df, 
@@ -0,0 +1,357 @@
+import configparser
+import itertools
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from cafevisit.inputs import parameters
+from cafevisit.cache import MatrixCache
+from cafevisit.distances import access_cost_matrix, candidate_links, distance_matrix
+from cafevisit.optimization import CFLPModel
+from cafevisit.solvers import solve
+from cafevisit.storage import read_table
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+BASE_PATH = CONFIG['file_locations']['base_path']
+DATA_RESULTS = os.path.join(BASE_PATH, '..', 'results', 'final')
+
+# Parameters that only change the objective and right-hand-side coefficients
+SWEEP_PARAMETERS = ['demand_fraction', 'cost_of_ev_center', 'area_of_ev_center',
+                    'ev_spply_factor', 'electricity_unit_price', 'consumption_ev']
+
+# Models already built in this worker process, keyed by country folder
+COUNTRY_MODELS = {}
+
+
+def parameter_grid(base = None, **values):
+    """
+    This function creates the scenarios
+    of a parameter sweep as every
+    combination of the given values.
+
+    Parameters
+    ----------
+    base : dict
+        Base scenario, the 'country' entry of
+        `cafevisit.inputs.parameters` by default.
+    values : list
+        Values to sweep for each parameter,
+        e.g. demand_fraction = [0.01, 0.02].
+
+    Returns
+    -------
+    grid : list
+        List of scenario parameter dicts.
+    """
+    base = dict(parameters['country'] if base is None else base)
+
+    for key in values:
+
+        if key not in SWEEP_PARAMETERS:
+
+            raise ValueError('{} changes the sampled customers and EV centers '
+                             'and cannot be swept'.format(key))
+
+    keys = list(values)
+    grid = []
+    for combination in itertools.product(*[values[key] for key in keys]):
+
+        scenario = dict(base)
+        scenario.update(zip(keys, combination))
+        grid.append(scenario)
+
+
+    return grid
+
+
+def scenario_demand(data, item):
+    """
+    This function computes the customer
+    demand and EV center capacity of a
+    scenario. Demand keeps the random
+    noise of the base run and the EV center
+    capacity scales with the demand fraction.
+
+    Parameters
+    ----------
+    data : dict
+        Country arrays saved by `prepare_country`.
+    item : dict
+        Scenario parameters.
+
+    Returns
+    -------
+    demand : array
+        Requests of each customer.
+    capacity : float
+        Maximum requests of each EV center.
+    """
+    ratio = item['demand_fraction'] / float(data['demand_fraction'])
+    demand = np.floor(item['demand_fraction'] * data['population'] + data['noise'])
+    capacity = float(data['region_demand']) * ratio * item['ev_spply_factor']
+
+    return demand, capacity
+
+
+def scenario_coefficients(data, item):
+    """
+    This function computes the coefficients
+    of a scenario.
+
+    Parameters
+    ----------
+    data : dict
+        Country arrays saved by `prepare_country`.
+    item : dict
+        Scenario parameters.
+
+    Returns
+    -------
+    coefficients : dict
+        Link costs, demand, capacity and fixed
+        costs of the scenario.
+    """
+    demand, capacity = scenario_demand(data, item)
+
+    return {
+        'link_cost': access_cost_matrix(data['link_distance'], item),
+        'demand': demand,
+        'capacity': capacity,
+        'fixed_cost': item['cost_of_ev_center'] * item['area_of_ev_center'],
+    }
+
+
+def prepare_country(iso3, folder, k_nearest = None, radius_km = None, grid = None):
+    """
+    This function reads the inputs of a
+    country and computes its distance
+    matrix and candidate links once for
+    every scenario of the sweep. The links
+    are the union of those able to serve
+    the demand of each scenario, so that a
+    scenario with less capacity or more
+    demand is not left infeasible.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country iso3 to be processed.
+    folder : string
+        Folder where the shared arrays are written.
+    k_nearest : int
+        Number of nearest EV service centers kept.
+    radius_km : float
+        Travel radius of the kept EV service centers.
+    grid : list
+        Scenarios the links must serve, the
+        base scenario only if None.
+
+    Returns
+    -------
+    folder : string
+        Folder containing `distance.npy` and `inputs.npz`.
+    """
+    item = parameters['country']
+    customer = os.path.join(DATA_RESULTS, iso3, '{}_customers.csv'.format(iso3))
+    ev_centers = os.path.join(DATA_RESULTS, iso3, '{}_ev_centers.csv'.format(iso3))
+    region = os.path.join(DATA_RESULTS, iso3, '{}_region.csv'.format(iso3))
+    df = read_table(customer)
+    df1 = read_table(ev_centers)
+    df2 = read_table(region)
+
+    cache = MatrixCache(os.path.join(DATA_RESULTS, '..', 'processed', 'distance_cache'))
+    distance = distance_matrix(df, df1, cache = cache)
+
+    data = {'population': df['population'].values,
+            'noise': df['demand'].values - item['demand_fraction'] * df['population'].values,
+            'demand_fraction': item['demand_fraction'],
+            'region_demand': df2.demand.mean()}
+
+    # Demand and capacity only depend on these two parameters
+    scenarios = {(scenario['demand_fraction'], scenario['ev_spply_factor']): scenario
+                 for scenario in (grid or [item])}
+
+    keys = []
+    for scenario in scenarios.values():
+
+        demand, capacity = scenario_demand(data, scenario)
+        link_rows, link_cols = candidate_links(df, df1, k = k_nearest,
+                    radius_km = radius_km, demand = demand,
+                    capacity = np.full(df1.shape[0], capacity), distance = distance)
+        keys.append(link_rows * df1.shape[0] + link_cols)
+
+    keys = np.unique(np.concatenate(keys))
+    link_rows, link_cols = keys // df1.shape[0], keys % df1.shape[0]
+
+    if not os.path.exists(folder):
+
+        os.makedirs(folder)
+
+    np.save(os.path.join(folder, 'distance.npy'), distance)
+    np.savez(os.path.join(folder, 'inputs.npz'), link_rows = link_rows,
+             link_cols = link_cols, **data)
+
+
+    return folder
+
+
+def country_model(folder, formulation):
+    """
+    This function loads the shared arrays
+    of a country, with the distance matrix
+    memory-mapped read-only, and builds its
+    model structure once per worker.
+
+    Parameters
+    ----------
+    folder : string
+        Folder written by `prepare_country`.
+    formulation : string
+        'strong' or 'weak' linking constraints.
+
+    Returns
+    -------
+    model : CFLPModel
+        Model whose coefficients are updated per scenario.
+    data : dict
+        Country arrays, including the link distances.
+    """
+    key = (folder, formulation)
+
+    if key not in COUNTRY_MODELS:
+
+        distance = np.load(os.path.join(folder, 'distance.npy'), mmap_mode = 'r')
+        data = dict(np.load(os.path.join(folder, 'inputs.npz')))
+        data['link_distance'] = np.asarray(distance[data['link_rows'], data['link_cols']])
+
+        model = CFLPModel(distance, data['population'], 0, 0, data['link_rows'],
+                          data['link_cols'], formulation = formulation)
+        COUNTRY_MODELS[key] = (model, data)
+
+
+    return COUNTRY_MODELS[key]
+
+
+def run_scenario(iso3, scenario_id, item, folder, formulation, backend,
+                 solver_options):
+    """
+    This function solves one scenario of
+    one country.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country iso3.
+    scenario_id : int
+        Position of the scenario in the grid.
+    item : dict
+        Scenario parameters.
+    folder : string
+        Folder written by `prepare_country`.
+    formulation : string
+        'strong' or 'weak' linking constraints.
+    backend : string
+        Solver backend.
+    solver_options : dict
+        Options passed to the solver backend.
+
+    Returns
+    -------
+    result : dict
+        Scenario parameters and outcome.
+    """
+    start = time.perf_counter()
+    model, data = country_model(folder, formulation)
+
+    model.update(**scenario_coefficients(data, item))
+
+    solution = solve(model, backend = backend, **solver_options)
+
+    result = {'iso3': iso3, 'scenario': scenario_id}
+    result.update({key: item[key] for key in SWEEP_PARAMETERS})
+    result.update({
+        'status': solution.status,
+        'minimized_cost': solution.objective,
+        'lower_bound': solution.lower_bound,
+        'ev_centers_built': int(np.sum(solution.open_centers)),
+        'requests': float(model.demand.sum()),
+        'wall_time': round(time.perf_counter() - start, 2),
+    })
+
+
+    return result
+
+
+def sweep(countries, grid, jobs = None, backend = 'highs', formulation = 'strong',
+          k_nearest = None, radius_km = None, **solver_options):
+    """
+    This function solves every scenario of
+    a parameter grid for every country.
+    Distances and candidate links are
+    computed once per country and the
+    scenarios run in parallel workers that
+    share the distance matrix read-only.
+
+    Parameters
+    ----------
+    countries : list
+        Country iso3 codes.
+    grid : list
+        Scenarios, e.g. from `parameter_grid`.
+    jobs : int
+        Number of worker processes, all cores if None.
+    backend : string
+        Solver backend.
+    formulation : string
+        'strong' or 'weak' linking constraints.
+    k_nearest : int
+        Number of nearest EV service centers kept.
+    radius_km : float
+        Travel radius of the kept EV service centers.
+    solver_options : dict
+        Options passed to the solver backend.
+
+    Returns
+    -------
+    results : dataframe
+        One row per scenario and country.
+    """
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        tasks = []
+        for iso3 in countries:
+
+            print('Preparing sweep inputs for {}'.format(iso3))
+            folder = prepare_country(iso3, os.path.join(tmp, iso3), k_nearest = k_nearest,
+                                     radius_km = radius_km, grid = grid)
+
+            for scenario_id, item in enumerate(grid):
+
+                tasks.append((iso3, scenario_id, item, folder, formulation,
+                              backend, solver_options))
+
+        with ProcessPoolExecutor(max_workers = jobs) as pool:
+
+            futures = [pool.submit(run_scenario, *task) for task in tasks]
+
+            for task, future in zip(tasks, futures):
+
+                try:
+
+                    results.append(future.result())
+
+                except Exception as e:
+
+                    print('Scenario {} failed for {}: {}'.format(task[1], task[0], e))
+                    results.append({'iso3': task[0], 'scenario': task[1],
+                                    'status': 'Failed'})
+
+    results = pd.DataFrame(results)
+
+
+    return results
@@ -0,0 +1,418 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# User-assigned ISO 3166 codes, never those of a real country
+ISO3_PREFIX = 'X'
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Roughly a Kenyan level 2 region, in square degrees
+SUB_REGION_AREA = 0.16
+
+
+def country_codes(n_countries):
+    """
+    Iso3 codes of the synthetic countries,
+    `XAA`, `XAB`, ...
+    """
+    if n_countries > len(LETTERS) ** 2:
+
+        raise ValueError('At most {} synthetic countries'.format(len(LETTERS) ** 2))
+
+    return ['{}{}{}'.format(ISO3_PREFIX, LETTERS[i // len(LETTERS)], LETTERS[i % len(LETTERS)])
+            for i in range(n_countries)]
+
+
+def outline(center, radius, rng, vertices = 64):
+    """
+    This function draws an irregular national
+    outline around a center point, a circle
+    whose radius wanders by up to a quarter.
+
+    Parameters
+    ----------
+    center : tuple
+        Longitude and latitude of the center.
+    radius : float
+        Mean radius in degrees.
+    rng : Generator
+        Random number generator.
+    vertices : int
+        Number of outline vertices.
+
+    Returns
+    -------
+    polygon : Polygon
+        Outline of the country.
+    """
+    from shapely.geometry import Polygon
+
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint = False)
+
+    # Smooth wandering radius from a few random harmonics
+    wander = np.zeros(vertices)
+    for harmonic in range(2, 6):
+
+        wander += rng.normal(0, 0.25 / harmonic) * np.cos(harmonic * angles +
+                  rng.uniform(0, 2 * np.pi))
+
+    radii = radius * np.clip(1 + wander, 0.75, 1.25)
+
+
+    return Polygon(np.column_stack([center[0] + radii * np.cos(angles),
+                                    center[1] + radii * np.sin(angles)]))
+
+
+def random_points(polygon, n, rng):
+    """
+    Uniform random points inside a polygon.
+    """
+    import shapely
+
+    xmin, ymin, xmax, ymax = polygon.bounds
+    shapely.prepare(polygon)
+
+    points = np.empty(0, dtype = object)
+    while len(points) < n:
+
+        candidates = shapely.points(rng.uniform(xmin, xmax, 2 * n),
+                                    rng.uniform(ymin, ymax, 2 * n))
+        points = np.concatenate([points, candidates[shapely.contains(polygon, candidates)]])
+
+
+    return points[:n]
+
+
+def partition(polygon, n, rng):
+    """
+    This function splits a polygon into `n`
+    regions, the Voronoi cells of random
+    points clipped to the polygon, so that
+    the regions nest exactly in it.
+
+    Parameters
+    ----------
+    polygon : Polygon
+        Shape to split.
+    n : int
+        Number of regions.
+    rng : Generator
+        Random number generator.
+
+    Returns
+    -------
+    regions : array
+        Array of n polygons.
+    """
+    import shapely
+
+    if n == 1:
+
+        return np.array([polygon], dtype = object)
+
+    seeds = shapely.multipoints(random_points(polygon, n, rng))
+    cells = shapely.get_parts(shapely.voronoi_polygons(seeds, extend_to = polygon))
+    regions = shapely.intersection(cells, polygon)
+
+
+    return regions[~shapely.is_empty(regions)]
+
+
+def synthetic_boundaries(n_countries = 2, regions = 10, sub_regions = 10,
+                         area = SUB_REGION_AREA, seed = 0):
+    """
+    This function generates GADM-like layers
+    of synthetic countries: level 0 outlines,
+    level 1 regions splitting them and level 2
+    regions splitting those, with the `GID_*`
+    and `NAME_*` columns of GADM 3.6.
+
+    Parameters
+    ----------
+    n_countries : int
+        Number of countries.
+    regions : int
+        Level 1 regions per country.
+    sub_regions : int
+        Level 2 regions per level 1 region.
+    area : float
+        Mean level 2 region area in square
+        degrees. Countries larger than 12
+        degrees across shrink it to stay on
+        the map.
+    seed : int
+        Seed of the random number generator.
+
+    Returns
+    -------
+    layers : dict
+        Geodataframe of each GADM level.
+    """
+    import geopandas as gpd
+
+    rng = np.random.default_rng(seed)
+    radius = min(np.sqrt(regions * sub_regions * area / np.pi), 6)
+    columns = int(np.ceil(np.sqrt(n_countries)))
+
+    rows = {0: [], 1: [], 2: []}
+    for i, iso3 in enumerate(country_codes(n_countries)):
+
+        # Countries sit on a grid south and east of (15, 15)
+        center = (15 + 2.6 * radius * (i % columns + 0.5),
+                  15 - 2.6 * radius * (i // columns + 0.5))
+        country = outline(center, radius, rng)
+        name_0 = 'Country {}'.format(iso3)
+        rows[0].append({'GID_0': iso3, 'NAME_0': name_0, 'geometry': country})
+
+        for j, region in enumerate(partition(country, regions, rng), 1):
+
+            gid_1 = '{}.{}_1'.format(iso3, j)
+            name_1 = '{} Region {}'.format(iso3, j)
+            rows[1].append({'GID_0': iso3, 'NAME_0': name_0, 'GID_1': gid_1,
+                            'NAME_1': name_1, 'geometry': region})
+
+            for k, sub_region in enumerate(partition(region, sub_regions, rng), 1):
+
+                rows[2].append({'GID_0': iso3, 'NAME_0': name_0, 'GID_1': gid_1,
+                                'NAME_1': name_1, 'GID_2': '{}.{}.{}_1'.format(iso3, j, k),
+                                'NAME_2': '{} District {}.{}'.format(iso3, j, k),
+                                'geometry': sub_region})
+
+
+    return {level: gpd.GeoDataFrame(layer, geometry = 'geometry', crs = 'epsg:4326')
+            for level, layer in rows.items()}
+
+
+def synthetic_countries(isos, lowest = 2):
+    """
+    This function creates the country metadata
+    (`countries.csv`) of synthetic countries,
+    all in Sub-Saharan Africa.
+
+    Parameters
+    ----------
+    isos : list
+        Country iso3 codes.
+    lowest : int
+        Lowest GID level of every country.
+
+    Returns
+    -------
+    countries : dataframe
+        Country metadata.
+    """
+    return pd.DataFrame({
+        'iso3': isos,
+        'iso2': [iso3[:2] for iso3 in isos],
+        'country': ['Country {}'.format(iso3) for iso3 in isos],
+        'continent': 'Africa',
+        'region': 'Sub-Saharan Africa',
+        'lowest': lowest,
+        'Exclude': 0,
+    })
+
+
+def synthetic_population(path, outlines, resolution = 1 / 120, cities = 20,
+                         density = 20, nodata = -99999, block = 512, seed = 0):
+    """
+    This function writes a WorldPop-like
+    population raster over the national
+    outlines: a rural background plus
+    Gaussian cities whose populations follow
+    Zipf's law, nodata outside the outlines.
+    It is written one block of rows at a time.
+
+    Parameters
+    ----------
+    path : string
+        Path of the GeoTIFF to write.
+    outlines : geodataframe
+        National outlines.
+    resolution : float
+        Pixel size in degrees.
+    cities : int
+        Number of cities per country.
+    density : float
+        Mean rural population per pixel.
+    nodata : float
+        Value of the pixels outside the outlines.
+    block : int
+        Height and width of the raster blocks.
+    seed : int
+        Seed of the random number generator.
+
+    Returns
+    -------
+    path : string
+        Path of the written raster.
+    """
+    import rasterio
+    import shapely
+    from rasterio.features import geometry_mask
+    from rasterio.transform import from_origin
+    from rasterio.windows import Window, transform as window_transform
+
+    rng = np.random.default_rng(seed)
+
+    xmin, ymin, xmax, ymax = outlines.total_bounds + np.array([-1, -1, 1, 1]) * resolution * 8
+    width = int(np.ceil((xmax - xmin) / resolution))
+    height = int(np.ceil((ymax - ymin) / resolution))
+    transform = from_origin(xmin, ymax, resolution, resolution)
+
+    # City centers, the largest one holding a million people
+    centers = np.concatenate([random_points(geometry, cities, rng) for geometry in outlines.geometry])
+    rank = np.tile(np.arange(1, cities + 1), len(outlines))
+    city_x, city_y = shapely.get_x(centers), shapely.get_y(centers)
+    city_pop = 1e6 / rank * rng.uniform(0.5, 1.5, len(centers))
+    sigma = 0.02 * np.sqrt(city_pop / 1e5)
+
+    meta = {'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'height': height,
+            'width': width, 'crs': 'epsg:4326', 'nodata': nodata, 'transform': transform,
+            'tiled': True, 'blockxsize': block, 'blockysize': block, 'compress': 'lzw'}
+
+    folder = os.path.dirname(path)
+
+    if folder and not os.path.exists(folder):
+
+        os.makedirs(folder)
+
+    with rasterio.open(path, 'w', **meta) as dest:
+
+        for row in range(0, height, block):
+
+            rows = min(block, height - row)
+            window = Window(0, row, width, rows)
+            array = rng.gamma(2, density / 2, (rows, width)).astype(np.float32)
+
+            top = ymax - row * resolution
+            bottom = top - rows * resolution
+            near = np.flatnonzero((city_y + 4 * sigma > bottom) & (city_y - 4 * sigma < top))
+
+            for c in near:
+
+                # Only the pixels within four standard deviations of the city
+                col_start = max(int((city_x[c] - 4 * sigma[c] - xmin) / resolution), 0)
+                col_stop = min(int((city_x[c] + 4 * sigma[c] - xmin) / resolution) + 1, width)
+                x = xmin + (np.arange(col_start, col_stop) + 0.5) * resolution
+                y = top - (np.arange(rows) + 0.5) * resolution
+                distance = (x[None, :] - city_x[c]) ** 2 + (y[:, None] - city_y[c]) ** 2
+                array[:, col_start:col_stop] += (city_pop[c] * resolution ** 2 /
+                    (2 * np.pi * sigma[c] ** 2) * np.exp(-distance / (2 * sigma[c] ** 2)))
+
+            outside = geometry_mask(outlines.geometry, (rows, width),
+                                    window_transform(window, transform))
+            array[outside] = nodata
+            dest.write(array, 1, window = window)
+
+
+    return path
+
+
+def generate_inputs(folder, n_countries = 2, regions = 10, sub_regions = 10,
+                    scale = 1, cities = 20, seed = 0, overwrite = False):
+    """
+    This function writes a synthetic copy of
+    the pipeline inputs under `folder`, laid
+    out as the real ones: `data/raw/countries.csv`,
+    the GADM shapefiles in `data/raw/boundaries`
+    and the population raster in
+    `data/raw/WorldPop`. Running the pipeline
+    from `folder` then processes the synthetic
+    countries instead of the real ones. An
+    existing `data/raw` folder, e.g. the real
+    inputs, is only replaced with `overwrite`.
+
+    Parameters
+    ----------
+    folder : string
+        Root folder of the synthetic inputs.
+    n_countries : int
+        Number of countries.
+    regions : int
+        Level 1 regions per country.
+    sub_regions : int
+        Level 2 regions per level 1 region.
+    scale : int
+        Factor multiplying the number of level 1
+        regions, and of customers and EV service
+        centers with them. The raster resolution
+        is refined to keep about 400 pixels per
+        level 2 region.
+    cities : int
+        Number of cities per country, before scaling.
+    seed : int
+        Seed of the random number generator.
+    overwrite : bool
+        Whether existing inputs are replaced.
+
+    Returns
+    -------
+    paths : dict
+        Paths of the countries metadata, of
+        each GADM layer and of the raster.
+    """
+    import shapely
+
+    data_raw = os.path.join(folder, 'data', 'raw')
+    paths = {'countries': os.path.join(data_raw, 'countries.csv'),
+             'population': os.path.join(data_raw, 'WorldPop', 'ppp_2020_1km_Aggregated.tif')}
+
+    existing = [path for path in list(paths.values()) + [os.path.join(data_raw, 'boundaries')]
+                if os.path.exists(path)]
+
+    if existing and not overwrite:
+
+        raise FileExistsError('{} already exists'.format(existing[0]))
+
+    regions = int(regions * scale)
+    layers = synthetic_boundaries(n_countries, regions, sub_regions, seed = seed)
+
+    # Countries capped in size hold smaller regions, rendered more finely
+    area = shapely.area(np.asarray(layers[2].geometry)).mean()
+    resolution = min(1 / 120, np.sqrt(area / 400))
+
+    if not os.path.exists(os.path.join(data_raw, 'boundaries')):
+
+        os.makedirs(os.path.join(data_raw, 'boundaries'))
+
+    countries = synthetic_countries(list(layers[0]['GID_0']))
+    countries.to_csv(paths['countries'], index = False)
+
+    for level, layer in layers.items():
+
+        paths[level] = os.path.join(data_raw, 'boundaries', 'gadm36_{}.shp'.format(level))
+        layer.to_file(paths[level])
+
+    synthetic_population(paths['population'], layers[0], resolution = resolution,
+                         cities = int(cities * scale), seed = seed)
+
+
+    return paths
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Write synthetic pipeline inputs.')
+    parser.add_argument('folder', help = 'root folder of the synthetic inputs')
+    parser.add_argument('--countries', type = int, default = 2)
+    parser.add_argument('--regions', type = int, default = 10)
+    parser.add_argument('--sub-regions', type = int, default = 10)
+    parser.add_argument('--scale', type = float, default = 1)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--overwrite', action = 'store_true',
+                        help = 'replace existing inputs in the folder')
+    args = parser.parse_args()
+
+    try:
+
+        paths = generate_inputs(args.folder, args.countries, args.regions, args.sub_regions,
+                                args.scale, seed = args.seed, overwrite = args.overwrite)
+
+    except FileExistsError as e:
+
+        parser.error('{}, use --overwrite to replace it'.format(e))
+
+    for name, path in paths.items():
+
+        print('{}: {}'.format(name, path))
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+from cafevisit.instrument import instrument, note
+from cafevisit.raster import map_tiles
+
+
+def label_grid(geometries, transform, shape, all_touched = False):
+    """
+    This function burns every region polygon
+    into a single label array aligned with
+    the raster, label i + 1 marking the
+    pixels whose center falls in region i.
+
+    Parameters
+    ----------
+    geometries : list
+        Region geometries.
+    transform : Affine
+        Affine transform of the raster.
+    shape : tuple
+        Height and width of the raster.
+    all_touched : bool
+        Whether every pixel touched by a region is
+        labelled, as in `rasterstats.zonal_stats`.
+
+    Returns
+    -------
+    labels : array
+        An int32 label array, 0 outside every region.
+    """
+    from rasterio.features import rasterize
+
+    shapes = [(geometry, i + 1) for i, geometry in enumerate(geometries)
+              if geometry is not None and not geometry.is_empty]
+
+    if len(shapes) == 0:
+
+        return np.zeros(shape, dtype = np.int32)
+
+    labels = rasterize(shapes, out_shape = shape, transform = transform, fill = 0,
+                       dtype = 'int32', all_touched = all_touched)
+
+
+    return labels
+
+
+def zonal_sums(array, labels, n_regions, nodata = None):
+    """
+    This function sums, counts and averages
+    the raster values of every region in
+    one pass with `np.bincount`.
+
+    Parameters
+    ----------
+    array : array
+        Raster values.
+    labels : array
+        Label array from `label_grid`.
+    n_regions : int
+        Number of regions.
+    nodata : float
+        Raster value to ignore.
+
+    Returns
+    -------
+    sums, counts, means : array
+        Per-region statistics. Regions without
+        any valid pixel have a NaN sum and mean.
+    """
+    valid = (labels > 0) & ~np.isnan(array)
+
+    if nodata is not None:
+
+        valid &= array != nodata
+
+    region = labels[valid]
+    counts = np.bincount(region, minlength = n_regions + 1)[1:]
+    sums = np.bincount(region, weights = array[valid].astype(float),
+                       minlength = n_regions + 1)[1:]
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+
+        means = sums / counts
+
+    sums = np.where(counts > 0, sums, np.nan)
+
+
+    return sums, counts, means
+
+
+@instrument('zonal_stats')
+def zonal_population(boundaries, path_raster, nodata = 255, tile_size = 1024,
+                     workers = 4):
+    """
+    This function streams a population raster
+    tile by tile and accumulates the
+    population of every boundary polygon,
+    together with its centroid. Only the
+    polygons overlapping a tile are
+    rasterized for it.
+
+    Parameters
+    ----------
+    boundaries : geodataframe
+        Region boundaries.
+    path_raster : string
+        Path of the population raster.
+    nodata : float
+        Raster value to ignore.
+    tile_size : int
+        Approximate tile size in pixels.
+    workers : int
+        Number of reading threads.
+
+    Returns
+    -------
+    stats : dataframe
+        Population sum, pixel count, mean, latitude
+        and longitude of every boundary, in the
+        order of `boundaries`.
+    """
+    from rasterio.windows import bounds
+
+    geometries = boundaries.geometry.values
+    extents = boundaries.geometry.bounds.values
+    n_regions = len(boundaries)
+    note(rows = n_regions)
+
+    def tile_sums(window, transform, array):
+
+        left, bottom, right, top = bounds(window, transform)
+        overlap = np.nonzero((extents[:, 0] <= right) & (extents[:, 2] >= left) &
+                             (extents[:, 1] <= top) & (extents[:, 3] >= bottom))[0]
+
+        if len(overlap) == 0:
+
+            return None
+
+        values = np.ma.filled(array.astype(float), np.nan)
+        values[values <= 0] = 0
+
+        labels = label_grid(geometries[overlap], transform, values.shape)
+        sums, counts, _ = zonal_sums(values, labels, len(overlap))
+
+        return overlap, np.nan_to_num(sums), counts
+
+    # nodata pixels come back masked and are dropped as NaN
+    sums = np.zeros(n_regions)
+    counts = np.zeros(n_regions, dtype = np.int64)
+    for result in map_tiles(path_raster, tile_sums, tile_size = tile_size,
+                            workers = workers, nodata = nodata):
+
+        if result is not None:
+
+            overlap, tile_sum, tile_count = result
+            sums[overlap] += tile_sum
+            counts[overlap] += tile_count
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+
+        means = sums / counts
+
+    sums = np.where(counts > 0, sums, np.nan)
+    centroids = boundaries.geometry.centroid
+
+    stats = pd.DataFrame({
+        'population': sums,
+        'count': counts,
+        'mean': means,
+        'latitude': centroids.y.values,
+        'longitude': centroids.x.values,
+    }, index = boundaries.index)
+
+
+    return stats
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from cafevisit.inputs import parameters
+
+ITEM = parameters['country']
+
+# Low enough against the access costs that only some centers are built
+FIXED_COST = 10000
+
+
+def locations(rng, n, name, n_regions = 4):
+    """
+    Random locations over a small
+    country-sized box.
+    """
+    return pd.DataFrame({
+        'latitude': rng.uniform(-1, 1, n),
+        'longitude': rng.uniform(36, 38, n),
+        'admin_name': ['Region {}'.format(i) for i in rng.integers(0, n_regions, n)],
+        name: range(1, n + 1),
+    })
+
+
+@pytest.fixture
+def instance():
+    """
+    Customers, EV service centers, center
+    capacity and fixed cost of a small
+    instance, sized as in `linear_problem`.
+    """
+    rng = np.random.default_rng(0)
+    customers = locations(rng, 12, 'customer_id')
+    customers['demand'] = np.floor(rng.uniform(50, 150, len(customers)))
+    ev_centers = locations(rng, 5, 'ev_center_id')
+
+    capacity = customers.groupby('admin_name')['demand'].sum().mean() * ITEM['ev_spply_factor']
+    fixed_cost = FIXED_COST
+
+
+    return customers, ev_centers, capacity, fixed_cost
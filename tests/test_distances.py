@@ -0,0 +1,116 @@
+import math
+import numpy as np
+import pandas as pd
+from cafevisit.distances import (candidate_links, cost_matrices, distance_matrix,
+                                 haversine_matrix, links_feasible)
+from cafevisit.road_network import RoadNetwork
+from conftest import ITEM
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Per-pair haversine distance of the
+    original `linear_problem` loop.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    a = (math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) *
+         math.sin((lon2 - lon1) / 2) ** 2)
+
+    return round(6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)), 4)
+
+
+def loop_matrices(customers, ev_centers):
+    """
+    Distances and access costs computed
+    pair by pair as the original loop did.
+    """
+    distance = np.zeros((len(customers), len(ev_centers)))
+    cost = np.zeros_like(distance)
+
+    for i, customer in customers.iterrows():
+
+        for j, ev_center in ev_centers.iterrows():
+
+            d = 0 if customer['admin_name'] == ev_center['admin_name'] else \
+                haversine_distance(ev_center['latitude'], ev_center['longitude'],
+                                   customer['latitude'], customer['longitude'])
+            distance[i, j] = d
+            cost[i, j] = round(ITEM['electricity_unit_price'] * (d / ITEM['consumption_ev']), 4)
+
+
+    return distance, cost
+
+
+def test_haversine_matrix_matches_pairs(instance):
+
+    customers, ev_centers, _, _ = instance
+    distance = haversine_matrix(customers['latitude'].values, customers['longitude'].values,
+                                ev_centers['latitude'].values, ev_centers['longitude'].values)
+
+    expected = [[haversine_distance(lat1, lon1, lat2, lon2)
+                 for lat2, lon2 in zip(ev_centers['latitude'], ev_centers['longitude'])]
+                for lat1, lon1 in zip(customers['latitude'], customers['longitude'])]
+
+    np.testing.assert_allclose(distance, expected, atol = 1e-4)
+
+
+def test_cost_matrices_match_loop(instance):
+
+    customers, ev_centers, _, _ = instance
+    distance, cost, costs_dict = cost_matrices(customers, ev_centers, ITEM, as_dict = True)
+    expected_distance, expected_cost = loop_matrices(customers, ev_centers)
+
+    np.testing.assert_allclose(distance, expected_distance, atol = 1e-4)
+    np.testing.assert_allclose(cost, expected_cost, atol = 1e-3)
+    assert (distance == 0).sum() == (expected_distance == 0).sum() > 0
+
+    # Keyed by EV service center, then customer, as the loop built it
+    assert list(costs_dict) == list(ev_centers['ev_center_id'])
+    assert costs_dict[2][3] == cost[2, 1]
+
+
+def test_same_region_is_zero_with_object_and_string_names(instance):
+
+    customers, ev_centers, _, _ = instance
+    expected = distance_matrix(customers, ev_centers)
+
+    customers = customers.astype({'admin_name': 'string'})
+    ev_centers = ev_centers.astype({'admin_name': 'string'})
+
+    np.testing.assert_array_equal(distance_matrix(customers, ev_centers), expected)
+
+
+def test_links_feasible_keeps_fractional_and_large_requests():
+
+    # One customer per center, each center serving its own customer only
+    customer_idx, ev_center_idx = np.array([0, 1]), np.array([0, 1])
+
+    # Fractional demand needs capacity, and fractional capacity adds up
+    assert not links_feasible(customer_idx, ev_center_idx, [0.4, 1], [0, 1])
+    assert not links_feasible(customer_idx, ev_center_idx, [1.25, 1], [1.2, 1])
+    assert links_feasible(np.array([0, 1]), np.array([0, 0]), [0.5, 0.5], [1.0, 0])
+
+    # Totals beyond int32 neither overflow nor lose a shortfall
+    assert links_feasible(customer_idx, ev_center_idx, [3e9, 2e9], [3e9, 2e9])
+    assert not links_feasible(customer_idx, ev_center_idx, [3e9, 2e9], [3e9, 1.9e9])
+
+
+def test_unreachable_links_are_widened_past():
+
+    # Two roads along the equator, with no connection between them
+    network = RoadNetwork.from_edges(np.zeros(3), np.array([36.0, 36.5, 37.0]),
+                                     np.zeros(3), np.array([36.5, 36.9, 38.0]))
+    customers = pd.DataFrame({'latitude': [0.0], 'longitude': [36.88],
+                              'admin_name': ['Region 1']})
+    ev_centers = pd.DataFrame({'latitude': [0.0, 0.0], 'longitude': [36.0, 37.0],
+                               'admin_name': ['Region 2', 'Region 3']})
+    distance = distance_matrix(customers, ev_centers, network = network)
+
+    # The nearest center in a straight line is on the other road
+    assert np.isfinite(distance[0, 0]) and np.isinf(distance[0, 1])
+    customer_idx, ev_center_idx = candidate_links(customers, ev_centers, k = 1,
+                                                  demand = [10], capacity = [100, 100],
+                                                  distance = distance)
+
+    assert list(zip(customer_idx, ev_center_idx)) == [(0, 0)]
+    assert list(zip(*candidate_links(customers, ev_centers, distance = distance))) == [(0, 0)]
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from cafevisit.distances import cost_matrices
+from cafevisit.optimization import CFLPModel
+from cafevisit.solvers import solve
+from conftest import ITEM
+
+
+def model_of(instance, capacity = None):
+    """
+    Strong CFLP model of the instance.
+    """
+    customers, ev_centers, default_capacity, fixed_cost = instance
+    _, cost = cost_matrices(customers, ev_centers, ITEM)
+    capacity = default_capacity if capacity is None else capacity
+
+
+    return CFLPModel(cost, customers['demand'].values, capacity, fixed_cost)
+
+
+def test_bounds_enclose_the_optimum(instance):
+
+    model = model_of(instance)
+    optimum = solve(model, 'highs').objective
+    solution = solve(model, 'lagrangian', mip_gap = 0.01)
+
+    assert solution.status in ('Optimal', 'Feasible')
+    assert solution.lower_bound <= optimum * (1 + 1e-6)
+    assert solution.objective >= optimum * (1 - 1e-6)
+    assert solution.gap() <= 0.01
+
+    # The upper bound is a feasible solution of the model
+    flows = np.concatenate([solution.flows, solution.open_centers.astype(float)])
+    np.testing.assert_allclose(model.A_eq @ flows, model.b_eq)
+    assert (model.A_ub @ flows <= model.b_ub + 1e-6).all()
+    assert model.objective @ flows == pytest.approx(solution.objective)
+
+
+def test_gap_stop_is_not_reported_optimal(instance):
+
+    model = model_of(instance)
+    optimum = solve(model, 'highs').objective
+    solution = solve(model, 'lagrangian', mip_gap = 0.5)
+
+    # Stopped within the gap before the bounds met
+    assert solution.lower_bound < optimum * (1 - 1e-6)
+    assert solution.status == 'Feasible'
+    assert solution.objective >= optimum * (1 - 1e-6)
+
+
+def test_infeasible_model_has_no_solution(instance):
+
+    # Total capacity below the total demand
+    customers = instance[0]
+    model = model_of(instance, capacity = customers['demand'].sum() / 10)
+    solution = solve(model, 'lagrangian', max_iter = 50)
+
+    assert solution.status == 'Not Solved'
+    assert solution.objective is None
+    assert solution.gap() is None
@@ -0,0 +1,85 @@
+import os
+import pandas as pd
+import pytest
+from cafevisit.merge import merge_results
+from cafevisit.storage import read_table, write_table
+
+
+def write_region(folder, iso3, n):
+    """
+    Write a country region table of n rows.
+    """
+    df = pd.DataFrame({
+        'GID_1': ['{}.{}_1'.format(iso3, i) for i in range(n)],
+        'admin_name': ['{} Region {}'.format(iso3, i) for i in range(n)],
+        'region': '',
+        'latitude': range(n),
+        'longitude': range(n),
+        'demand': [100.0 * (i + 1) for i in range(n)],
+    })
+
+    return write_table(df, os.path.join(folder, iso3, '{}_region.csv'.format(iso3)))
+
+
+def merged(folder_out):
+    """
+    Merged region rows, in a stable order.
+    """
+    df = read_table(os.path.join(folder_out, 'SSA_region.csv'))
+
+    return df.sort_values('GID_1').reset_index(drop = True)
+
+
+@pytest.fixture
+def results(tmp_path):
+    """
+    Results folder of three countries.
+    """
+    folder = str(tmp_path / 'final')
+
+    for iso3, n in [('KEN', 2), ('GHA', 3), ('MOZ', 1)]:
+
+        write_region(folder, iso3, n)
+
+    return folder
+
+
+def test_full_merge_concatenates_countries(tmp_path, results):
+
+    folder_out = str(tmp_path / 'SSA')
+    counts = merge_results(results, folder_out)
+
+    df = merged(folder_out)
+    assert counts['_region.csv'] == 6
+    assert df.groupby('iso3').size().to_dict() == {'GHA': 3, 'KEN': 2, 'MOZ': 1}
+    assert df.set_index('iso3')['region'].to_dict() == {'GHA': 'West', 'KEN': 'Eastern',
+                                                        'MOZ': 'Southern'}
+
+
+def test_incremental_merge_matches_full_merge(tmp_path, results):
+
+    folder_out = str(tmp_path / 'SSA')
+    merge_results(results, folder_out, incremental = True)
+
+    assert merge_results(results, folder_out, incremental = True) == {}
+
+    write_region(results, 'GHA', 4)
+    assert merge_results(results, folder_out, incremental = True) == {'_region.csv': 7}
+
+    merge_results(results, str(tmp_path / 'full'))
+    pd.testing.assert_frame_equal(merged(folder_out), merged(str(tmp_path / 'full')))
+
+
+def test_incremental_subset_keeps_other_countries(tmp_path, results):
+
+    folder_out = str(tmp_path / 'SSA')
+    merge_results(results, folder_out, incremental = True)
+
+    write_region(results, 'KEN', 5)
+    merge_results(results, folder_out, iso3_list = ['KEN'], incremental = True)
+
+    df = merged(folder_out)
+    assert df.groupby('iso3').size().to_dict() == {'GHA': 3, 'KEN': 5, 'MOZ': 1}
+
+    # Nothing left to merge for any country
+    assert merge_results(results, folder_out, incremental = True) == {}
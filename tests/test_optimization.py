@@ -0,0 +1,110 @@
+from itertools import product
+import numpy as np
+import pytest
+from cafevisit.distances import cost_matrices
+from cafevisit.optimization import CFLPModel
+from cafevisit.solvers import highs_status, solve
+from conftest import ITEM, locations
+
+
+def pulp_objective(cost, demand, capacity, fixed_cost):
+    """
+    Optimal cost of the PuLP model built
+    as the original `linear_problem` did.
+    """
+    pulp = pytest.importorskip('pulp')
+
+    customers, ev_centers = range(cost.shape[0]), range(cost.shape[1])
+    problem = pulp.LpProblem('CFLP', pulp.LpMinimize)
+    built = pulp.LpVariable.dicts('build_ev_center', ev_centers, 0, 1, pulp.LpBinary)
+    served = pulp.LpVariable.dicts('Link', list(product(customers, ev_centers)), 0)
+
+    problem += (pulp.lpSum(fixed_cost * built[j] for j in ev_centers) +
+                pulp.lpSum(cost[i, j] * served[(i, j)] for i in customers for j in ev_centers))
+
+    for i in customers:
+
+        problem += pulp.lpSum(served[(i, j)] for j in ev_centers) == demand[i]
+
+    for j in ev_centers:
+
+        problem += pulp.lpSum(served[(i, j)] for i in customers) <= capacity * built[j]
+
+        for i in customers:
+
+            problem += served[(i, j)] <= demand[i] * built[j]
+
+    problem.solve(pulp.PULP_CBC_CMD(msg = False))
+
+
+    return pulp.value(problem.objective)
+
+
+@pytest.mark.parametrize('formulation', ['strong', 'weak'])
+@pytest.mark.parametrize('backend', ['highs', 'cbc'])
+def test_model_matches_pulp(instance, formulation, backend):
+
+    customers, ev_centers, capacity, fixed_cost = instance
+    _, cost = cost_matrices(customers, ev_centers, ITEM)
+    demand = customers['demand'].values
+
+    model = CFLPModel(cost, demand, capacity, fixed_cost, formulation = formulation)
+    solution = solve(model, backend)
+
+    assert solution.status == 'Optimal'
+    assert solution.objective == pytest.approx(pulp_objective(cost, demand, capacity,
+                                               fixed_cost), rel = 1e-6)
+    np.testing.assert_allclose(np.bincount(model.customer_idx, weights = solution.flows,
+                               minlength = len(demand)), demand)
+
+
+@pytest.mark.parametrize('backend', ['highs', 'cbc'])
+def test_time_limit_statuses_match(backend):
+
+    if backend == 'cbc':
+
+        pytest.importorskip('pulp')
+
+    # Too large to be solved to optimality within the time limit
+    rng = np.random.default_rng(1)
+    customers = locations(rng, 300, 'customer_id', n_regions = 40)
+    customers['demand'] = np.floor(rng.uniform(50, 150, len(customers)))
+    ev_centers = locations(rng, 60, 'ev_center_id', n_regions = 40)
+    _, cost = cost_matrices(customers, ev_centers, ITEM)
+    capacity = customers.groupby('admin_name')['demand'].sum().mean() * 2
+
+    model = CFLPModel(cost, customers['demand'].values, capacity, 10000)
+    solution = solve(model, backend, time_limit = 0.2)
+
+    assert solution.status in ('Optimal', 'Feasible', 'Not Solved')
+    assert (solution.objective is None) == (solution.status == 'Not Solved')
+
+
+def test_highs_statuses():
+
+    assert highs_status(0, True) == 'Optimal'
+    assert highs_status(1, True) == 'Feasible'
+    assert highs_status(1, False) == 'Not Solved'
+    assert highs_status(2, False) == 'Infeasible'
+    assert highs_status(3, False) == 'Unbounded'
+    assert highs_status(4, False) == 'Not Solved'
+
+
+@pytest.mark.parametrize('formulation', ['strong', 'weak'])
+def test_update_matches_rebuilt_model(instance, formulation):
+
+    customers, ev_centers, capacity, fixed_cost = instance
+    _, cost = cost_matrices(customers, ev_centers, ITEM)
+    demand = customers['demand'].values
+
+    model = CFLPModel(cost, demand, capacity, fixed_cost, formulation = formulation)
+    model.update(link_cost = 2 * model.link_cost, demand = demand + 10,
+                 capacity = 1.5 * capacity, fixed_cost = 3 * fixed_cost)
+
+    rebuilt = CFLPModel(2 * cost, demand + 10, 1.5 * capacity, 3 * fixed_cost,
+                        formulation = formulation)
+
+    np.testing.assert_array_equal(model.objective, rebuilt.objective)
+    np.testing.assert_array_equal(model.b_eq, rebuilt.b_eq)
+    np.testing.assert_array_equal(model.A_ub.toarray(), rebuilt.A_ub.toarray())
+    assert solve(model, 'highs').objective == pytest.approx(solve(rebuilt, 'highs').objective)
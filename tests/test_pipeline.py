@@ -0,0 +1,135 @@
+import json
+import os
+import pytest
+from cafevisit.pipeline import Pipeline, Stage
+
+
+def write(path, content):
+    """
+    Write a text file, creating its folder.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+
+    with open(path, 'w') as f:
+
+        f.write(content)
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    """
+    Two chained stages reading a raster
+    shared by every country, with the calls
+    of each stage recorded.
+    """
+    raster = str(tmp_path / 'raw' / 'population.tif')
+    write(raster, 'population')
+    calls = []
+
+    def stage(name, path_in, path_out):
+
+        def func(iso3):
+
+            calls.append((iso3, name))
+
+            with open(path_in.format(iso3 = iso3)) as f:
+
+                write(path_out.format(iso3 = iso3), f.read() + name)
+
+        return func
+
+    national = str(tmp_path / '{iso3}' / 'national.tif')
+    results = str(tmp_path / '{iso3}' / 'results.csv')
+
+    def make(params = None):
+
+        return Pipeline([
+            Stage('national', stage('national', raster, national),
+                  inputs = [raster], outputs = [national]),
+            Stage('results', stage('results', national, results),
+                  inputs = [national], outputs = [results], params = params),
+        ], state_path = str(tmp_path / '{iso3}' / 'pipeline.json'),
+           hash_path = str(tmp_path / 'file_hashes.json'))
+
+
+    return make, calls, raster, tmp_path
+
+
+def actions(report):
+    """
+    Action taken for each stage of a run.
+    """
+    return {stage['stage']: stage['action'] for stage in report}
+
+
+def test_second_run_skips_every_stage(pipeline):
+
+    make, calls, _, _ = pipeline
+
+    assert actions(make().run('KEN')) == {'national': 'ran', 'results': 'ran'}
+    assert actions(make().run('KEN')) == {'national': 'skipped', 'results': 'skipped'}
+    assert calls == [('KEN', 'national'), ('KEN', 'results')]
+
+
+def test_changed_input_reruns_downstream_stages(pipeline):
+
+    make, calls, raster, _ = pipeline
+    make().run('KEN')
+
+    # A new modification time alone does not change the content hash
+    os.utime(raster, ns = (0, 0))
+    assert actions(make().run('KEN')) == {'national': 'skipped', 'results': 'skipped'}
+
+    write(raster, 'population 2021')
+    assert actions(make().run('KEN')) == {'national': 'ran', 'results': 'ran'}
+
+
+def test_changed_params_or_missing_output_rerun_a_stage(pipeline):
+
+    make, _, _, tmp_path = pipeline
+    make().run('KEN')
+
+    assert actions(make({'demand_fraction': 0.1}).run('KEN')) == {'national': 'skipped',
+                                                                  'results': 'ran'}
+
+    os.remove(str(tmp_path / 'KEN' / 'national.tif'))
+    assert actions(make({'demand_fraction': 0.1}).run('KEN'))['national'] == 'ran'
+
+
+def test_dry_run_and_batched_stages_do_not_call_stages(pipeline):
+
+    make, calls, raster, tmp_path = pipeline
+
+    assert actions(make().run('KEN', dry_run = True)) == {'national': 'planned',
+                                                           'results': 'planned'}
+    assert calls == []
+
+    # Written by a batch step, e.g. process_national_populations
+    write(str(tmp_path / 'KEN' / 'national.tif'), 'population' + 'national')
+    assert actions(make().run('KEN', done = ['national'])) == {'national': 'batched',
+                                                               'results': 'ran'}
+    assert calls == [('KEN', 'results')]
+    assert actions(make().run('KEN')) == {'national': 'skipped', 'results': 'skipped'}
+
+
+def test_file_hashes_are_shared_by_countries(pipeline):
+
+    make, _, raster, tmp_path = pipeline
+    make().run('KEN')
+
+    with open(str(tmp_path / 'file_hashes.json')) as f:
+
+        hashes = json.load(f)
+
+    assert os.path.abspath(raster) in hashes
+    assert not os.path.exists(str(tmp_path / 'KEN' / 'file_hashes.json'))
+
+    # Same size and modification time, so the hash recorded for KEN is reused
+    stat = os.stat(raster)
+    write(raster, 'POPULATION')
+    os.utime(raster, ns = (stat.st_atime_ns, stat.st_mtime_ns))
+    make().run('GHA')
+
+    with open(str(tmp_path / 'file_hashes.json')) as f:
+
+        assert json.load(f)[os.path.abspath(raster)] == hashes[os.path.abspath(raster)]
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pytest
+from cafevisit.preprocessing import (ProcessRegions, read_sub_region, remove_small_shapes,
+                                     remove_small_shapes_array)
+
+gpd = pytest.importorskip('geopandas')
+shapely = pytest.importorskip('shapely')
+
+
+def square(x, y, area):
+    """
+    Square of the given area with its lower
+    left corner at (x, y).
+    """
+    side = np.sqrt(area)
+
+    return shapely.box(x, y, x + side, y + side)
+
+
+def multipolygon(*areas):
+    """
+    Side by side squares of the given areas.
+    """
+    return shapely.MultiPolygon([square(10 * i, 0, area) for i, area in enumerate(areas)])
+
+
+@pytest.fixture
+def shapes():
+    """
+    Regions covering every branch of
+    `remove_small_shapes`.
+    """
+    return gpd.GeoDataFrame({
+        'GID_0': ['KEN', 'KEN', 'KEN', 'KEN', 'CHL', 'KEN', 'KEN'],
+        'geometry': [
+            square(0, 0, 1),
+            # Too small to be filtered
+            multipolygon(0.004, 0.0005),
+            # Mainland and a large island, with small islands
+            multipolygon(0.5, 0.2, 0.0005, 0.005),
+            # Over 50 square degrees, losing islands below 0.1
+            multipolygon(40, 20, 0.05, 0.2),
+            # Country specific threshold
+            multipolygon(0.5, 0.005, 0.02),
+            # Only small islands, nothing left
+            multipolygon(*[0.0009] * 20),
+            None,
+        ],
+    }, crs = 'epsg:4326')
+
+
+def test_array_version_matches_row_version(shapes):
+
+    expected = shapes.iloc[:-1].apply(remove_small_shapes, axis = 1).values
+    output = remove_small_shapes_array(shapes.geometry.values, shapes['GID_0'].values)
+
+    assert output[-1] is None
+    output = output[:-1]
+
+    np.testing.assert_allclose(shapely.area(output.astype(object)),
+                               shapely.area(expected.astype(object)), rtol = 1e-9)
+    assert list(shapely.get_num_geometries(output)) == [1, 2, 3, 3, 2, 0]
+    assert shapely.equals_exact(shapely.normalize(output), shapely.normalize(expected),
+                                tolerance = 1e-9).all()
+
+
+def test_sub_region_round_trip(tmp_path, monkeypatch):
+
+    # The boundaries are read and written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    folder = os.path.join('results', 'processed', 'KEN', 'regions')
+    os.makedirs(folder)
+
+    regions = gpd.GeoDataFrame({
+        'GID_1': ['KEN.1_1', 'KEN.1_1', 'KEN.2_1'],
+        'GID_2': ['KEN.1.1_1', "KEN.1.2'_1", 'KEN.2.1_1'],
+        'geometry': [square(0, 0, 1), multipolygon(0.5, 0.2), square(2, 0, 1)],
+    }, crs = 'epsg:4326')
+    regions.to_file(os.path.join(folder, 'regions_2_KEN.shp'))
+
+    ProcessRegions('KEN', 2).process_sub_region_boundaries()
+
+    for gid, geometry in zip(regions['GID_2'], regions.geometry):
+
+        boundary = read_sub_region('KEN', gid)
+
+        # Polygons come back as single part multipolygons of the layer
+        assert list(boundary['GID']) == [gid]
+        assert shapely.equals(boundary.geometry.iloc[0], geometry)
+
+    assert len(read_sub_region('KEN', 'KEN.3.1_1')) == 0
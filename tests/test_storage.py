@@ -0,0 +1,84 @@
+import os
+import pandas as pd
+import pytest
+from cafevisit import storage
+from cafevisit.storage import read_table, table_schema, write_table
+
+
+@pytest.fixture
+def customers():
+    """
+    A customers table as `SupplyDemand`
+    writes it.
+    """
+    return pd.DataFrame({
+        'iso3': ['KEN', 'KEN', 'KEN'],
+        'region': ['Eastern', 'Eastern', 'Eastern'],
+        'admin_name': ['Nairobi', 'Kisumu', 'Nairobi'],
+        'GID_1': ['KEN.30_1', 'KEN.17_1', 'KEN.30_1'],
+        'population': [4397073, 1155574, 120000],
+        'latitude': [-1.2921, -0.0917, -1.3],
+        'longitude': [36.8219, 34.768, 36.9],
+        'area': [696.1, 2085.9, 12.5],
+        'pop_density': [6316.6, 553.9, 9600.0],
+        'capital': ['primary', 'admin', None],
+        'demand': [87941.0, 23111.0, 2400.0],
+        'customer_id': [1, 2, 3],
+    })
+
+
+@pytest.fixture(params = ['csv', 'parquet'])
+def engine(request, monkeypatch):
+    """
+    Storage format of the written tables,
+    CSV being the fallback without pyarrow.
+    """
+    if request.param == 'parquet':
+
+        pytest.importorskip('pyarrow')
+
+    else:
+
+        monkeypatch.setattr(storage, 'has_parquet', lambda: False)
+
+    return request.param
+
+
+def test_round_trip_keeps_values_and_types(tmp_path, customers, engine):
+
+    path = write_table(customers, str(tmp_path / 'KEN_customers.csv'))
+    df = read_table(str(tmp_path / 'KEN_customers.csv'))
+
+    assert path.endswith('.' + engine)
+    assert dict(df.dtypes.astype(str)) == table_schema(path)
+    pd.testing.assert_frame_equal(df, customers.astype(table_schema(path)))
+
+
+def test_csv_export_matches_the_original_csv(tmp_path, customers, engine):
+
+    write_table(customers, str(tmp_path / 'KEN_customers.csv'), csv = True)
+    customers.to_csv(tmp_path / 'original.csv', index = False)
+
+    # The CSV copy read by the R figures holds the same values as before
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'KEN_customers.csv'),
+                                  pd.read_csv(tmp_path / 'original.csv'))
+
+
+def test_reads_older_csv_outputs(tmp_path, customers):
+
+    # Written with the index, as the scripts did
+    customers.to_csv(tmp_path / 'KEN_customers.csv')
+    df = read_table(str(tmp_path / 'KEN_customers.parquet'), columns = ['admin_name', 'demand'])
+
+    assert list(df.columns) == ['admin_name', 'demand']
+    assert df['admin_name'].dtype == 'string'
+    assert df['demand'].tolist() == customers['demand'].tolist()
+
+
+def test_missing_table_raises(tmp_path):
+
+    with pytest.raises(FileNotFoundError):
+
+        read_table(str(tmp_path / 'KEN_customers.csv'))
+
+    assert not os.listdir(tmp_path)
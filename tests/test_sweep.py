@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import pytest
+from cafevisit import sweep
+from cafevisit.distances import cost_matrices
+from cafevisit.optimization import CFLPModel
+from cafevisit.solvers import solve
+from cafevisit.storage import write_table
+from conftest import ITEM
+
+
+@pytest.fixture
+def country(tmp_path, monkeypatch, instance):
+    """
+    Results folder of one country holding
+    the tables `prepare_country` reads.
+    """
+    customers, ev_centers, _, _ = instance
+    folder = tmp_path / 'final'
+    monkeypatch.setattr(sweep, 'DATA_RESULTS', str(folder))
+
+    customers['population'] = np.round(customers['demand'] / ITEM['demand_fraction'] + 7)
+    # EV center capacity of 280 requests at the base ev_spply_factor of 2
+    region = customers.groupby('admin_name', as_index = False)['demand'].sum()
+    region['demand'] = 140.0
+
+    for name, df in [('customers', customers), ('ev_centers', ev_centers),
+                     ('region', region)]:
+
+        write_table(df, os.path.join(str(folder), 'KEN', 'KEN_{}.csv'.format(name)))
+
+    return customers, ev_centers, region
+
+
+def test_links_serve_every_scenario(tmp_path, country):
+
+    customers, ev_centers, region = country
+    # The nearest center of each customer serves the demand at a capacity
+    # of 280 but not of 266, where the full model is still feasible
+    grid = sweep.parameter_grid(ev_spply_factor = [2, 1.9])
+    folder = sweep.prepare_country('KEN', str(tmp_path / 'sweep'), k_nearest = 1,
+                                   grid = grid)
+
+    for scenario_id, item in enumerate(grid):
+
+        # The full model of the scenario, without pruned links
+        demand, capacity = sweep.scenario_demand(dict(np.load(os.path.join(folder,
+                                                 'inputs.npz'))), item)
+        _, cost = cost_matrices(customers, ev_centers, item)
+        full = solve(CFLPModel(cost, demand, capacity, item['cost_of_ev_center'] *
+                     item['area_of_ev_center']), 'highs')
+
+        result = sweep.run_scenario('KEN', scenario_id, item, folder, 'strong', 'highs', {})
+
+        assert full.status == 'Optimal'
+        assert result['status'] == 'Optimal'
+        assert result['minimized_cost'] >= full.objective * (1 - 1e-6)
@@ -6,8 +6,8 @@ import pandas as pd
 import matplotlib.pyplot as plt 
 import geopandas as gpd
 import seaborn as sns
-from shapely import wkt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
+from cafevisit.storage import read_table
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings('ignore')
 
@@ -75,7 +75,7 @@ def plot_regions_by_geotype():
     DATA_AFRICA = os.path.join(BASE_PATH, '..', 'results', 
                  'SSA', 'SSA_population_results.csv')
     
-    data = pd.read_csv(DATA_AFRICA)
+    data = read_table(DATA_AFRICA, geometry = False)
     n = int((len(data)))
     data['pop_density'] = round(data['pop_density'])
     data = data[['GID_1', 'pop_density']]
@@ -138,7 +138,7 @@ def plot_demand_per_area():
     DATA_AFRICA = os.path.join(BASE_PATH, '..', 'results', 
                  'SSA', 'SSA_customers.csv')
     
-    data = pd.read_csv(DATA_AFRICA)
+    data = read_table(DATA_AFRICA, geometry = False)
     n = int((len(data)) / 4)
     data['demand'] = round(data['demand'])
     data = data[['GID_1', 'demand']]
@@ -193,15 +193,11 @@ def pop_density(iso3):
     path = os.path.join(DATA_RESULTS, 'final', iso3, 'population', '{}_population_results.csv'.format(iso3))
 
     map_df = gpd.read_file(map_path)
-    df = pd.read_csv(path)
+    df = read_table(path)
 
-    df_merged  = map_df.merge(df, left_on = 'GID_1', right_on = 'GID_1')
-    gdf = gpd.GeoDataFrame(df_merged)
-
-    gdf.drop(columns = ['geometry_x'], inplace = True)
-    gdf.rename(columns = {'geometry_y': 'geometry'}, inplace = True)
-    gdf['geometry'] = gdf['geometry'].apply(wkt.loads)
-    gdf.set_geometry(col = 'geometry', inplace = True)
+    # The population table already holds the region geometries
+    df_merged  = map_df[['GID_1']].merge(df, left_on = 'GID_1', right_on = 'GID_1')
+    gdf = gpd.GeoDataFrame(df_merged, geometry = 'geometry', crs = df.crs)
 
     fig, ax = plt.subplots(1, figsize = (10, 10))
     divider = make_axes_locatable(ax)
@@ -5,10 +5,8 @@ import pandas as pd
 import matplotlib.pyplot as plt 
 import geopandas as gpd
 import seaborn as sns
-from shapely import wkt
-from pulp import *
-from itertools import *
 from mpl_toolkits.axes_grid1 import make_axes_locatable
+from cafevisit.storage import read_table
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings('ignore')
 
@@ -47,8 +45,8 @@ def potential_sites(iso3):
     customer = os.path.join(DATA_RESULTS, iso3, '{}_customers.csv'.format(iso3))
     ev_center = os.path.join(DATA_RESULTS, iso3, '{}_ev_centers.csv'.format(iso3))
 
-    df = pd.read_csv(customer)
-    df1 = pd.read_csv(ev_center)
+    df = read_table(customer, geometry = False)
+    df1 = read_table(ev_center, geometry = False)
 
     customer_df = add_coordinates(df)
     ev_df = add_coordinates(df1)
@@ -102,7 +100,7 @@ def average_demand(iso3):
 
     country = gpd.read_file(map_path)
 
-    df = pd.read_csv(region)
+    df = read_table(region, geometry = False)
     region_df = add_coordinates(df)
 
     sns.set(font_scale = 0.5)
@@ -152,7 +150,7 @@ def discarded_sites(iso3):
     """
     map_path = os.path.join(DATA_PROCESSED, iso3, 'national_outline.shp')
     ev_center = os.path.join(DATA_RESULTS, iso3, '{}_optimized_ev_center.csv'.format(iso3))
-    df = pd.read_csv(ev_center)
+    df = read_table(ev_center, geometry = False)
     df = df.rename(columns = {'build?': 'build'})
     df = add_coordinates(df)
 
@@ -194,8 +192,8 @@ def ssa_sites():
     customer = os.path.join(DATA_AFRICA, 'SSA_customers.csv')
     ev_center = os.path.join(DATA_AFRICA, 'SSA_ev_centers.csv')
 
-    df = pd.read_csv(customer)
-    df1 = pd.read_csv(ev_center)
+    df = read_table(customer, geometry = False)
+    df1 = read_table(ev_center, geometry = False)
 
     customer_df = add_coordinates(df)
     ev_df = add_coordinates(df1)
@@ -243,7 +241,7 @@ def ssa_demand():
     region = os.path.join(DATA_AFRICA, 'SSA_region.csv')
     country = gpd.read_file(map_path)
 
-    df = pd.read_csv(region)
+    df = read_table(region, geometry = False)
     region_df = add_coordinates(df)
 
     sns.set(font_scale = 0.5)
@@ -295,7 +293,7 @@ def discarded_ssa_sites():
     """
     map_path = os.path.join(DATA_AFRICA, 'shapefile', 'Africa_Boundaries.shp')
     ev_center = os.path.join(DATA_AFRICA, 'SSA_optimized_ev_center.csv')
-    df = pd.read_csv(ev_center)
+    df = read_table(ev_center, geometry = False)
     df = df.rename(columns = {'build?': 'build'})
     df = add_coordinates(df)
 